@@ -49,19 +49,64 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'drf_spectacular',
     'user',
-    'recipe'
+    'recipe',
+    'benchmark',
+    'job',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.PathScopedMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
+]
+
+# Session based middleware only runs for the admin; the token authenticated
+# API skips it (see core.middleware.PathScopedMiddleware).
+SCOPED_MIDDLEWARE_PATHS = ['/admin/']
+SCOPED_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# The admin checks only look at MIDDLEWARE, the scoped stack provides them.
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
+# Opt-in Server-Timing headers and timing logs for every request, plus
+# cProfile dumps for a sample of requests (core.middleware).
+REQUEST_PROFILING = bool(int(os.environ.get('REQUEST_PROFILING', 0)))
+REQUEST_PROFILING_SAMPLE_RATE = float(
+    os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 0)
+)
+REQUEST_PROFILING_ALLOW_HEADER = bool(
+    int(os.environ.get('REQUEST_PROFILING_ALLOW_HEADER', 0))
+)
+REQUEST_PROFILING_DIR = os.environ.get(
+    'REQUEST_PROFILING_DIR', '/tmp/profiles'
+)
+
+# Prometheus metrics served on /api/metrics/. Set PROMETHEUS_MULTIPROC_DIR
+# (scripts/run.sh does) to aggregate samples across uWSGI workers. Scrapes
+# must send `Authorization: Bearer <METRICS_TOKEN>`; without a token the
+# endpoint refuses every request.
+METRICS_ENABLED = bool(int(os.environ.get('METRICS_ENABLED', 1)))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# 'wsgi' serves with uWSGI, 'asgi' with uvicorn (scripts/run.sh), which
+# routes health checks and image uploads to async views whose blocking
+# work runs on a pool of ASYNC_THREAD_POOL_SIZE threads (core.concurrency).
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+ASYNC_THREAD_POOL_SIZE = int(os.environ.get('ASYNC_THREAD_POOL_SIZE', 16))
+
+# Run the AppConfig.warm_up() hooks when the WSGI application is loaded,
+# see core.warmup.
+WORKER_WARMUP = bool(int(os.environ.get('WORKER_WARMUP', 1)))
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -95,13 +140,147 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # Keep connections open between requests (seconds, 0 closes the
+        # connection after every request) and ping reused connections once
+        # per request so a dropped connection is replaced transparently.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))
+        ),
+        # Server side cursors do not survive a transaction pooler
+        # (pgbouncer pool_mode=transaction), so allow turning them off.
+        'DISABLE_SERVER_SIDE_CURSORS': bool(
+            int(os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS', 0))
+        ),
+    }
+}
+
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1,replica2:5433
+# GET/HEAD requests of views with `read_from_replica = True` read from them.
+# Under test they mirror `default` unless DB_REPLICA_TEST_MIRROR=0, which
+# runs the suite against separate Postgres instances.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+    filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))
+):
+    host, _, port = replica.partition(':')
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {
+            'MIRROR': (
+                'default'
+                if int(os.environ.get('DB_REPLICA_TEST_MIRROR', 1))
+                else None
+            ),
+        },
+    }
+    DATABASE_REPLICAS.append(alias)
+
+# Migrations hold a session level advisory lock (core startup), so they
+# run on a connection straight to Postgres: behind pgbouncer point
+# DB_DIRECT_HOST at the server itself, otherwise `default` is direct.
+if os.environ.get('DB_DIRECT_HOST'):
+    DATABASES['direct'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_DIRECT_HOST'],
+        'PORT': (
+            os.environ.get('DB_DIRECT_PORT') or DATABASES['default']['PORT']
+        ),
+        'CONN_MAX_AGE': 0,
+        'DISABLE_SERVER_SIDE_CURSORS': False,
+        'TEST': {'MIRROR': 'default'},
     }
+MIGRATION_DATABASE = 'direct' if 'direct' in DATABASES else 'default'
+
+DATABASE_ROUTERS = ['core.db.routers.PrimaryReplicaRouter']
+DATABASE_REPLICA_POLICY = os.environ.get(
+    'DB_REPLICA_POLICY',
+    'core.db.routers.RoundRobinReplicaPolicy',
+)
+# After a write the user reads from the primary for this many seconds.
+# The pin must be seen by every worker, so it is kept in the shared cache;
+# replicas are refused with a per-process one (core.checks).
+DATABASE_REPLICA_PIN_SECONDS = int(
+    os.environ.get('DB_REPLICA_PIN_SECONDS', 5)
+)
+DATABASE_REPLICA_PIN_CACHE = 'shared'
+
+# `default` is local to each process. `shared` is seen by every worker and
+# container: a table on the primary (created by the core migrations) unless
+# SHARED_CACHE_BACKEND names another backend, e.g.
+# django.core.cache.backends.memcached.PyMemcacheCache with
+# SHARED_CACHE_LOCATION=memcached:11211.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': os.environ.get(
+            'SHARED_CACHE_BACKEND',
+            'django.core.cache.backends.db.DatabaseCache',
+        ),
+        'LOCATION': os.environ.get(
+            'SHARED_CACHE_LOCATION', 'core_shared_cache'
+        ),
+    },
 }
+if CACHES['shared']['BACKEND'].endswith('.DatabaseCache'):
+    # the table is culled past this many rows, 300 by default
+    CACHES['shared']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('SHARED_CACHE_MAX_ENTRIES', 100000)),
+    }
+
+# Statements slower than this are logged by core.db.slow_queries with their
+# view, serializer and fingerprint (0 disables it). A sample of slow SELECTs
+# is explained; plain reads of tables are re-run under EXPLAIN (ANALYZE,
+# BUFFERS) in a rolled back savepoint, which doubles their cost.
+SLOW_QUERY_THRESHOLD_MS = float(
+    os.environ.get('SLOW_QUERY_THRESHOLD_MS', 500)
+)
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(
+    os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0)
+)
+
+# Background jobs (job.worker): how often idle workers poll, how long a job
+# may run before it is presumed lost and requeued, and the retry backoff,
+# doubled per attempt up to the maximum.
+JOB_POLL_INTERVAL_SECONDS = float(
+    os.environ.get('JOB_POLL_INTERVAL_SECONDS', 1)
+)
+JOB_LOCK_TIMEOUT_SECONDS = int(os.environ.get('JOB_LOCK_TIMEOUT_SECONDS', 600))
+JOB_RETRY_BACKOFF_SECONDS = int(
+    os.environ.get('JOB_RETRY_BACKOFF_SECONDS', 10)
+)
+JOB_RETRY_BACKOFF_MAX_SECONDS = int(
+    os.environ.get('JOB_RETRY_BACKOFF_MAX_SECONDS', 3600)
+)
+# Rows deleted per transaction by the account and bulk delete purges
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 1000))
+
+# Per-user similar recipe indexes, see recipe.similarity. Like the replica
+# pins they are kept in the shared cache, so every worker patches the same
+# copy.
+SIMILAR_RECIPES_CACHE = 'shared'
+SIMILAR_RECIPES_CACHE_SECONDS = int(
+    os.environ.get('SIMILAR_RECIPES_CACHE_SECONDS', 3600)
+)
+SIMILAR_RECIPES_MAX_LIMIT = 50
+# Most recipes returned by one GET /api/recipe/recipes/?ids=
+RECIPE_MULTI_GET_MAX_IDS = 100
+# Most recipes merged by one POST /api/recipe/shopping-list/
+SHOPPING_LIST_MAX_IDS = 1000
+
+# Most sub-requests in one POST /api/batch/ (core.batch)
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
 
 
 # Password validation
@@ -160,3 +339,30 @@ REST_FRAMEWORK = {
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
+
+# Version of the deployed code (e.g. the git sha), used to invalidate the
+# pre-generated OpenAPI schema. Falls back to a hash of the sources.
+APP_VERSION = os.environ.get('APP_VERSION', '')
+SCHEMA_CACHE_DIR = os.environ.get('SCHEMA_CACHE_DIR', '/tmp/schema-cache')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['console'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'job': {
+            'handlers': ['console'],
+            'level': os.environ.get('LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -13,28 +13,38 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularSwaggerView
 from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
 from core import views as core_views
+from core.schema import CachedSpectacularAPIView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/health-check/', core_views.health_check, name='health-check'),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    path(
+        'api/health-check/',
+        core_views.health_check_async if settings.SERVER_MODE == 'asgi'
+        else core_views.health_check,
+        name='health-check',
+    ),
+    path('api/metrics/', core_views.metrics, name='metrics'),
+    path('api/batch/', core_views.BatchView.as_view(), name='batch'),
+    path(
+        'api/schema/',
+        CachedSpectacularAPIView.as_view(),
+        name='api-schema',
+        ),
     path(
         'api/docs/',
         SpectacularSwaggerView.as_view(url_name='api-schema'),
         name='api-docs',
         ),
     path('api/user/', include('user.urls')),
-    path('api/recipe/', include('recipe.urls'))
+    path('api/recipe/', include('recipe.urls')),
+    path('api/job/', include('job.urls')),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,265 @@
+"""
+Benchmark every API endpoint against seeded data and gate regressions
+"""
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from benchmark.stats import find_regressions, summarize
+from core.models import Ingredient, Recipe, Tag, User
+
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'baselines', 'api.json',
+)
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color=(200, 80, 40)).save(buffer, 'PNG')
+
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database at each size, measure p50/p95/p99 '
+        'latency, query count and peak memory of every endpoint, write the '
+        'results as JSON and fail when they regress against the baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='100,1000',
+            help='Comma separated numbers of seeded users',
+        )
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results here')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Store the results as the new baseline',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Allowed growth of latency and memory, as a fraction',
+        )
+        parser.add_argument(
+            '--min-delta-ms',
+            type=float,
+            default=2.0,
+            help='Latency growth below this is treated as noise',
+        )
+        parser.add_argument(
+            '--in-place',
+            action='store_true',
+            help='Seed the configured database instead of a throwaway one',
+        )
+
+    def _endpoints(self, user):
+        """Return (name, method, url, data, format) for every endpoint"""
+        recipe = Recipe.objects.filter(user=user).order_by('id').first()
+        tag_ids = Tag.objects.filter(user=user).order_by('id')[:2]
+        ingredient = Ingredient.objects.filter(user=user).order_by('id')[0]
+        filters = ','.join(str(tag.id) for tag in tag_ids)
+        detail_url = reverse('recipe:recipe-detail', args=[recipe.id])
+        recipe_payload = {
+            'title': 'Benchmark stew',
+            'time_minutes': 30,
+            'price': '7.50',
+            'tags': [{'name': 'Benchmark'}],
+            'ingredients': [{'name': 'Salt'}, {'name': 'Water'}],
+        }
+        image = png_bytes()
+
+        def upload():
+            upload_file = io.BytesIO(image)
+            upload_file.name = 'benchmark.png'
+            return {'image': upload_file}
+
+        return [
+            ('recipe-list', 'get', reverse('recipe:recipe-list'), None, None),
+            (
+                'recipe-filter', 'get',
+                f'{reverse("recipe:recipe-list")}?tags={filters}'
+                f'&ingredients={ingredient.id}',
+                None, None,
+            ),
+            ('recipe-detail', 'get', detail_url, None, None),
+            (
+                'recipe-create', 'post', reverse('recipe:recipe-list'),
+                lambda: recipe_payload, 'json',
+            ),
+            (
+                'recipe-update', 'patch', detail_url,
+                lambda: {'title': 'Updated', 'tags': [{'name': 'Quick'}]},
+                'json',
+            ),
+            (
+                'recipe-image-upload', 'post',
+                reverse('recipe:recipe-upload-image', args=[recipe.id]),
+                upload, 'multipart',
+            ),
+            ('tag-list', 'get', reverse('recipe:tag-list'), None, None),
+            (
+                'ingredient-list', 'get', reverse('recipe:ingredient-list'),
+                None, None,
+            ),
+            (
+                'token', 'post', reverse('user:token'),
+                lambda: {'email': user.email, 'password': 'password'}, None,
+            ),
+        ]
+
+    def _request(self, client, method, url, data, fmt):
+        response = getattr(client, method)(
+            url, data() if data else None, format=fmt
+        )
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {url} returned {response.status_code}'
+            )
+
+    def _measure(self, client, endpoint, iterations, warmup):
+        name, method, url, data, fmt = endpoint
+        for _ in range(warmup):
+            self._request(client, method, url, data, fmt)
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            self._request(client, method, url, data, fmt)
+            samples.append(time.perf_counter() - start)
+        result = summarize(samples)
+        with CaptureQueriesContext(connection) as queries:
+            self._request(client, method, url, data, fmt)
+        result['queries'] = len(queries)
+        # tracemalloc slows everything down, so it gets its own request
+        tracemalloc.start()
+        try:
+            self._request(client, method, url, data, fmt)
+            result['peak_kb'] = round(
+                tracemalloc.get_traced_memory()[1] / 1024, 1
+            )
+        finally:
+            tracemalloc.stop()
+
+        return result
+
+    def _benchmark_size(self, options):
+        # the heaviest user's lists are the ones that hurt
+        user = User.objects.annotate(
+            recipes=Count('recipe')
+        ).order_by('-recipes', 'id').first()
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        results = {}
+        for endpoint in self._endpoints(user):
+            result = self._measure(
+                client, endpoint, options['iterations'], options['warmup']
+            )
+            results[endpoint[0]] = result
+            self.stdout.write(
+                f'  {endpoint[0]:<20} p50={result["p50_ms"]:8.3f}ms '
+                f'p95={result["p95_ms"]:8.3f}ms '
+                f'p99={result["p99_ms"]:8.3f}ms '
+                f'queries={result["queries"]:<3} '
+                f'peak={result["peak_kb"]:.1f}KB'
+            )
+
+        return results
+
+    def _run(self, sizes, options):
+        results = {}
+        seeded = 0
+        for size in sizes:
+            self.stdout.write(f'seeding {size} users...')
+            call_command(
+                'seed_data',
+                users=size - seeded,
+                seed=options['seed'] + size,
+                stdout=io.StringIO(),
+            )
+            seeded = size
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            results[str(size)] = self._benchmark_size(options)
+
+        return results
+
+    def _compare(self, results, options):
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(f'no baseline at {options["baseline"]}')
+            return
+        with open(options['baseline']) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = find_regressions(
+            baseline, results, options['threshold'], options['min_delta_ms']
+        )
+        if regressions:
+            raise CommandError(
+                'performance regressions:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('no regressions'))
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        media_root = tempfile.TemporaryDirectory()
+        old_name = None
+        if not options['in_place']:
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root.name,
+                DATABASE_REPLICAS=[],
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                results = self._run(sizes, options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            media_root.cleanup()
+
+        document = {
+            'meta': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'iterations': options['iterations'],
+                'seed': options['seed'],
+            },
+            'results': results,
+        }
+        for path in filter(None, [
+            options['output'],
+            options['baseline'] if options['update_baseline'] else None,
+        ]):
+            with open(path, 'w') as output:
+                json.dump(document, output, indent=2, sort_keys=True)
+                output.write('\n')
+        if not options['update_baseline']:
+            self._compare(results, options)
@@ -0,0 +1,66 @@
+"""
+Compare per-request connections against persistent connections
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from benchmark.stats import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the latency of a trivial query when every request opens '
+        'a new connection (CONN_MAX_AGE=0) versus reusing a persistent '
+        'connection, with and without health checks. Point DB_HOST/DB_PORT '
+        'at pgbouncer to measure the pooler profile.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def _run(self, connection, iterations, reconnect, health_check):
+        """Time `iterations` simulated requests running one query each"""
+        connection.health_check_enabled = health_check
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            if reconnect:
+                connection.close()
+            else:
+                # what Django does at every request boundary
+                connection.close_if_unusable_or_obsolete()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            samples.append(time.perf_counter() - start)
+
+        return summarize(samples)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        iterations = options['iterations']
+        health_check_enabled = getattr(
+            connection, 'health_check_enabled', False
+        )
+        modes = [
+            ('connect per request', True, False),
+            ('persistent', False, False),
+            ('persistent + health check', False, True),
+        ]
+        try:
+            for label, reconnect, health_check in modes:
+                result = self._run(
+                    connection, iterations, reconnect, health_check
+                )
+                self.stdout.write(
+                    f'{label:<28} mean={result["mean_ms"]:.3f}ms '
+                    f'p50={result["p50_ms"]:.3f}ms '
+                    f'p95={result["p95_ms"]:.3f}ms '
+                    f'p99={result["p99_ms"]:.3f}ms'
+                )
+        finally:
+            connection.health_check_enabled = health_check_enabled
+            connection.close()
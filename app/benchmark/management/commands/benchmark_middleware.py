@@ -0,0 +1,71 @@
+"""
+Compare the per-request cost of the middleware stacks
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from benchmark.stats import summarize
+
+# MIDDLEWARE before the session stack was scoped to the admin
+FULL_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure request latency through the full middleware stack and '
+        'through the lean stack API requests use now.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/health-check/')
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def _run(self, path, iterations):
+        client = Client()
+        assert client.get(path).status_code < 400, f'{path} failed'
+        # a session cookie makes SessionMiddleware do its real work
+        client.cookies['sessionid'] = 'benchmark'
+        client.get(path)
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            client.get(path)
+            samples.append(time.perf_counter() - start)
+
+        return summarize(samples)
+
+    def handle(self, *args, **options):
+        stacks = [
+            ('full', FULL_MIDDLEWARE),
+            ('lean', settings.MIDDLEWARE),
+        ]
+        results = {}
+        for label, middleware in stacks:
+            with override_settings(
+                MIDDLEWARE=middleware,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                results[label] = self._run(
+                    options['path'], options['iterations']
+                )
+            result = results[label]
+            self.stdout.write(
+                f'{label:<5} mean={result["mean_ms"]:.3f}ms '
+                f'p50={result["p50_ms"]:.3f}ms '
+                f'p95={result["p95_ms"]:.3f}ms '
+                f'p99={result["p99_ms"]:.3f}ms'
+            )
+        saved = results['full']['mean_ms'] - results['lean']['mean_ms']
+        self.stdout.write(f'saved per request: {saved:.3f}ms')
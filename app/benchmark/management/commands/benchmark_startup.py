@@ -0,0 +1,96 @@
+"""
+Measure import time and first-request latency with and without warm-up
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# runs in a fresh interpreter, like a newly spawned worker
+CHILD = r'''
+import json, sys, time
+
+start = time.perf_counter()
+from app.wsgi import application
+from django.test import RequestFactory
+loaded = time.perf_counter()
+
+factory = RequestFactory()
+requests = [
+    lambda: factory.get('/api/health-check/'),
+    lambda: factory.get('/api/recipe/tags/'),
+    lambda: factory.get('/api/recipe/recipes/'),
+    lambda: factory.post(
+        '/api/user/token/', {}, content_type='application/json'
+    ),
+]
+
+
+def serve_all():
+    started = time.perf_counter()
+    for make_request in requests:
+        response = application(
+            make_request().environ, lambda status, headers: None
+        )
+        b''.join(response)
+        response.close()
+    return time.perf_counter() - started
+
+
+first = serve_all()
+second = serve_all()
+json.dump({
+    'import_ms': (loaded - start) * 1000,
+    'first_request_ms': first * 1000,
+    'second_request_ms': second * 1000,
+}, sys.stdout)
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Start fresh interpreters that load the WSGI application and serve '
+        'a few requests, and compare import time and first-request latency '
+        'with WORKER_WARMUP off and on.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+
+    def _measure(self, warmup):
+        env = {
+            **os.environ,
+            'WORKER_WARMUP': '1' if warmup else '0',
+            'ALLOWED_HOSTS': ','.join(
+                [*settings.ALLOWED_HOSTS, 'testserver']
+            ),
+        }
+        result = subprocess.run(
+            [sys.executable, '-c', CHILD],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr)
+
+        return json.loads(result.stdout)
+
+    def handle(self, *args, **options):
+        for warmup in [False, True]:
+            runs = [self._measure(warmup) for _ in range(options['runs'])]
+            medians = {
+                key: statistics.median(run[key] for run in runs)
+                for key in runs[0]
+            }
+            self.stdout.write(
+                f'warmup={"on " if warmup else "off"} '
+                f'import={medians["import_ms"]:.1f}ms '
+                f'first_request={medians["first_request_ms"]:.1f}ms '
+                f'second_request={medians["second_request_ms"]:.1f}ms'
+            )
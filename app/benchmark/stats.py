@@ -0,0 +1,69 @@
+"""
+Helpers for summarising benchmark samples
+"""
+import statistics
+
+
+def percentile(samples, pct):
+    """Return the pct percentile of samples (nearest rank)"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(samples):
+    """Summarise timings in seconds as milliseconds"""
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3),
+    }
+
+
+LATENCY_METRICS = ['p50_ms', 'p95_ms', 'p99_ms']
+# allocator and cache noise below this is not a memory regression
+MIN_PEAK_DELTA_KB = 64
+
+
+def find_regressions(baseline, results, threshold, min_delta_ms):
+    """
+    Compare benchmark results with a baseline of the same shape.
+
+    Latency and peak memory regress when they grow by more than
+    `threshold` (a fraction, with latency also needing to grow by
+    `min_delta_ms` to rule out timer noise); query counts are
+    deterministic, so any increase is a regression.
+    """
+    regressions = []
+    for size, endpoints in results.items():
+        for endpoint, current in endpoints.items():
+            previous = baseline.get(size, {}).get(endpoint)
+            if previous is None:
+                continue
+            label = f'{endpoint} at {size} users'
+            for metric in LATENCY_METRICS:
+                before, after = previous[metric], current[metric]
+                if (after > before * (1 + threshold)
+                        and after - before > min_delta_ms):
+                    regressions.append(
+                        f'{label}: {metric} {before:.3f} -> {after:.3f}'
+                    )
+            if current['queries'] > previous['queries']:
+                regressions.append(
+                    f'{label}: queries {previous["queries"]} -> '
+                    f'{current["queries"]}'
+                )
+            before, after = previous['peak_kb'], current['peak_kb']
+            if (after > before * (1 + threshold)
+                    and after - before > MIN_PEAK_DELTA_KB):
+                regressions.append(
+                    f'{label}: peak_kb {before:.1f} -> {after:.1f}'
+                )
+
+    return regressions
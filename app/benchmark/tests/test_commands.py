@@ -0,0 +1,97 @@
+"""
+Tests for benchmark management commands
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase
+
+
+class BenchmarkDbConnectionsTests(TransactionTestCase):
+    """Test the connection benchmark command"""
+
+    def test_reports_every_mode(self):
+        """Test the command reports each connection mode"""
+        out = StringIO()
+
+        call_command('benchmark_db_connections', iterations=3, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('connect per request', output)
+        self.assertIn('persistent + health check', output)
+        self.assertIn('p95=', output)
+
+
+class BenchmarkMiddlewareTests(TransactionTestCase):
+    """Test the middleware benchmark command"""
+
+    def test_reports_both_stacks(self):
+        """Test the command compares the full and lean stacks"""
+        out = StringIO()
+
+        call_command('benchmark_middleware', iterations=3, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('full ', output)
+        self.assertIn('lean ', output)
+        self.assertIn('saved per request', output)
+
+
+class BenchmarkApiTests(TransactionTestCase):
+    """Test the API benchmark harness"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.baseline = os.path.join(tmp.name, 'baseline.json')
+
+    def _benchmark(self, **options):
+        out = StringIO()
+        call_command(
+            'benchmark_api', sizes='3', iterations=2, warmup=0,
+            in_place=True, baseline=self.baseline, stdout=out, **options
+        )
+
+        return out.getvalue()
+
+    def test_measures_every_endpoint(self):
+        """Test results are stored for each endpoint"""
+        self._benchmark(update_baseline=True)
+
+        with open(self.baseline) as baseline:
+            results = json.load(baseline)['results']['3']
+        self.assertIn('token', results)
+        self.assertIn('recipe-image-upload', results)
+        for metric in ['p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_kb']:
+            self.assertIn(metric, results['recipe-list'])
+
+    def test_fails_on_regression(self):
+        """Test a metric worse than the baseline fails the command"""
+        self._benchmark(update_baseline=True)
+        with open(self.baseline) as baseline:
+            document = json.load(baseline)
+        document['results']['3']['tag-list']['queries'] = 0
+        with open(self.baseline, 'w') as baseline:
+            json.dump(document, baseline)
+
+        with self.assertRaisesRegex(CommandError, 'tag-list at 3 users'):
+            self._benchmark()
+
+
+class BenchmarkStartupTests(TransactionTestCase):
+    """Test the startup benchmark command"""
+
+    def test_compares_warmup_off_and_on(self):
+        """Test both modes report import and first-request times"""
+        out = StringIO()
+
+        call_command('benchmark_startup', runs=1, stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('warmup=off', output)
+        self.assertIn('warmup=on', output)
+        self.assertIn('first_request=', output)
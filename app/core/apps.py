@@ -1,6 +1,45 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.urls import URLResolver
+
+
+def _compile_patterns(resolver):
+    """Import every urlconf and compile every pattern regex"""
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            _compile_patterns(pattern)
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core import checks  # noqa: F401, registers the system checks
+        from core import profiling
+
+        connection_created.connect(
+            profiling.install_query_observer, dispatch_uid='core.profiling'
+        )
+        if settings.SLOW_QUERY_THRESHOLD_MS:
+            from core.db import slow_queries
+            connection_created.connect(
+                slow_queries.install, dispatch_uid='core.slow_queries'
+            )
+
+    def warm_up(self):
+        """Compile URL patterns, load DRF settings and the API schema"""
+        from django.urls import get_resolver
+        from django.utils import translation
+        from rest_framework.settings import api_settings
+
+        from core.schema import build_schema_cache
+
+        _compile_patterns(get_resolver())
+        for name in api_settings.defaults:
+            getattr(api_settings, name)
+        translation.activate(settings.LANGUAGE_CODE)
+        build_schema_cache()
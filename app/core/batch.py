@@ -0,0 +1,199 @@
+"""
+Run many API requests within one HTTP call.
+
+Sub-requests are dispatched straight to the views their paths resolve
+to, in the same thread and on the same database connection. They reuse
+the user and token the batch request authenticated with, so tokens are
+looked up once per batch rather than once per sub-request. Outside atomic
+batches, reads are routed to replicas as ReplicaRoutingMiddleware would
+route them one request at a time, and only batches that wrote pin the
+token to the primary.
+"""
+import asyncio
+import io
+import json
+import logging
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+
+from core.db import routers
+from core.middleware import (
+    SAFE_METHODS, allows_replica_reads, get_request_token,
+)
+
+logger = logging.getLogger(__name__)
+
+# request headers a sub-request inherits from the batch request
+INHERITED_META = (
+    'SERVER_NAME', 'SERVER_PORT', 'REMOTE_ADDR', 'HTTP_HOST',
+    'HTTP_ACCEPT_LANGUAGE', 'HTTP_USER_AGENT', 'HTTP_X_FORWARDED_FOR',
+    'HTTP_X_FORWARDED_PROTO',
+)
+
+
+class SubRequestSerializer(serializers.Serializer):
+    """One API request of a batch"""
+    method = serializers.ChoiceField(
+        choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE']
+    )
+    path = serializers.RegexField(r'^/api/')
+    body = serializers.JSONField(required=False)
+
+
+class SubResponseSerializer(serializers.Serializer):
+    """The response to one request of a batch"""
+    status = serializers.IntegerField()
+    body = serializers.JSONField(allow_null=True)
+
+
+class BatchSerializer(serializers.Serializer):
+    """Serializer for running several API requests at once"""
+    requests = serializers.ListField(
+        child=SubRequestSerializer(), allow_empty=False,
+        max_length=settings.BATCH_MAX_REQUESTS, write_only=True,
+    )
+    atomic = serializers.BooleanField(default=False, write_only=True)
+    responses = SubResponseSerializer(many=True, read_only=True)
+
+
+class Rollback(Exception):
+    """Raised to undo an atomic batch once a request in it failed"""
+
+
+def _build_request(request, method, path, body):
+    url = urlsplit(path)
+    content = b'' if body is None else json.dumps(body).encode()
+    environ = {
+        key: request.META[key] for key in INHERITED_META
+        if key in request.META
+    }
+    environ.update({
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': io.BytesIO(content),
+        'wsgi.url_scheme': request.scheme,
+    })
+    sub_request = WSGIRequest(environ)
+    # rest_framework.request.Request skips authentication for these
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+
+    return sub_request
+
+
+def _error(code, detail):
+    return {'status': code, 'body': {'detail': detail}}
+
+
+def _body(response):
+    if hasattr(response, 'data'):
+        # the batch response renders it, like the view would have
+        return response.data
+    if response.streaming or not response.content:
+        return None
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content)
+
+    return response.content.decode(response.charset)
+
+
+def dispatch(request, method, path, body=None, replica_reads=False):
+    """
+    Run one request through the view its path resolves to.
+
+    With `replica_reads` a safe request of a view reading from replicas
+    reads from one.
+    """
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return _error(status.HTTP_404_NOT_FOUND, 'Not found.')
+    view_class = getattr(match.func, 'cls', None)
+    if getattr(view_class, 'batchable', True) is False or (
+        asyncio.iscoroutinefunction(match.func)
+    ):
+        return _error(
+            status.HTTP_400_BAD_REQUEST, 'Not available in a batch.'
+        )
+    if replica_reads and allows_replica_reads(method, match.func):
+        routers.enable_replica_reads()
+    try:
+        response = match.func(
+            _build_request(request, method, path, body),
+            *match.args, **match.kwargs,
+        )
+    except Exception:
+        # one broken request must not lose the responses of the others
+        logger.exception('batched %s %s failed', method, path)
+        return _error(
+            status.HTTP_500_INTERNAL_SERVER_ERROR, 'A server error occurred.'
+        )
+    finally:
+        routers.disable_replica_reads()
+
+    return {'status': response.status_code, 'body': _body(response)}
+
+
+def _wrote(sub_request, response):
+    return (
+        sub_request['method'] not in SAFE_METHODS
+        and response['status'] < 400
+    )
+
+
+def _run_atomic(request, requests):
+    responses = []
+    try:
+        with transaction.atomic():
+            for sub_request in requests:
+                responses.append(dispatch(request, **sub_request))
+                if responses[-1]['status'] >= 400:
+                    raise Rollback
+    except Rollback:
+        # nothing was written
+        return responses, False
+
+    return responses, any(map(_wrote, requests, responses))
+
+
+def _run_each(request, requests):
+    responses = []
+    wrote = False
+    # read-your-writes: the token's pin, and the batch's own writes
+    token = get_request_token(request)
+    pinned = bool(settings.DATABASE_REPLICAS) and token is not None and (
+        routers.is_pinned_to_primary(token)
+    )
+    for sub_request in requests:
+        responses.append(dispatch(
+            request, replica_reads=not (pinned or wrote), **sub_request
+        ))
+        wrote = wrote or _wrote(sub_request, responses[-1])
+
+    return responses, wrote
+
+
+def run(request, requests, atomic=False):
+    """
+    Dispatch `requests` in order and return their responses.
+
+    In atomic mode the batch stops at the first request that fails and
+    every change made by the requests before it is rolled back; all of it
+    reads from the primary.
+    """
+    responses, wrote = (_run_atomic if atomic else _run_each)(
+        request, requests
+    )
+    # for ReplicaRoutingMiddleware, instead of the batch's POST method
+    request._request.pin_to_primary = wrote
+
+    return responses
@@ -0,0 +1,30 @@
+"""
+System checks for settings that only break with several workers
+"""
+from django.conf import settings
+from django.core.checks import Error, register
+
+# backends whose entries live inside a single process
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    """Refuse read replicas when the pins are not shared by every worker"""
+    if not settings.DATABASE_REPLICAS:
+        return []
+    backend = settings.CACHES[settings.DATABASE_REPLICA_PIN_CACHE]['BACKEND']
+    if backend not in LOCAL_CACHE_BACKENDS:
+        return []
+
+    return [Error(
+        f'DATABASE_REPLICA_PIN_CACHE uses {backend}, which other workers '
+        'cannot see, so clients would read their own writes from lagging '
+        'replicas.',
+        hint='Point it at a cache shared by every worker, such as the '
+             'default DatabaseCache of CACHES["shared"].',
+        id='core.E001',
+    )]
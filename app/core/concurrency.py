@@ -0,0 +1,50 @@
+"""
+Run blocking code from async views on a bounded thread pool
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the process wide pool for blocking work.
+
+    Its size bounds the threads, and so the database connections, a
+    process uses for async views, unlike the loop's default executor.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.ASYNC_THREAD_POOL_SIZE,
+                    thread_name_prefix='sync-pool',
+                )
+
+    return _executor
+
+
+def _call(func, args, kwargs):
+    # pool threads outlive requests, so apply CONN_MAX_AGE like Django's
+    # request_started and request_finished signals do
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """Await `func(*args, **kwargs)` run on the pool"""
+    # sync_to_async carries the request's context locals (replica routing,
+    # query observers) over to the pool thread
+    return await sync_to_async(
+        _call, thread_sensitive=False, executor=get_executor()
+    )(func, args, kwargs)
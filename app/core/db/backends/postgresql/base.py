@@ -0,0 +1,56 @@
+"""
+PostgreSQL backend with health checked persistent connections
+"""
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Postgres wrapper that validates reused connections.
+
+    With CONN_MAX_AGE > 0 a worker keeps its connection between requests,
+    but the server, a pooler or a failover can drop it in the meantime.
+    When the CONN_HEALTH_CHECKS option is set, the first use of a reused
+    connection in each request runs a cheap `SELECT 1` and transparently
+    reconnects if the connection is dead (backport of the Django 4.1
+    setting of the same name).
+    """
+    health_check_enabled = False
+    health_check_done = False
+
+    def __init__(self, settings_dict, alias=None):
+        super().__init__(settings_dict, alias)
+        self.health_check_enabled = bool(
+            settings_dict.get('CONN_HEALTH_CHECKS', False)
+        )
+
+    def connect(self):
+        # a brand new connection does not need checking in this request;
+        # set it first as connect() itself calls ensure_connection()
+        self.health_check_done = True
+        super().connect()
+
+    def ensure_connection(self):
+        self.check_health()
+        super().ensure_connection()
+
+    def check_health(self):
+        """Close the connection if it no longer answers queries"""
+        if (
+            self.connection is None or
+            not self.health_check_enabled or
+            self.health_check_done
+        ):
+            return
+        # never drop a connection in the middle of a transaction
+        if self.in_atomic_block:
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        # called on request start and finish, so the next request that
+        # uses this connection checks it again
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
@@ -0,0 +1,115 @@
+"""
+Database routing to read replicas
+"""
+import hashlib
+import itertools
+import random
+import threading
+from functools import lru_cache
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from core.metrics import record_cache
+
+_state = Local()
+
+
+def enable_replica_reads():
+    """Route reads of the current request to a replica"""
+    _state.use_replica = True
+
+
+def disable_replica_reads():
+    """Route reads of the current request to the primary"""
+    _state.use_replica = False
+
+
+def replica_reads_enabled():
+    return getattr(_state, 'use_replica', False)
+
+
+class RoundRobinReplicaPolicy:
+    """Cycle through the replicas in order"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cycles = {}
+
+    def choose(self, replicas):
+        key = tuple(replicas)
+        with self._lock:
+            if key not in self._cycles:
+                self._cycles[key] = itertools.cycle(key)
+            return next(self._cycles[key])
+
+
+class RandomReplicaPolicy:
+    """Pick a replica at random for every read"""
+
+    def choose(self, replicas):
+        return random.choice(replicas)
+
+
+@lru_cache(maxsize=None)
+def _load_policy(path):
+    return import_string(path)()
+
+
+def get_replica_policy():
+    return _load_policy(settings.DATABASE_REPLICA_POLICY)
+
+
+def _pin_key(token):
+    digest = hashlib.sha256(token.encode()).hexdigest()
+
+    return f'replica-pin:{digest}'
+
+
+def pin_to_primary(token):
+    """Keep reads of the token's user on the primary for a while"""
+    caches[settings.DATABASE_REPLICA_PIN_CACHE].set(
+        _pin_key(token), True, settings.DATABASE_REPLICA_PIN_SECONDS
+    )
+
+
+def is_pinned_to_primary(token):
+    pinned = bool(
+        caches[settings.DATABASE_REPLICA_PIN_CACHE].get(_pin_key(token))
+    )
+    record_cache('replica_pin', hit=pinned)
+
+    return pinned
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads to a replica when the current request allows it.
+
+    Writes always go to the primary (`default`). Reads only go to one of
+    settings.DATABASE_REPLICAS while ReplicaRoutingMiddleware has enabled
+    replica reads for the request, chosen by DATABASE_REPLICA_POLICY.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not replica_reads_enabled():
+            return None
+        if model._meta.app_label == 'django_cache':
+            # DatabaseCache entries, such as the pins, are not worth lagging
+            return None
+
+        return get_replica_policy().choose(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+
+        return None
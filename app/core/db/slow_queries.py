@@ -0,0 +1,164 @@
+"""
+Log slow SQL statements with their origin and query plan
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import sys
+import time
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.serializers import BaseSerializer, ListSerializer
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+_FROM_RE = re.compile(r'\bFROM\b', re.IGNORECASE)
+_LOCKING_RE = re.compile(
+    r'\bFOR\s+(?:NO\s+KEY\s+|KEY\s+)?(?:UPDATE|SHARE)\b', re.IGNORECASE
+)
+_CALL_RE = re.compile(r'\b(\w+)\s*\(')
+
+# words the ORM puts before a parenthesis in a read-only SELECT: keywords
+# and functions without side effects. A statement calling anything else
+# is only planned, never run by EXPLAIN ANALYZE.
+READ_ONLY_CALLS = frozenset({
+    'ALL', 'AND', 'ANY', 'ARRAY', 'AS', 'BY', 'CASE', 'CAST', 'ELSE',
+    'EXISTS', 'FILTER', 'FROM', 'IN', 'JOIN', 'NOT', 'ON', 'OR', 'OVER',
+    'SELECT', 'SOME', 'THEN', 'USING', 'WHEN', 'WHERE',
+    'ABS', 'ARRAY_AGG', 'ARRAY_LENGTH', 'AVG', 'CARDINALITY', 'COALESCE',
+    'COUNT', 'GREATEST', 'LEAST', 'LENGTH', 'LOWER', 'MAX', 'MIN', 'NULLIF',
+    'ROUND', 'STRING_AGG', 'SUM', 'TRIM', 'UNNEST', 'UPPER',
+})
+
+
+def normalize(sql):
+    """Replace literals and parameter lists so similar queries match"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    """Return a short stable id for the normalized statement"""
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:16]
+
+
+def find_origin():
+    """
+    Return the view and serializers on the call stack.
+
+    Only walked for slow queries, so the fast path pays nothing.
+    """
+    view = None
+    serializers = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        owner = frame.f_locals.get('self')
+        if view is None and isinstance(owner, APIView):
+            action = getattr(owner, 'action', None)
+            view = type(owner).__name__ + (f'.{action}' if action else '')
+        elif isinstance(owner, BaseSerializer):
+            if isinstance(owner, ListSerializer):
+                owner = owner.child
+            name = type(owner).__name__
+            if name not in serializers:
+                serializers.append(name)
+        frame = frame.f_back
+
+    # the outermost serializer is the one the view used
+    return view, '>'.join(reversed(serializers)) or None
+
+
+def explain_options(sql):
+    """
+    Return the EXPLAIN options safe for a statement, None to skip it.
+
+    ANALYZE runs the statement again, so it is kept to plain reads of
+    tables. Row locks and calls outside a FROM clause (such as
+    pg_advisory_lock) are not explained at all, and other calls are only
+    planned.
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        # never repeat a write
+        return None
+    if not _FROM_RE.search(sql) or _LOCKING_RE.search(sql):
+        return None
+    calls = {
+        name.upper() for name in _CALL_RE.findall(_STRING_RE.sub('', sql))
+    }
+    if calls <= READ_ONLY_CALLS:
+        return 'ANALYZE, BUFFERS'
+
+    return 'COSTS'
+
+
+def explain(connection, sql, params):
+    """Return the EXPLAIN output of a SELECT, see explain_options()"""
+    options = explain_options(sql)
+    if options is None:
+        return None
+    try:
+        # a failed EXPLAIN only aborts the savepoint, not the caller's
+        # transaction, and whatever the statement did is rolled back
+        with transaction.atomic(using=connection.alias, savepoint=True):
+            # the raw DB-API cursor bypasses execute wrappers
+            with connection.connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN ({options}) {sql}', params)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            transaction.set_rollback(True, using=connection.alias)
+    except Exception as exc:
+        return f'EXPLAIN failed: {exc}'
+
+    return plan
+
+
+class SlowQueryLogger:
+    """Database execute wrapper that logs statements over the threshold"""
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            threshold = settings.SLOW_QUERY_THRESHOLD_MS
+            if threshold and duration_ms >= threshold:
+                self.log(duration_ms, sql, params, many, context)
+
+    def log(self, duration_ms, sql, params, many, context):
+        connection = context['connection']
+        view, serializer = find_origin()
+        record = {
+            'event': 'slow_query',
+            'database': connection.alias,
+            'duration_ms': round(duration_ms, 3),
+            'fingerprint': fingerprint(sql),
+            'query': normalize(sql),
+            'view': view,
+            'serializer': serializer,
+        }
+        rate = settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+        if not many and rate > 0 and random.random() < rate:
+            record['plan'] = explain(connection, sql, params)
+        logger.warning(json.dumps(record))
+
+
+slow_query_logger = SlowQueryLogger()
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver adding the logger to new connections"""
+    if slow_query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_logger)
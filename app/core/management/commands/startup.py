@@ -0,0 +1,168 @@
+"""
+Prepare the container to serve requests, skipping work already done
+"""
+import hashlib
+import os
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import (
+    DEFAULT_DB_ALIAS, DatabaseError, connection, connections, transaction,
+)
+from django.db.migrations.executor import MigrationExecutor
+
+from core.schema import build_schema_cache
+
+# Postgres advisory lock held while migrating, shared by every replica
+MIGRATION_LOCK_ID = zlib.crc32(b'app.startup.migrate')
+STATIC_MANIFEST_NAME = '.static-manifest'
+IGNORE_PATTERNS = ['CVS', '.*', '*~']
+
+
+def static_sources_hash():
+    """Return a hash of the paths and contents of every static source"""
+    digest = hashlib.sha256()
+    files = {}
+    for finder in get_finders():
+        for path, storage in finder.list(IGNORE_PATTERNS):
+            # like collectstatic, the first finder to find a path wins
+            files.setdefault(path, storage)
+    for path in sorted(files):
+        digest.update(path.encode())
+        with files[path].open(path) as source:
+            for chunk in iter(lambda: source.read(65536), b''):
+                digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def pending_migrations(using=DEFAULT_DB_ALIAS):
+    """Return the unapplied migrations with one query on django_migrations"""
+    executor = MigrationExecutor(connections[using])
+    targets = executor.loader.graph.leaf_nodes()
+
+    return executor.migration_plan(targets)
+
+
+@contextmanager
+def shared_advisory_xact_lock(lock_id):
+    """
+    Hold a shared transaction level Postgres advisory lock.
+
+    It waits while another process holds advisory_lock(), and lives and
+    ends with a transaction, so it is safe behind a transaction-mode pooler.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock_shared(%s)', [lock_id]
+            )
+        yield
+
+
+@contextmanager
+def advisory_lock(lock_id, using=DEFAULT_DB_ALIAS):
+    """
+    Hold a session level Postgres advisory lock on the `using` connection.
+
+    Migrations commit one at a time and some (atomic = False, CREATE INDEX
+    CONCURRENTLY) cannot run in a transaction at all, so the lock has to
+    outlive transactions. `using` must therefore reach Postgres directly:
+    a transaction-mode pooler could hand its session to another client.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s)', [lock_id])
+    try:
+        yield
+    finally:
+        try:
+            with connections[using].cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [lock_id])
+        except DatabaseError:
+            # ending the session releases the lock as well
+            connections[using].close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Wait for the database, collect static files, migrate and render '
+        'the API schema, skipping each step when there is nothing to do.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-wait',
+            action='store_false',
+            dest='wait',
+            help='Do not wait for the database first',
+        )
+        parser.add_argument(
+            '--force-collectstatic',
+            action='store_true',
+            help='Collect static files even if the sources are unchanged',
+        )
+
+    @contextmanager
+    def _phase(self, name):
+        """Time a startup phase and write a logfmt line for it"""
+        started = time.monotonic()
+        result = {'status': 'done'}
+        try:
+            yield result
+        except Exception:
+            result['status'] = 'failed'
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'startup phase={name} status={result["status"]} '
+                f'elapsed_seconds={elapsed:.3f}'
+            )
+
+    def _collectstatic(self, force, result):
+        manifest = os.path.join(settings.STATIC_ROOT, STATIC_MANIFEST_NAME)
+        current = static_sources_hash()
+        if not force and os.path.exists(manifest):
+            with open(manifest) as manifest_file:
+                if manifest_file.read().strip() == current:
+                    result['status'] = 'skipped'
+                    return
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(manifest, 'w') as manifest_file:
+            manifest_file.write(current)
+
+    def _migrate(self, result):
+        # waits out a replica already migrating, usually leaving nothing
+        with shared_advisory_xact_lock(MIGRATION_LOCK_ID):
+            pending = pending_migrations()
+        if not pending:
+            result['status'] = 'skipped'
+            return
+        using = settings.MIGRATION_DATABASE
+        with advisory_lock(MIGRATION_LOCK_ID, using=using):
+            # another replica may have migrated while we waited for the lock
+            if not pending_migrations(using):
+                result['status'] = 'skipped'
+                return
+            call_command('migrate', database=using, interactive=False)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['wait']:
+            with self._phase('wait_for_db'):
+                call_command('wait_for_db', stdout=self.stdout)
+        with self._phase('collectstatic') as result:
+            self._collectstatic(options['force_collectstatic'], result)
+        with self._phase('migrate') as result:
+            self._migrate(result)
+        with self._phase('schema'):
+            build_schema_cache()
+        self.stdout.write(
+            f'startup phase=total status=done '
+            f'elapsed_seconds={time.monotonic() - started:.3f}'
+        )
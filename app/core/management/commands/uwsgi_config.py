@@ -0,0 +1,184 @@
+"""
+Generate the uWSGI configuration from the container's CPU and memory
+"""
+import math
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+SOMAXCONN_PATH = '/proc/sys/net/core/somaxconn'
+# cgroup v1 reports "no limit" as a huge page aligned number
+UNLIMITED_BYTES = 1 << 60
+
+
+def _read(path):
+    try:
+        with open(path) as source:
+            return source.read().strip()
+    except OSError:
+        return None
+
+
+def detect_cpus(cgroup_root=CGROUP_ROOT):
+    """Return the CPUs available to this process, honouring CFS quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = period = None
+    cpu_max = _read(os.path.join(cgroup_root, 'cpu.max'))
+    if cpu_max:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        quota, period = cpu_max.split()
+    else:
+        quota = _read(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_quota_us'))
+        period = _read(
+            os.path.join(cgroup_root, 'cpu', 'cpu.cfs_period_us')
+        )
+    if quota and period and quota not in ('max', '-1'):
+        cpus = min(cpus, max(math.ceil(int(quota) / int(period)), 1))
+
+    return cpus
+
+
+def detect_memory_mb(cgroup_root=CGROUP_ROOT, meminfo='/proc/meminfo'):
+    """Return the memory limit of the container, or of the host"""
+    limit = _read(os.path.join(cgroup_root, 'memory.max'))
+    if limit is None:
+        limit = _read(
+            os.path.join(cgroup_root, 'memory', 'memory.limit_in_bytes')
+        )
+    if limit and limit != 'max' and int(limit) < UNLIMITED_BYTES:
+        return int(limit) // (1024 * 1024)
+    for line in (_read(meminfo) or '').splitlines():
+        if line.startswith('MemTotal:'):
+            return int(line.split()[1]) // 1024
+
+    return None
+
+
+def _env_int(env, name, default):
+    value = env.get(name, '')
+    try:
+        return int(value) if value != '' else default
+    except ValueError:
+        raise CommandError(f'{name} must be an integer, got {value!r}')
+
+
+def build_config(env, cpus, memory_mb, somaxconn=None):
+    """
+    Return the uWSGI options as (key, value) pairs.
+
+    Every value can be overridden with a WSGI_ environment variable; the
+    UWSGI_ prefix is avoided because uWSGI reads those itself.
+    """
+    worker_memory_mb = _env_int(env, 'WSGI_WORKER_MEMORY_MB', 150)
+    # with threads the GIL caps CPU use, so one process per core is enough
+    threads = max(_env_int(env, 'WSGI_THREADS', 1), 1)
+    default_workers = cpus * 2 + 1 if threads == 1 else cpus + 1
+    if memory_mb:
+        # leave a quarter of the memory to the master and page cache
+        default_workers = min(
+            default_workers, int(memory_mb * 0.75) // worker_memory_mb
+        )
+    workers = max(_env_int(env, 'WSGI_WORKERS', default_workers), 1)
+    reload_on_rss = _env_int(
+        env, 'WSGI_RELOAD_ON_RSS_MB',
+        max(int(memory_mb * 0.75) // workers, worker_memory_mb)
+        if memory_mb else 0,
+    )
+    listen = _env_int(env, 'WSGI_LISTEN', 128)
+    if somaxconn:
+        # the kernel silently truncates larger backlogs
+        listen = min(listen, somaxconn)
+
+    options = [
+        ('master', 'true'),
+        ('socket', env.get('WSGI_SOCKET', ':9000')),
+        ('module', 'app.wsgi'),
+        ('need-app', 'true'),
+        ('die-on-term', 'true'),
+        ('vacuum', 'true'),
+        ('single-interpreter', 'true'),
+        ('enable-threads', 'true'),
+        ('workers', workers),
+        ('threads', threads),
+        ('listen', listen),
+        ('harakiri', _env_int(env, 'WSGI_HARAKIRI', 30)),
+        ('harakiri-verbose', 'true'),
+        ('max-requests', _env_int(env, 'WSGI_MAX_REQUESTS', 5000)),
+    ]
+    if reload_on_rss:
+        options.append(('reload-on-rss', reload_on_rss))
+    # preloading in the master lets forked workers share its memory pages
+    options.append(('lazy-apps', 'true' if _env_int(
+        env, 'WSGI_LAZY_APPS', 0
+    ) else 'false'))
+    # busy-worker autoscaling between `cheaper` and `workers` processes,
+    # WSGI_CHEAPER=0 keeps every worker running
+    cheaper = min(
+        _env_int(env, 'WSGI_CHEAPER', max(workers // 4, 1)), workers - 1
+    )
+    if cheaper > 0:
+        options += [
+            ('cheaper-algo', env.get('WSGI_CHEAPER_ALGO', 'busyness')),
+            ('cheaper', cheaper),
+            ('cheaper-initial', min(max(_env_int(
+                env, 'WSGI_CHEAPER_INITIAL', workers // 2
+            ), cheaper), workers)),
+            ('cheaper-step', _env_int(env, 'WSGI_CHEAPER_STEP', 1)),
+            ('cheaper-overload', _env_int(env, 'WSGI_CHEAPER_OVERLOAD', 10)),
+            ('cheaper-busyness-min', _env_int(
+                env, 'WSGI_CHEAPER_BUSYNESS_MIN', 20
+            )),
+            ('cheaper-busyness-max', _env_int(
+                env, 'WSGI_CHEAPER_BUSYNESS_MAX', 70
+            )),
+            # spawn at once when requests queue in the listen backlog
+            ('cheaper-busyness-backlog-alert', _env_int(
+                env, 'WSGI_CHEAPER_BACKLOG_ALERT', 16
+            )),
+        ]
+
+    return options
+
+
+def render(options):
+    lines = ['[uwsgi]']
+    lines += [f'{key} = {value}' for key, value in options]
+
+    return '\n'.join(lines) + '\n'
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the uWSGI ini file sized for the CPUs and memory available '
+        'to the container; WSGI_* environment variables override values.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='Write the ini file here instead of to stdout',
+        )
+
+    def handle(self, *args, **options):
+        somaxconn = _read(SOMAXCONN_PATH)
+        config = build_config(
+            os.environ,
+            cpus=detect_cpus(),
+            memory_mb=detect_memory_mb(),
+            somaxconn=int(somaxconn) if somaxconn else None,
+        )
+        ini = render(config)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(ini)
+            summary = ' '.join(
+                f'{key}={value}' for key, value in config
+                if key in ('workers', 'threads', 'cheaper', 'reload-on-rss')
+            )
+            self.stdout.write(f'uwsgi_config {summary}')
+        else:
+            self.stdout.write(ini, ending='')
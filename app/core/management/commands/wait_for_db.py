@@ -1,23 +1,140 @@
 """
 Wait for the database to be available
 """
+import random
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+
+
+class DatabaseTimeout(Exception):
+    """Raised when a database is still unavailable at the deadline"""
+
+    def __init__(self, message, attempts):
+        super().__init__(message)
+        self.attempts = attempts
 
 
 class Command(BaseCommand):
+    help = (
+        'Wait until every database accepts connections, retrying with '
+        'exponential backoff and jitter until the deadline.'
+    )
 
-    def handle(self, *args, **kwargs):
-        self.stdout.write('waiting for database...')
-        db_up = False
-        while db_up is False:
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='databases',
+            help='Database alias to wait for (default: all configured)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60.0,
+            help='Give up and exit non-zero after this many seconds',
+        )
+        parser.add_argument(
+            '--initial-delay',
+            type=float,
+            default=0.1,
+            help='Delay before the first retry in seconds',
+        )
+        parser.add_argument(
+            '--max-delay',
+            type=float,
+            default=5.0,
+            help='Upper bound for the delay between retries in seconds',
+        )
+        parser.add_argument(
+            '--backoff',
+            type=float,
+            default=2.0,
+            help='Multiplier applied to the delay after each failed attempt',
+        )
+        parser.add_argument(
+            '--no-tcp-probe',
+            action='store_false',
+            dest='tcp_probe',
+            help='Skip the TCP connect probe before the Django checks',
+        )
+
+    def _tcp_probe(self, alias, timeout):
+        """Fail fast while the database port is not accepting connections"""
+        db_settings = connections[alias].settings_dict
+        host = db_settings.get('HOST')
+        if not host or host.startswith('/'):
+            # unix socket, nothing to probe over TCP
+            return
+        port = int(db_settings.get('PORT') or 5432)
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.close()
+
+    def _wait_for(self, alias, started, options):
+        """Retry until `alias` is ready, return the number of attempts"""
+        deadline = started + options['timeout']
+        delay = options['initial_delay']
+        attempts = 0
+        while True:
+            attempts += 1
             try:
-                self.check(databases=['default'])
-                db_up = True
-            except (Psycopg2Error, OperationalError):
-                self.stdout.write('database is unavailable,\
-                     waiting 1 second to retry...')
+                if options['tcp_probe']:
+                    self._tcp_probe(
+                        alias, max(deadline - time.monotonic(), 0.1)
+                    )
+                self.check(databases=[alias])
+                return attempts
+            except (OSError, Psycopg2Error, OperationalError) as exc:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DatabaseTimeout(
+                        f"database '{alias}' unavailable after "
+                        f"{attempts} attempts: {exc}",
+                        attempts,
+                    )
+                sleep = min(delay * random.uniform(0.5, 1.0), remaining)
+                self.stdout.write(
+                    f"database '{alias}' is unavailable, "
+                    f"waiting {sleep:.2f} seconds to retry..."
+                )
+                time.sleep(sleep)
+                delay = min(delay * options['backoff'], options['max_delay'])
+            finally:
+                connections[alias].close()
+
+    def _report(self, alias, status, attempts, started):
+        """Write a logfmt timing line for startup dashboards"""
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'wait_for_db database={alias} status={status} '
+            f'attempts={attempts} elapsed_seconds={elapsed:.3f}'
+        )
+
+    def _wait_and_report(self, alias, started, options):
+        try:
+            attempts = self._wait_for(alias, started, options)
+        except DatabaseTimeout as exc:
+            self._report(alias, 'timeout', exc.attempts, started)
+            return str(exc)
+        self._report(alias, 'ready', attempts, started)
+
+        return None
+
+    def handle(self, *args, **options):
+        aliases = options['databases'] or list(connections)
+        self.stdout.write('waiting for database...')
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(aliases)) as executor:
+            errors = list(filter(None, executor.map(
+                lambda alias: self._wait_and_report(alias, started, options),
+                aliases,
+            )))
+        if errors:
+            raise CommandError('; '.join(errors))
         self.stdout.write(self.style.SUCCESS('database is available now!'))
@@ -0,0 +1,68 @@
+"""
+Prometheus metrics shared by every worker process
+"""
+import os
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    multiprocess,
+)
+
+REQUESTS = Counter(
+    'http_requests_total',
+    'HTTP requests by route, method and status',
+    ['view', 'method', 'status'],
+)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time spent serving HTTP requests',
+    ['view', 'method'],
+    buckets=(
+        .005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 10.0,
+    ),
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Size of HTTP response bodies',
+    ['view'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Database queries run while serving a request',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+DB_TIME = Histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in the database while serving a request',
+    ['view'],
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Lookups in application caches by result (hit or miss)',
+    ['cache', 'result'],
+)
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup, for hit ratios per cache"""
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def get_registry():
+    """
+    Return the registry to expose.
+
+    With PROMETHEUS_MULTIPROC_DIR set every uWSGI worker writes its samples
+    to files in that directory, and they are aggregated here at scrape time.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+
+    return REGISTRY
@@ -0,0 +1,412 @@
+"""
+Middleware for Core app
+"""
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+import types
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+from rest_framework.authentication import get_authorization_header
+
+from core import metrics, profiling
+from core.db import routers
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def get_request_token(request):
+    """Return the DRF auth token sent with the request, if any"""
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return None
+    try:
+        return auth[1].decode()
+    except UnicodeError:
+        return None
+
+
+def _inline_hook(method):
+    """Return an async hook calling a non-blocking sync hook directly"""
+    async def hook(middleware, *args):
+        return method(*args)
+
+    # Django names the middleware from the hook's __self__
+    return types.MethodType(hook, method.__self__)
+
+
+class AroundMiddleware:
+    """
+    Base for middleware running natively under both WSGI and ASGI.
+
+    Subclasses implement `around(request)`, a generator that runs before
+    the view, receives the response from its single `yield` and returns
+    the response to send. Under ASGI the chain stays on the event loop
+    instead of hopping to Django's single sync thread for each middleware.
+    Hooks named in `inline_hooks` must not block and are called from the
+    event loop as they are.
+    """
+
+    sync_capable = True
+    async_capable = True
+    inline_hooks = ()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # how Django's MiddlewareMixin marks instances to be awaited
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            for name in self.inline_hooks:
+                setattr(self, name, _inline_hook(getattr(self, name)))
+
+    def around(self, request):
+        return (yield)
+
+    def _resume(self, hook, response=None, exception=None):
+        try:
+            if exception is not None:
+                hook.throw(exception)
+            else:
+                hook.send(response)
+        except StopIteration as stop:
+            return stop.value
+        raise RuntimeError(f'{type(self).__name__}.around() yielded twice')
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        hook = self.around(request)
+        next(hook)
+        try:
+            response = self.get_response(request)
+        except Exception as exc:
+            return self._resume(hook, exception=exc)
+
+        return self._resume(hook, response)
+
+    async def _acall(self, request):
+        hook = self.around(request)
+        next(hook)
+        try:
+            response = await self.get_response(request)
+        except Exception as exc:
+            return self._resume(hook, exception=exc)
+
+        return self._resume(hook, response)
+
+
+def allows_replica_reads(method, view_func):
+    """Return whether a request may read from a replica, pins aside"""
+    # without replicas every read is a read of the primary already
+    if method not in SAFE_METHODS or not settings.DATABASE_REPLICAS:
+        return False
+    view_class = getattr(view_func, 'cls', None)
+
+    return getattr(view_class, 'read_from_replica', False)
+
+
+class ReplicaRoutingMiddleware(AroundMiddleware):
+    """
+    Route safe requests of replica-enabled views to read replicas.
+
+    Views opt in with a `read_from_replica = True` class attribute. After a
+    successful write the client's token is pinned to the primary for
+    DATABASE_REPLICA_PIN_SECONDS, so it reads its own writes even while
+    the replicas lag behind. A view whose method does not tell whether it
+    wrote (such as the batch API) sets `request.pin_to_primary` instead.
+    """
+
+    inline_hooks = ('process_view',)
+
+    def around(self, request):
+        try:
+            response = yield
+        finally:
+            routers.disable_replica_reads()
+
+        wrote = getattr(
+            request, 'pin_to_primary', request.method not in SAFE_METHODS
+        )
+        if (
+            settings.DATABASE_REPLICAS
+            and wrote
+            and response.status_code < 400
+        ):
+            self._pin(request, response)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not allows_replica_reads(request.method, view_func):
+            return None
+        token = get_request_token(request)
+        if token is not None and routers.is_pinned_to_primary(token):
+            return None
+        routers.enable_replica_reads()
+
+        return None
+
+    def _pin(self, request, response):
+        tokens = [get_request_token(request)]
+        # the token endpoint hands out a token the client reads with next
+        data = getattr(response, 'data', None)
+        if isinstance(data, dict) and isinstance(data.get('token'), str):
+            tokens.append(data['token'])
+        for token in filter(None, tokens):
+            routers.pin_to_primary(token)
+
+
+class PathScopedMiddleware:
+    """
+    Run SCOPED_MIDDLEWARE only for paths under SCOPED_MIDDLEWARE_PATHS.
+
+    The token-authenticated API needs none of the session, CSRF, auth and
+    messages middleware the admin relies on, so those are chained here and
+    skipped for every other path. The chain is built the way Django's
+    handler builds MIDDLEWARE, including the process_view,
+    process_template_response and process_exception hooks.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        self.prefixes = tuple(settings.SCOPED_MIDDLEWARE_PATHS)
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = get_response
+        for middleware_path in reversed(settings.SCOPED_MIDDLEWARE):
+            try:
+                middleware = import_string(middleware_path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(middleware, 'process_view'):
+                self._view_middleware.insert(0, middleware.process_view)
+            if hasattr(middleware, 'process_template_response'):
+                self._template_response_middleware.append(
+                    middleware.process_template_response
+                )
+            if hasattr(middleware, 'process_exception'):
+                self._exception_middleware.append(
+                    middleware.process_exception
+                )
+            handler = convert_exception_to_response(middleware)
+        self.scoped_handler = handler
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            self.process_view = self._async_hook(
+                self.process_view, lambda args: None
+            )
+            self.process_template_response = self._async_hook(
+                self.process_template_response, lambda args: args[0]
+            )
+            self.process_exception = self._async_hook(
+                self.process_exception, lambda args: None
+            )
+
+    def _async_hook(self, method, out_of_scope):
+        """Only hop to the sync thread for the scoped middleware"""
+        run_scoped = sync_to_async(method, thread_sensitive=True)
+
+        async def hook(middleware, request, *args):
+            if not middleware.in_scope(request):
+                return out_of_scope(args)
+            return await run_scoped(request, *args)
+
+        return types.MethodType(hook, self)
+
+    def in_scope(self, request):
+        return request.path_info.startswith(self.prefixes)
+
+    def __call__(self, request):
+        # under ASGI both handlers are coroutine functions
+        if self.in_scope(request):
+            return self.scoped_handler(request)
+
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.in_scope(request):
+            return None
+        for process_view in self._view_middleware:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+
+        return None
+
+    def process_template_response(self, request, response):
+        if self.in_scope(request):
+            for process in self._template_response_middleware:
+                response = process(request, response)
+
+        return response
+
+    def process_exception(self, request, exception):
+        if not self.in_scope(request):
+            return None
+        for process_exception in self._exception_middleware:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
+
+        return None
+
+
+class ServerTimingMiddleware(AroundMiddleware):
+    """
+    Report where the time of each request went.
+
+    Enabled with REQUEST_PROFILING; otherwise Django drops it from the
+    stack at startup, so it costs nothing. Adds a `Server-Timing` header
+    with db, serialize, render and total durations and logs the same as
+    JSON. Requests picked by REQUEST_PROFILING_SAMPLE_RATE, or sent with
+    `X-Profile: 1` when REQUEST_PROFILING_ALLOW_HEADER is on, also get a
+    cProfile dump written to REQUEST_PROFILING_DIR; not under ASGI, where
+    a profiler would see every request sharing the event loop.
+    """
+
+    inline_hooks = ('process_template_response',)
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        profiling.instrument_serializers()
+
+    def _wants_profile(self, request):
+        if (
+            settings.REQUEST_PROFILING_ALLOW_HEADER and
+            request.headers.get('X-Profile') == '1'
+        ):
+            return True
+        rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+
+        return rate > 0 and random.random() < rate
+
+    def _dump_profile(self, profiler, request):
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-')
+        name = (
+            f'{time.strftime("%Y%m%dT%H%M%S")}-{request.method}-'
+            f'{slug or "root"}-{os.getpid()}.prof'
+        )
+        os.makedirs(settings.REQUEST_PROFILING_DIR, exist_ok=True)
+        path = os.path.join(settings.REQUEST_PROFILING_DIR, name)
+        profiler.dump_stats(path)
+
+        return path
+
+    def around(self, request):
+        timings = profiling.start()
+        profiler = None
+        if not self.is_async and self._wants_profile(request):
+            profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            with profiling.observing_queries(timings):
+                if profiler is not None:
+                    try:
+                        profiler.enable()
+                    except ValueError:
+                        # another profiler is already active in this thread
+                        profiler = None
+                try:
+                    response = yield
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            profiling.stop()
+        total = time.perf_counter() - start
+
+        metrics = {
+            'db': timings.db_time,
+            'serialize': timings.serialize_time,
+            'render': timings.render_time,
+            'total': total,
+        }
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.2f}'
+            for name, duration in metrics.items()
+        ) + f', db-queries;desc="{timings.db_queries}"'
+
+        record = {
+            'event': 'request_timing',
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'db_queries': timings.db_queries,
+            **{
+                f'{name}_ms': round(duration * 1000, 3)
+                for name, duration in metrics.items()
+            },
+        }
+        if profiler is not None:
+            record['profile'] = self._dump_profile(profiler, request)
+        logger.info(json.dumps(record))
+
+        return response
+
+    def process_template_response(self, request, response):
+        timings = profiling.current()
+        if timings is not None:
+            timings.render_started()
+            response.add_post_render_callback(timings.render_finished)
+
+        return response
+
+
+class MetricsMiddleware(AroundMiddleware):
+    """
+    Record request counts, latency, response size and database queries.
+
+    Samples are labelled by route name (e.g. `recipe:recipe-list`) and
+    exposed on the metrics endpoint. Turned off with METRICS_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def around(self, request):
+        queries = profiling.RequestTimings()
+        start = time.perf_counter()
+        with profiling.observing_queries(queries):
+            response = yield
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        # unresolved paths share one label to keep cardinality bounded
+        view = match.view_name if match else '<unresolved>'
+        metrics.REQUESTS.labels(
+            view=view, method=request.method, status=response.status_code
+        ).inc()
+        metrics.REQUEST_LATENCY.labels(
+            view=view, method=request.method
+        ).observe(duration)
+        metrics.DB_QUERIES.labels(view=view).observe(queries.db_queries)
+        metrics.DB_TIME.labels(view=view).observe(queries.db_time)
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.labels(view=view).observe(
+                len(response.content)
+            )
+
+        return response
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:23
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+BACKFILL = '''
+UPDATE core_recipe AS recipe
+SET {item}_ids = item.ids, {item}_names = item.names
+FROM (
+    SELECT link.recipe_id,
+           array_agg(item.id ORDER BY item.id) AS ids,
+           array_agg(item.name ORDER BY item.id) AS names
+    FROM core_recipe_{relation} AS link
+    JOIN core_{item} AS item ON item.id = link.{item}_id
+    GROUP BY link.recipe_id
+) AS item
+WHERE recipe.id = item.recipe_id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_is_hidden'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_names',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=255), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_names',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=255), blank=True, default=list, size=None),
+        ),
+        # backfilled before 0011 indexes the arrays, building a GIN index
+        # once is cheaper than updating it row by row
+        migrations.RunSQL(
+            BACKFILL.format(item='tag', relation='tags'),
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            BACKFILL.format(item='ingredient', relation='ingredients'),
+            migrations.RunSQL.noop,
+        ),
+    ]
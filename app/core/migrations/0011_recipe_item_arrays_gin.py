@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:23
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # apart from 0010: Postgres cannot index a table with the pending
+    # trigger events its backfill leaves in the same transaction
+
+    dependencies = [
+        ('core', '0010_recipe_item_arrays'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tag_ids'], name='core_recipe_tag_ids_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_ids'], name='core_recipe_ingr_ids_gin'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-19 00:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BACKFILL = '''
+INSERT INTO core_userstats (
+    user_id, recipe_count, price_sum, price_min, price_max,
+    time_minutes_sum, tag_count, ingredient_count
+)
+SELECT account.id,
+       COALESCE(recipe.count, 0),
+       COALESCE(recipe.price_sum, 0),
+       recipe.price_min,
+       recipe.price_max,
+       COALESCE(recipe.time_minutes_sum, 0),
+       (SELECT count(*) FROM core_tag WHERE user_id = account.id),
+       (SELECT count(*) FROM core_ingredient WHERE user_id = account.id)
+FROM core_user AS account
+LEFT JOIN (
+    SELECT user_id,
+           count(*) AS count,
+           sum(price) AS price_sum,
+           min(price) AS price_min,
+           max(price) AS price_max,
+           sum(time_minutes) AS time_minutes_sum
+    FROM core_recipe
+    WHERE NOT is_hidden
+    GROUP BY user_id
+) AS recipe ON recipe.user_id = account.id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_item_arrays_gin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.user')),
+                ('recipe_count', models.PositiveIntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('price_min', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('price_max', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('time_minutes_sum', models.BigIntegerField(default=0)),
+                ('tag_count', models.PositiveIntegerField(default=0)),
+                ('ingredient_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
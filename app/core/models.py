@@ -3,7 +3,10 @@ import uuid
 import os
 
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models # noqa
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -66,6 +69,37 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # deleted in bulk, waiting for the background purge
+    is_hidden = models.BooleanField(default=False)
+    # copies of the tags and ingredients ordered by id, so listing and
+    # filtering recipes needs no joins; kept in sync by recipe.denormalize
+    tag_ids = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    tag_names = ArrayField(
+        models.CharField(max_length=255), default=list, blank=True
+    )
+    ingredient_ids = ArrayField(
+        models.BigIntegerField(), default=list, blank=True
+    )
+    ingredient_names = ArrayField(
+        models.CharField(max_length=255), default=list, blank=True
+    )
+
+    class Meta:
+        indexes = [
+            # serve the overlap (&&) filters on tags and ingredients
+            GinIndex(fields=['tag_ids'], name='core_recipe_tag_ids_gin'),
+            GinIndex(
+                fields=['ingredient_ids'], name='core_recipe_ingr_ids_gin'
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # as loaded, so a later save() can tell what changed
+        instance._loaded_values = dict(zip(field_names, values))
+
+        return instance
 
     def __str__(self) -> str:
         return self.title
@@ -77,6 +111,12 @@ class Tag(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # serves the keyset paginated (name, id) listing per user
+            models.Index(fields=['user', 'name', 'id']),
+        ]
+
     def __str__(self) -> str:
         return self.name
 
@@ -89,5 +129,102 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            # serves the keyset paginated (name, id) listing per user
+            models.Index(fields=['user', 'name', 'id']),
+        ]
+
     def __str__(self) -> str:
         return self.name
+
+
+class UserStats(models.Model):
+    """Per-user recipe summary, kept up to date by user.stats"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats',
+    )
+    # visible recipes only, bulk deleted ones leave the summary at once
+    recipe_count = models.PositiveIntegerField(default=0)
+    price_sum = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    price_min = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True, blank=True
+    )
+    price_max = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True, blank=True
+    )
+    time_minutes_sum = models.BigIntegerField(default=0)
+    tag_count = models.PositiveIntegerField(default=0)
+    ingredient_count = models.PositiveIntegerField(default=0)
+
+    @property
+    def price_avg(self):
+        if self.recipe_count:
+            return self.price_sum / self.recipe_count
+
+    @property
+    def time_minutes_avg(self):
+        if self.recipe_count:
+            return self.time_minutes_sum / self.recipe_count
+
+    def __str__(self) -> str:
+        return f'stats of {self.user_id}'
+
+
+class Job(models.Model):
+    """Background job, claimed by `run_workers` with SKIP LOCKED"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the claim query only scans jobs that are due
+            models.Index(
+                fields=['run_at', 'id'],
+                name='core_job_queued_idx',
+                condition=models.Q(status='queued'),
+            ),
+            # finds jobs whose worker died while running them
+            models.Index(
+                fields=['locked_at'],
+                name='core_job_running_idx',
+                condition=models.Q(status='running'),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,125 @@
+"""
+Per-request timing of database, serializer and render work
+"""
+import functools
+import time
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from rest_framework import serializers
+
+_state = Local()
+
+
+class RequestTimings:
+    """Durations (in seconds) collected while serving one request"""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self._serializer_depth = 0
+        self._render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper counting and timing every query"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+    def render_started(self):
+        self._render_started = time.perf_counter()
+
+    def render_finished(self, response=None):
+        if self._render_started is not None:
+            self.render_time += time.perf_counter() - self._render_started
+            self._render_started = None
+
+
+def start():
+    """Start collecting timings for the current request"""
+    _state.timings = RequestTimings()
+
+    return _state.timings
+
+
+def stop():
+    _state.timings = None
+
+
+def current():
+    """Return the timings of the current request, if they are collected"""
+    return getattr(_state, 'timings', None)
+
+
+def observe_queries(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection.
+
+    Forwards queries to the observers of the request being served. The
+    observers live in a context-local, so queries the ORM runs for the
+    request in another thread (sync views under ASGI, core.concurrency)
+    are still seen.
+    """
+    observers = getattr(_state, 'query_observers', None)
+    if not observers:
+        return execute(sql, params, many, context)
+    for observer in reversed(observers):
+        execute = functools.partial(observer, execute)
+
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def observing_queries(observer):
+    """Send the current request's queries through `observer`"""
+    observers = getattr(_state, 'query_observers', ())
+    _state.query_observers = (*observers, observer)
+    try:
+        yield
+    finally:
+        _state.query_observers = observers
+
+
+def install_query_observer(sender, connection, **kwargs):
+    """connection_created receiver adding observe_queries"""
+    if observe_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_queries)
+
+
+def _timed_data(fget):
+    @functools.wraps(fget)
+    def data(self):
+        timings = current()
+        # nested serializers are part of the outermost one's time
+        if timings is None or timings._serializer_depth:
+            return fget(self)
+        timings._serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            timings.serialize_time += time.perf_counter() - start
+            timings._serializer_depth -= 1
+
+    return data
+
+
+_serializers_instrumented = False
+
+
+def instrument_serializers():
+    """Time serializer `.data` access; only patched when profiling is on"""
+    global _serializers_instrumented
+    if _serializers_instrumented:
+        return
+    for serializer_class in [
+        serializers.Serializer, serializers.ListSerializer
+    ]:
+        data = serializer_class.__dict__['data']
+        serializer_class.data = property(_timed_data(data.fget))
+    _serializers_instrumented = True
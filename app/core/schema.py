@@ -0,0 +1,160 @@
+"""
+Pre-generated OpenAPI schema served from memory or disk
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import translation
+from django.utils.http import parse_etags, quote_etag
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+
+from core.metrics import record_cache
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """Return APP_VERSION, or a hash of the project's python sources"""
+    if settings.APP_VERSION:
+        return settings.APP_VERSION
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(settings.BASE_DIR):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, settings.BASE_DIR)
+                digest.update(relative.encode())
+                with open(path, 'rb') as source:
+                    digest.update(source.read())
+
+    return digest.hexdigest()[:16]
+
+
+def schema_language():
+    """
+    Return the active language as one of settings.LANGUAGES.
+
+    It comes from the unauthenticated ?lang= parameter and names cache
+    entries and files, so anything else falls back to LANGUAGE_CODE.
+    """
+    try:
+        return translation.get_supported_language_variant(
+            translation.get_language()
+        )
+    except LookupError:
+        return translation.get_supported_language_variant(
+            settings.LANGUAGE_CODE
+        )
+
+
+class SchemaCache:
+    """Rendered schema documents keyed by format and language"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _path(self, fmt, lang):
+        return os.path.join(
+            settings.SCHEMA_CACHE_DIR, code_version(), f'schema-{lang}.{fmt}'
+        )
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as cached:
+                return cached.read()
+        except OSError:
+            return None
+
+    def _write(self, path, content):
+        """Write atomically so concurrent workers never read half a file"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            # the disk copy is an optimisation, memory still works
+            pass
+
+    def _generate(self, renderer, lang, view=None):
+        generator_class = spectacular_settings.DEFAULT_GENERATOR_CLASS
+        generator = generator_class(
+            urlconf=getattr(view, 'urlconf', None),
+            api_version=getattr(view, 'api_version', None),
+        )
+        with translation.override(lang):
+            schema = generator.get_schema(
+                request=None, public=spectacular_settings.SERVE_PUBLIC
+            )
+
+        return renderer.render(schema, renderer_context={})
+
+    def get(self, renderer, view=None):
+        """Return (content, etag) for the renderer and active language"""
+        key = (code_version(), renderer.format, schema_language())
+        entry = self._entries.get(key)
+        if entry is not None:
+            record_cache('schema', hit=True)
+            return entry
+        with self._lock:
+            if key in self._entries:
+                record_cache('schema', hit=True)
+                return self._entries[key]
+            path = self._path(renderer.format, key[2])
+            content = self._read(path)
+            record_cache('schema', hit=content is not None)
+            if content is None:
+                content = self._generate(renderer, key[2], view)
+                self._write(path, content)
+            etag = quote_etag(hashlib.sha256(content).hexdigest()[:32])
+            self._entries[key] = (content, etag)
+
+        return self._entries[key]
+
+
+schema_cache = SchemaCache()
+
+
+def build_schema_cache():
+    """Render the schema in every format ahead of the first request"""
+    with translation.override(settings.LANGUAGE_CODE):
+        for renderer_class in [OpenApiYamlRenderer, OpenApiJsonRenderer]:
+            schema_cache.get(renderer_class())
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    Serve the schema generated once per code version.
+
+    Introspecting every viewset takes hundreds of milliseconds, so the
+    rendered document is kept in memory and in SCHEMA_CACHE_DIR, and
+    clients revalidate with If-None-Match against its ETag.
+    """
+
+    def _get_schema_response(self, request):
+        renderer = request.accepted_renderer
+        content, etag = schema_cache.get(renderer, view=self)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and etag in parse_etags(if_none_match):
+            response = HttpResponseNotModified()
+        else:
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type = f'{content_type}; charset={renderer.charset}'
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+
+        return response
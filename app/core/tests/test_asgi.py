@@ -0,0 +1,160 @@
+"""
+Tests for serving requests in ASGI mode
+"""
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connections
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import include, path
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from core import concurrency, views as core_views
+from core.db import routers
+from core.models import Recipe
+from recipe import views as recipe_views
+
+
+async def asgi_post(path, data, headers):
+    """
+    POST multipart data through the ASGI handler the way a server does.
+
+    The test AsyncClient of Django 3.2 cannot send multipart bodies, the
+    upload handlers read past its fake payload.
+    """
+    body = encode_multipart(BOUNDARY, data)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': path,
+        'query_string': b'',
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+        'headers': [
+            (b'host', b'testserver'),
+            (b'content-type', MULTIPART_CONTENT.encode()),
+            (b'content-length', str(len(body)).encode()),
+            *[(key.encode(), value.encode()) for key, value in headers],
+        ],
+    }
+    messages = [{'type': 'http.request', 'body': body}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await ASGIHandler()(scope, receive, send)
+    status = sent[0]['status']
+    content = b''.join(message.get('body', b'') for message in sent[1:])
+
+    return status, json.loads(content)
+
+
+urlpatterns = [
+    path('api/health-check/', core_views.health_check_async),
+    path('api/sync-health-check/', core_views.health_check),
+    path(
+        'api/recipe/recipes/<int:pk>/upload-image/',
+        recipe_views.upload_image_async,
+    ),
+    path('api/recipe/', include('recipe.urls')),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsgiTests(TransactionTestCase):
+    """Test the async views and middleware under the ASGI handler"""
+
+    def setUp(self):
+        # a private pool, so its connections can be closed afterwards
+        executor = ThreadPoolExecutor(max_workers=1)
+        patcher = patch.object(concurrency, '_executor', executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(
+            lambda: executor.submit(connections.close_all).result()
+        )
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.client = AsyncClient()
+
+    async def test_async_health_check(self):
+        """Test the async health check through the async middleware"""
+        res = await self.client.get('/api/health-check/')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'healthy': True})
+
+    async def test_sync_views_still_served(self):
+        """Test DRF views work under the ASGI handler"""
+        res = await self.client.get('/api/sync-health-check/')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'healthy': True})
+
+    async def test_run_sync_carries_context(self):
+        """Test request locals are visible on the pool threads"""
+        routers.enable_replica_reads()
+        try:
+            enabled = await concurrency.run_sync(
+                routers.replica_reads_enabled
+            )
+        finally:
+            routers.disable_replica_reads()
+
+        self.assertTrue(enabled)
+
+    def _create_recipe(self):
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='secret'
+        )
+        token = Token.objects.create(user=user)
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=2
+        )
+
+        return token.key, recipe
+
+    async def test_upload_image_async(self):
+        """Test uploading an image through the async view"""
+        key, recipe = await concurrency.run_sync(self._create_recipe)
+        image = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(image, format='JPEG')
+        image.seek(0)
+        image.name = 'soup.jpg'
+
+        with override_settings(MEDIA_ROOT=self.media.name):
+            status, content = await asgi_post(
+                f'/api/recipe/recipes/{recipe.id}/upload-image/',
+                {'image': image},
+                [('authorization', f'Token {key}')],
+            )
+            recipe = await concurrency.run_sync(
+                Recipe.objects.get, id=recipe.id
+            )
+            stored = os.path.exists(recipe.image.path)
+
+        self.assertEqual(status, 200)
+        self.assertIn('image', content)
+        self.assertTrue(stored)
+
+    async def test_upload_image_async_requires_auth(self):
+        """Test the async upload still authenticates"""
+        res = await self.client.post('/api/recipe/recipes/1/upload-image/')
+
+        self.assertEqual(res.status_code, 401)
@@ -0,0 +1,203 @@
+"""
+Tests for the batch API
+"""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from core.db import routers
+from core.models import Recipe, Tag
+from user.views import ManageUserView
+
+BATCH_URL = reverse('batch')
+RECIPES_PATH = reverse('recipe:recipe-list')
+
+RECIPE = {'title': 'Soup', 'time_minutes': 5, 'price': '2.50'}
+
+
+class BatchTests(TestCase):
+    """Test running several requests in one call"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'secret', name='Test'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def _batch(self, requests, **params):
+        return self.client.post(
+            BATCH_URL, {'requests': requests, **params}, format='json'
+        )
+
+    def test_requires_auth(self):
+        """Test a batch needs a token"""
+        res = APIClient().post(BATCH_URL, {'requests': [
+            {'method': 'GET', 'path': reverse('user:me')},
+        ]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_responses_in_order(self):
+        """Test each request gets its own status and body"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self._batch([
+                {'method': 'GET', 'path': reverse('user:me')},
+                {'method': 'POST', 'path': RECIPES_PATH, 'body': RECIPE},
+                {'method': 'GET', 'path': reverse('recipe:tag-list')},
+                {'method': 'GET', 'path': f'{RECIPES_PATH}?ids=0'},
+                {'method': 'GET', 'path': '/api/missing/'},
+            ])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        responses = res.json()['responses']
+        self.assertEqual([response['status'] for response in responses], [
+            200, 201, 200, 200, 404,
+        ])
+        self.assertEqual(responses[0]['body'], {
+            'email': 'user@example.com', 'name': 'Test',
+        })
+        self.assertEqual(responses[1]['body']['title'], 'Soup')
+        self.assertEqual(responses[2]['body'][0]['name'], 'Vegan')
+        self.assertEqual(responses[3]['body'], [])
+        # the token was looked up once for the whole batch
+        self.assertEqual(sum(
+            'authtoken_token' in query['sql']
+            for query in queries.captured_queries
+        ), 1)
+
+    def test_atomic_batch_rolled_back(self):
+        """Test a failing request undoes the batch in atomic mode"""
+        requests = [
+            {'method': 'POST', 'path': RECIPES_PATH, 'body': RECIPE},
+            {'method': 'PATCH', 'path': f'{RECIPES_PATH}0/', 'body': {}},
+            {'method': 'GET', 'path': reverse('user:me')},
+        ]
+
+        res = self._batch(requests, atomic=True)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [response['status'] for response in res.json()['responses']],
+            [201, 404],
+        )
+        self.assertFalse(Recipe.objects.exists())
+
+        res = self._batch(requests)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.json()['responses']), 3)
+        self.assertTrue(Recipe.objects.exists())
+
+    def test_server_error_kept_to_its_request(self):
+        """Test an exception in one view fails that request only"""
+        with mock.patch.object(
+            ManageUserView, 'retrieve', side_effect=RuntimeError
+        ), self.assertLogs('core.batch', 'ERROR'):
+            res = self._batch([
+                {'method': 'GET', 'path': reverse('user:me')},
+                {'method': 'GET', 'path': reverse('recipe:tag-list')},
+            ])
+
+        self.assertEqual(
+            [response['status'] for response in res.json()['responses']],
+            [500, 200],
+        )
+
+    def test_invalid_batches(self):
+        """Test malformed, oversized and nested batches are rejected"""
+        get_me = {'method': 'GET', 'path': reverse('user:me')}
+        for requests in [
+            [],
+            [{'method': 'GET', 'path': '/admin/'}],
+            [{'method': 'OPTIONS', 'path': reverse('user:me')}],
+            [get_me] * 21,
+        ]:
+            res = self._batch(requests)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self._batch([{'method': 'POST', 'path': BATCH_URL}])
+
+        self.assertEqual(res.json()['responses'][0]['status'], 400)
+
+
+# the views are stubbed, so nothing reads from the replica that is not there
+@override_settings(
+    DATABASE_REPLICAS=['replica_a'], DATABASE_REPLICA_PIN_CACHE='default'
+)
+class BatchReplicaRoutingTests(TestCase):
+    """Test batched reads are routed like single requests"""
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'secret'
+        )
+        self.token = Token.objects.create(user=user).key
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.replica_reads = []
+
+        def record(view, request, *args, **kwargs):
+            self.replica_reads.append(routers.replica_reads_enabled())
+            return Response({})
+
+        patcher = mock.patch.object(ManageUserView, 'retrieve', record)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _batch(self, requests, **params):
+        res = self.client.post(
+            BATCH_URL, {'requests': requests, **params}, format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return res
+
+    def test_reads_before_writes_use_replicas(self):
+        """Test reads go to replicas until the batch writes"""
+        get_me = {'method': 'GET', 'path': reverse('user:me')}
+        self._batch([get_me, {
+            'method': 'POST', 'path': RECIPES_PATH, 'body': RECIPE,
+        }, get_me])
+
+        self.assertEqual(self.replica_reads, [True, False])
+        self.assertFalse(routers.replica_reads_enabled())
+        self.assertTrue(routers.is_pinned_to_primary(self.token))
+
+        self._batch([get_me])
+
+        self.assertEqual(self.replica_reads, [True, False, False])
+
+    def test_read_only_batch_not_pinned(self):
+        """Test batches of reads and failed writes do not pin the token"""
+        self._batch([
+            {'method': 'GET', 'path': reverse('user:me')},
+            {'method': 'PATCH', 'path': f'{RECIPES_PATH}0/', 'body': {}},
+        ])
+
+        self.assertEqual(self.replica_reads, [True])
+        self.assertFalse(routers.is_pinned_to_primary(self.token))
+
+    def test_atomic_batch_reads_primary(self):
+        """Test atomic batches read everything from the primary"""
+        self._batch(
+            [{'method': 'GET', 'path': reverse('user:me')}], atomic=True
+        )
+
+        self.assertEqual(self.replica_reads, [False])
+        self.assertFalse(routers.is_pinned_to_primary(self.token))
@@ -2,13 +2,17 @@
 Test Django command to wait for the database
 """
 
-from unittest.mock import patch
+from io import StringIO
+from unittest.mock import Mock, patch
 from psycopg2 import OperationalError as Psycopg2Error
 
 from django.core.management import call_command
-from django.db.utils import OperationalError
+from django.core.management.base import CommandError
+from django.db.utils import ConnectionHandler, OperationalError
 from django.test import SimpleTestCase
 
+CONNECTIONS = 'core.management.commands.wait_for_db.connections'
+
 
 @patch("core.management.commands.wait_for_db.Command.check")
 class CommandTest(SimpleTestCase):
@@ -30,3 +34,63 @@ class CommandTest(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+    @patch('time.sleep')
+    def test_wait_for_db_backoff(self, patched_sleep, patched_check):
+        # Test retry delays grow exponentially up to the maximum
+        patched_check.side_effect = [OperationalError] * 5 + [True]
+
+        call_command(
+            'wait_for_db', '--no-tcp-probe',
+            initial_delay=1, max_delay=4, backoff=2,
+        )
+
+        delays = [c.args[0] for c in patched_sleep.call_args_list]
+        self.assertEqual(len(delays), 5)
+        for delay, upper in zip(delays, [1, 2, 4, 4, 4]):
+            self.assertGreaterEqual(delay, upper / 2)
+            self.assertLessEqual(delay, upper)
+
+    @patch('time.sleep')
+    def test_wait_for_db_deadline(self, patched_sleep, patched_check):
+        # Test giving up with an error once the deadline passes
+        patched_check.side_effect = OperationalError
+
+        with self.assertRaises(CommandError):
+            call_command('wait_for_db', '--no-tcp-probe', timeout=0)
+
+        patched_check.assert_called_once_with(databases=['default'])
+        patched_sleep.assert_not_called()
+
+    @patch('core.management.commands.wait_for_db.socket.create_connection')
+    def test_wait_for_db_tcp_probe(self, patched_connect, patched_check):
+        # Test the TCP probe failing skips the Django checks
+        patched_connect.side_effect = [ConnectionRefusedError, Mock()]
+        out = StringIO()
+
+        with patch('time.sleep'), patch(CONNECTIONS, ConnectionHandler({
+            'default': {'HOST': 'db', 'PORT': '5433'},
+        })):
+            call_command('wait_for_db', stdout=out)
+
+        self.assertEqual(patched_connect.call_count, 2)
+        self.assertEqual(patched_connect.call_args.args[0], ('db', 5433))
+        patched_check.assert_called_once_with(databases=['default'])
+        self.assertIn(
+            'wait_for_db database=default status=ready attempts=2',
+            out.getvalue(),
+        )
+
+    def test_wait_for_db_all_databases(self, patched_check):
+        # Test every configured database is checked
+        patched_check.return_value = True
+
+        with patch(CONNECTIONS, ConnectionHandler({
+            'default': {}, 'replica_0': {},
+        })):
+            call_command('wait_for_db')
+
+        self.assertCountEqual(
+            [c.kwargs['databases'] for c in patched_check.call_args_list],
+            [['default'], ['replica_0']],
+        )
@@ -0,0 +1,52 @@
+"""
+Tests for the health checked database backend
+"""
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+
+class HealthCheckedConnectionTests(TransactionTestCase):
+    """Test persistent connections are checked once per request"""
+
+    def setUp(self):
+        self.enabled = connection.health_check_enabled
+        connection.health_check_enabled = True
+        connection.ensure_connection()
+
+    def tearDown(self):
+        connection.health_check_enabled = self.enabled
+
+    def test_dead_connection_replaced(self):
+        """Test an unusable connection is reconnected on next use"""
+        old = connection.connection
+        connection.close_if_unusable_or_obsolete()
+
+        with patch.object(connection, 'is_usable', return_value=False):
+            connection.ensure_connection()
+
+        self.assertIsNot(connection.connection, old)
+        self.assertTrue(connection.health_check_done)
+
+    def test_checked_once_per_request(self):
+        """Test the health check runs once between request boundaries"""
+        connection.close_if_unusable_or_obsolete()
+
+        with patch.object(
+            connection, 'is_usable', return_value=True
+        ) as is_usable:
+            connection.ensure_connection()
+            connection.ensure_connection()
+
+        is_usable.assert_called_once()
+
+    def test_not_checked_when_disabled(self):
+        """Test no health check query runs when disabled"""
+        connection.health_check_enabled = False
+        connection.close_if_unusable_or_obsolete()
+
+        with patch.object(connection, 'is_usable') as is_usable:
+            connection.ensure_connection()
+
+        is_usable.assert_not_called()
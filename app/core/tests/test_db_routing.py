@@ -0,0 +1,267 @@
+"""
+Tests for read replica routing
+"""
+import unittest
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.checks import Error
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from core import checks
+from core.db import routers
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Tag
+from recipe.views import RecipeViewSet, TagViewSet, IngredientViewSet
+from user.views import ManageUserView
+
+
+class ReplicaView:
+    read_from_replica = True
+
+
+class PrimaryView:
+    pass
+
+
+def view_func(view_class):
+    def view(request):
+        pass
+    view.cls = view_class
+
+    return view
+
+
+@override_settings(DATABASE_REPLICAS=['replica_a', 'replica_b'])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    """Test the database router"""
+
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+        self.addCleanup(routers.disable_replica_reads)
+
+    def test_reads_use_primary_by_default(self):
+        """Test reads go to the primary outside replica requests"""
+        self.assertIsNone(self.router.db_for_read(Tag))
+
+    def test_reads_round_robin_over_replicas(self):
+        """Test reads rotate across every replica"""
+        routers.enable_replica_reads()
+
+        chosen = {self.router.db_for_read(Tag) for _ in range(4)}
+
+        self.assertEqual(chosen, {'replica_a', 'replica_b'})
+
+    def test_writes_use_primary(self):
+        """Test writes always go to the primary"""
+        routers.enable_replica_reads()
+
+        self.assertEqual(self.router.db_for_write(Tag), 'default')
+
+    def test_cache_table_read_from_primary(self):
+        """Test database cache entries are never read from a replica"""
+        routers.enable_replica_reads()
+
+        self.assertIsNone(
+            self.router.db_for_read(caches['shared'].cache_model_class)
+        )
+
+    @override_settings(
+        DATABASE_REPLICA_POLICY='core.db.routers.RandomReplicaPolicy'
+    )
+    def test_policy_is_pluggable(self):
+        """Test the replica choice comes from the configured policy"""
+        routers.enable_replica_reads()
+
+        self.assertIsInstance(
+            routers.get_replica_policy(), routers.RandomReplicaPolicy
+        )
+        self.assertIn(
+            self.router.db_for_read(Tag), ['replica_a', 'replica_b']
+        )
+
+
+# a local pin cache keeps these tests off the database
+@override_settings(
+    DATABASE_REPLICAS=['replica_a'], DATABASE_REPLICA_PIN_CACHE='default'
+)
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    """Test the replica routing middleware"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.reads_enabled = None
+        self.addCleanup(cache.clear)
+
+    def _get_response(self, response):
+        def get_response(request):
+            self.reads_enabled = routers.replica_reads_enabled()
+            return response
+
+        return get_response
+
+    def _process(self, request, view_class, response=None):
+        middleware = ReplicaRoutingMiddleware(
+            self._get_response(response or HttpResponse())
+        )
+        middleware.process_view(request, view_func(view_class), (), {})
+
+        return middleware(request)
+
+    def test_safe_request_reads_from_replica(self):
+        """Test GET and HEAD on opted-in views read from replicas"""
+        for request in [self.factory.get('/'), self.factory.head('/')]:
+            self._process(request, ReplicaView)
+
+            self.assertTrue(self.reads_enabled)
+            self.assertFalse(routers.replica_reads_enabled())
+
+    def test_other_views_read_from_primary(self):
+        """Test views without the flag keep reading the primary"""
+        self._process(self.factory.get('/'), PrimaryView)
+
+        self.assertFalse(self.reads_enabled)
+
+    def test_unsafe_request_reads_from_primary(self):
+        """Test writes and their reads stay on the primary"""
+        self._process(self.factory.post('/'), ReplicaView)
+
+        self.assertFalse(self.reads_enabled)
+
+    def test_write_pins_user_to_primary(self):
+        """Test reads right after a write go to the primary"""
+        auth = {'HTTP_AUTHORIZATION': 'Token abc123'}
+        self._process(self.factory.post('/', **auth), ReplicaView)
+
+        self._process(self.factory.get('/', **auth), ReplicaView)
+        self.assertFalse(self.reads_enabled)
+
+        other = {'HTTP_AUTHORIZATION': 'Token other'}
+        self._process(self.factory.get('/', **other), ReplicaView)
+        self.assertTrue(self.reads_enabled)
+
+    def test_failed_write_does_not_pin(self):
+        """Test rejected writes do not pin the user"""
+        auth = {'HTTP_AUTHORIZATION': 'Token abc123'}
+        self._process(
+            self.factory.post('/', **auth),
+            ReplicaView,
+            HttpResponse(status=status.HTTP_400_BAD_REQUEST),
+        )
+
+        self._process(self.factory.get('/', **auth), ReplicaView)
+        self.assertTrue(self.reads_enabled)
+
+    def test_issued_token_pinned(self):
+        """Test a freshly issued token reads from the primary"""
+        self._process(
+            self.factory.post('/'), PrimaryView, Response({'token': 'new'})
+        )
+
+        auth = {'HTTP_AUTHORIZATION': 'Token new'}
+        self._process(self.factory.get('/', **auth), ReplicaView)
+        self.assertFalse(self.reads_enabled)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_no_pins(self):
+        """Test nothing is pinned or looked up without replicas"""
+        auth = {'HTTP_AUTHORIZATION': 'Token abc123'}
+        self._process(self.factory.post('/', **auth), ReplicaView)
+        self._process(self.factory.get('/', **auth), ReplicaView)
+
+        self.assertFalse(self.reads_enabled)
+        self.assertFalse(routers.is_pinned_to_primary('abc123'))
+
+    def test_api_views_opted_in(self):
+        """Test the recipe and user views read from replicas"""
+        for view_class in [
+            RecipeViewSet, TagViewSet, IngredientViewSet, ManageUserView
+        ]:
+            self.assertTrue(view_class.read_from_replica)
+
+
+class ReplicaPinCacheTests(TestCase):
+    """Test pins are visible to every worker process"""
+
+    def test_pins_stored_in_database(self):
+        """Test the default pin cache is a table on the primary"""
+        pins = caches[settings.DATABASE_REPLICA_PIN_CACHE]
+        self.assertIsInstance(pins, DatabaseCache)
+
+        routers.pin_to_primary('abc123')
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {pins._table}')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertTrue(routers.is_pinned_to_primary('abc123'))
+
+    def test_local_pin_cache_refused_with_replicas(self):
+        """Test a per-process pin cache fails the system checks"""
+        with override_settings(DATABASE_REPLICAS=['replica_a']):
+            self.assertEqual(checks.check_replica_pin_cache(None), [])
+        with override_settings(
+            DATABASE_REPLICAS=['replica_a'],
+            DATABASE_REPLICA_PIN_CACHE='default',
+        ):
+            errors = checks.check_replica_pin_cache(None)
+        self.assertEqual([type(error) for error in errors], [Error])
+        with override_settings(
+            DATABASE_REPLICAS=[], DATABASE_REPLICA_PIN_CACHE='default'
+        ):
+            self.assertEqual(checks.check_replica_pin_cache(None), [])
+
+
+@unittest.skipUnless(
+    any(
+        settings.DATABASES[alias]['TEST'].get('MIRROR') is None
+        for alias in settings.DATABASE_REPLICAS
+    ),
+    'needs a separate replica database (DB_REPLICA_TEST_MIRROR=0)',
+)
+class SeparateReplicaTests(TransactionTestCase):
+    """Test routing against two independent Postgres instances"""
+    databases = '__all__'
+
+    def setUp(self):
+        # flushing the databases leaves the cache table alone
+        self.addCleanup(caches[settings.DATABASE_REPLICA_PIN_CACHE].clear)
+        self.replicas = settings.DATABASE_REPLICAS
+        user_model = get_user_model()
+        for alias in ['default', *self.replicas]:
+            user = user_model(id=1, email='user@example.com')
+            user.set_password('secret')
+            user.save(using=alias)
+            Token.objects.using(alias).create(key='abc123', user=user)
+            Tag.objects.using(alias).create(user=user, name=alias)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token abc123')
+
+    def _tag_names(self):
+        res = self.client.get(reverse('recipe:tag-list'))
+
+        return {tag['name'] for tag in res.data}
+
+    def test_reads_served_by_replicas(self):
+        """Test reads come from replicas and writes pin to the primary"""
+        self.assertTrue(self._tag_names() <= set(self.replicas))
+
+        res = self.client.patch(reverse('user:me'), {'name': 'New name'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self._tag_names(), {'default'})
@@ -0,0 +1,169 @@
+"""
+Tests for the metrics endpoint
+"""
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db import routers
+from core.models import Recipe, Tag
+from core.schema import schema_cache
+from recipe import similarity
+
+METRICS_URL = reverse('metrics')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(TestCase):
+    """Test request metrics"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='secret',
+        )
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_requests_counted_by_route(self):
+        """Test requests are counted and timed per route name"""
+        labels = {'view': 'recipe:tag-list', 'method': 'GET'}
+        before = sample('http_requests_total', status='200', **labels)
+        latency_before = sample(
+            'http_request_duration_seconds_count', **labels
+        )
+
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL)
+
+        self.assertEqual(
+            sample('http_requests_total', status='200', **labels),
+            before + 2,
+        )
+        self.assertEqual(
+            sample('http_request_duration_seconds_count', **labels),
+            latency_before + 2,
+        )
+
+    def test_db_queries_and_size_recorded(self):
+        """Test query counts and response sizes are observed"""
+        view = {'view': 'recipe:tag-list'}
+        queries_before = sample('http_request_db_queries_sum', **view)
+        size_before = sample('http_response_size_bytes_sum', **view)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertGreater(
+            sample('http_request_db_queries_sum', **view), queries_before
+        )
+        self.assertEqual(
+            sample('http_response_size_bytes_sum', **view),
+            size_before + len(res.content),
+        )
+
+    def test_cache_hits_recorded(self):
+        """Test schema cache lookups are counted as hits and misses"""
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_patch = override_settings(SCHEMA_CACHE_DIR=cache_dir.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        schema_cache.clear()
+        self.addCleanup(schema_cache.clear)
+        hits = sample('cache_requests_total', cache='schema', result='hit')
+        misses = sample('cache_requests_total', cache='schema', result='miss')
+
+        self.client.get(reverse('api-schema'))
+        self.client.get(reverse('api-schema'))
+
+        self.assertEqual(
+            sample('cache_requests_total', cache='schema', result='hit'),
+            hits + 1,
+        )
+        self.assertEqual(
+            sample('cache_requests_total', cache='schema', result='miss'),
+            misses + 1,
+        )
+
+    def test_shared_cache_hits_recorded(self):
+        """Test replica pin and similar recipe lookups are counted"""
+        caches['shared'].clear()
+        counts = {
+            (cache, result): sample(
+                'cache_requests_total', cache=cache, result=result
+            )
+            for cache in ['replica_pin', 'similarity']
+            for result in ['hit', 'miss']
+        }
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=1,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.add(Tag.objects.get(user=self.user))
+        recipe.refresh_from_db()
+
+        routers.is_pinned_to_primary('token')
+        routers.pin_to_primary('token')
+        routers.is_pinned_to_primary('token')
+        similarity.similar_recipes(recipe, 5)
+        similarity.similar_recipes(recipe, 5)
+
+        self.assertEqual({
+            key: sample('cache_requests_total', cache=key[0], result=key[1])
+            - count
+            for key, count in counts.items()
+        }, {
+            ('replica_pin', 'hit'): 1,
+            ('replica_pin', 'miss'): 1,
+            # no version for the patch of the new link nor the first
+            # lookup, then the version and the recipe's bucket
+            ('similarity', 'hit'): 2,
+            ('similarity', 'miss'): 2,
+        })
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint(self):
+        """Test the metrics endpoint exposes the collected samples"""
+        self.client.get(TAGS_URL)
+
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer scrape-secret'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b'http_requests_total{', res.content)
+        self.assertIn(b'view="recipe:tag-list"', res.content)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_token_required(self):
+        """Test the metrics endpoint requires the bearer token"""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer scrape-secret'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_refused_without_token(self):
+        """Test the metrics endpoint is closed when no token is set"""
+        for headers in [{}, {'HTTP_AUTHORIZATION': 'Bearer '}]:
+            res = self.client.get(METRICS_URL, **headers)
+
+            self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,40 @@
+"""
+Tests for the path scoped middleware stack
+"""
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+
+
+class PathScopedMiddlewareTests(TestCase):
+    """Test session middleware only runs for the admin"""
+
+    def test_api_skips_session_stack(self):
+        """Test API requests never load the session or user"""
+        res = self.client.get(reverse('health-check'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(hasattr(res.wsgi_request, 'session'))
+        self.assertFalse(hasattr(res.wsgi_request, '_messages'))
+        self.assertNotIn('csrftoken', res.cookies)
+
+    def test_admin_runs_session_stack(self):
+        """Test admin requests get session, user and messages"""
+        res = self.client.get(reverse('admin:login'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(hasattr(res.wsgi_request, 'session'))
+        self.assertTrue(hasattr(res.wsgi_request, 'user'))
+        self.assertTrue(hasattr(res.wsgi_request, '_messages'))
+
+    def test_admin_csrf_enforced(self):
+        """Test the admin still rejects POSTs without a CSRF token"""
+        client = Client(enforce_csrf_checks=True)
+
+        res = client.post(
+            reverse('admin:login'),
+            {'username': 'admin@example.com', 'password': 'secret'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
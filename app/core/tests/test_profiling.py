@@ -0,0 +1,105 @@
+"""
+Tests for per-request profiling
+"""
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def parse_server_timing(header):
+    """Return the Server-Timing metrics as a dict"""
+    metrics = {}
+    for metric in header.split(', '):
+        name, _, value = metric.partition(';')
+        metrics[name] = value.split('=', 1)[1].strip('"')
+
+    return metrics
+
+
+class ServerTimingTests(TestCase):
+    """Test the Server-Timing middleware"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='secret',
+        )
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+
+    def _client(self):
+        # the middleware stack is loaded on the client's first request
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        return client
+
+    def test_disabled_by_default(self):
+        """Test no Server-Timing header unless profiling is enabled"""
+        res = self._client().get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(REQUEST_PROFILING=True)
+    def test_server_timing_header(self):
+        """Test timings are reported in the header and in the logs"""
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            res = self._client().get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        metrics = parse_server_timing(res['Server-Timing'])
+        for name in ['db', 'serialize', 'render', 'total']:
+            self.assertGreater(float(metrics[name]), 0)
+        self.assertGreaterEqual(int(metrics['db-queries']), 1)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'recipe:tag-list')
+        self.assertEqual(record['db_queries'], int(metrics['db-queries']))
+        self.assertNotIn('profile', record)
+
+    def test_profile_dumped_on_header(self):
+        """Test the X-Profile header writes a cProfile dump"""
+        with override_settings(
+            REQUEST_PROFILING=True,
+            REQUEST_PROFILING_ALLOW_HEADER=True,
+            REQUEST_PROFILING_DIR=self.profile_dir.name,
+        ), self.assertLogs('core.middleware', 'INFO') as logs:
+            self._client().get(TAGS_URL, HTTP_X_PROFILE='1')
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertTrue(os.path.exists(record['profile']))
+        self.assertEqual(len(os.listdir(self.profile_dir.name)), 1)
+
+    def test_profile_header_ignored_unless_allowed(self):
+        """Test the X-Profile header needs to be allowed"""
+        with override_settings(
+            REQUEST_PROFILING=True,
+            REQUEST_PROFILING_DIR=self.profile_dir.name,
+        ), self.assertLogs('core.middleware', 'INFO'):
+            self._client().get(TAGS_URL, HTTP_X_PROFILE='1')
+
+        self.assertEqual(os.listdir(self.profile_dir.name), [])
+
+    def test_profile_sampled(self):
+        """Test sampled requests write a cProfile dump"""
+        with override_settings(
+            REQUEST_PROFILING=True,
+            REQUEST_PROFILING_SAMPLE_RATE=1.0,
+            REQUEST_PROFILING_DIR=self.profile_dir.name,
+        ), self.assertLogs('core.middleware', 'INFO'):
+            self._client().get(TAGS_URL)
+
+        self.assertEqual(len(os.listdir(self.profile_dir.name)), 1)
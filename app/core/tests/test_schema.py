@@ -0,0 +1,97 @@
+"""
+Tests for the cached API schema
+"""
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from drf_spectacular.generators import SchemaGenerator
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import schema
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class CachedSchemaTests(TestCase):
+    """Test serving the pre-generated schema"""
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        self.cache_dir = os.path.join(self.root, 'a', 'b', 'schema')
+        settings_patch = override_settings(SCHEMA_CACHE_DIR=self.cache_dir)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        schema.schema_cache.clear()
+        self.addCleanup(schema.schema_cache.clear)
+        self.client = APIClient()
+
+    def test_schema_generated_once(self):
+        """Test the schema is generated once and then served from memory"""
+        with patch.object(
+            SchemaGenerator, 'get_schema', autospec=True,
+            side_effect=SchemaGenerator.get_schema,
+        ) as get_schema:
+            res1 = self.client.get(SCHEMA_URL)
+            res2 = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res1.status_code, status.HTTP_200_OK)
+        self.assertEqual(res1.content, res2.content)
+        self.assertIn(b'/api/recipe/recipes/', res1.content)
+        get_schema.assert_called_once()
+
+    def test_schema_read_from_disk(self):
+        """Test a fresh process reuses the schema rendered on disk"""
+        schema.build_schema_cache()
+        schema.schema_cache.clear()
+
+        with patch.object(SchemaGenerator, 'get_schema') as get_schema:
+            res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('application/'))
+        self.assertIn(b'"openapi"', res.content)
+        get_schema.assert_not_called()
+
+    def test_schema_etag_not_modified(self):
+        """Test revalidating with the ETag returns 304"""
+        res = self.client.get(SCHEMA_URL)
+        etag = res['ETag']
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_swagger_uses_cached_schema(self):
+        """Test the swagger page points at the cached schema view"""
+        res = self.client.get(reverse('api-docs'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertContains(res, SCHEMA_URL)
+
+    def test_unsupported_language_not_cached(self):
+        """Test ?lang= outside LANGUAGES reuses the default language entry"""
+        self.client.get(SCHEMA_URL)
+        entries = dict(schema.schema_cache._entries)
+
+        res = self.client.get(SCHEMA_URL, {'lang': '../../../pwned/x'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(schema.schema_cache._entries, entries)
+        written = [
+            os.path.join(root, name)
+            for root, dirs, files in os.walk(self.root) for name in files
+        ]
+        self.assertEqual(len(written), 1)
+        self.assertEqual(
+            os.path.dirname(written[0]),
+            os.path.join(self.cache_dir, schema.code_version()),
+        )
@@ -0,0 +1,136 @@
+"""
+Tests for the slow query log
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.db import slow_queries
+from core.models import Recipe, Tag
+
+
+def slow_query_records(logs):
+    return [json.loads(record.getMessage()) for record in logs.records]
+
+
+class FingerprintTests(TestCase):
+    """Test query normalization"""
+
+    def test_literals_and_parameters_are_normalized(self):
+        """Test queries differing only in values share a fingerprint"""
+        first = slow_queries.fingerprint(
+            "SELECT * FROM t WHERE id IN (%s, %s) AND name = 'a'"
+        )
+        second = slow_queries.fingerprint(
+            "SELECT *  FROM t WHERE id IN (%s, %s, %s) AND name = 'b''c'"
+        )
+        other = slow_queries.fingerprint('SELECT * FROM t WHERE id = 1')
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=1e-6)
+class SlowQueryLogTests(TestCase):
+    """Test slow statements are logged"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='secret',
+        )
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=2
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        self.recipe_url = reverse('recipe:recipe-detail', args=[recipe.id])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_installed_on_connections(self):
+        """Test the logger wraps the connection exactly once"""
+        self.assertEqual(
+            connection.execute_wrappers.count(slow_queries.slow_query_logger),
+            1,
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=1e6)
+    def test_fast_queries_not_logged(self):
+        """Test statements under the threshold are not logged"""
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('core.db.slow_queries'):
+                Tag.objects.count()
+
+    def test_logs_view_serializer_and_fingerprint(self):
+        """Test entries name the view and the serializers"""
+        with self.assertLogs('core.db.slow_queries', 'WARNING') as logs:
+            self.client.get(self.recipe_url)
+
+        records = slow_query_records(logs)
+        views = {record['view'] for record in records}
+        self.assertEqual(views, {'RecipeViewSet.retrieve'})
+        tag_queries = [r for r in records if 'core_tag' in r['query']]
+        self.assertEqual(
+            tag_queries[0]['serializer'],
+            'RecipeDetailSerializer>TagSerializer',
+        )
+        self.assertEqual(len(tag_queries[0]['fingerprint']), 16)
+        self.assertNotIn('plan', tag_queries[0])
+
+    @override_settings(SLOW_QUERY_EXPLAIN_SAMPLE_RATE=1)
+    def test_explain_captured_for_selects(self):
+        """Test sampled SELECTs carry their EXPLAIN ANALYZE plan"""
+        with self.assertLogs('core.db.slow_queries', 'WARNING') as logs:
+            Tag.objects.filter(name='Vegan').count()
+            Tag.objects.filter(name='Vegan').update(name='Vegetarian')
+
+        select, update = [
+            record for record in slow_query_records(logs)
+            if 'core_tag' in record['query']
+        ]
+        self.assertIn('Buffers', select['plan'])
+        self.assertIsNone(update['view'])
+        self.assertIsNone(update['plan'])
+
+    def test_explain_options(self):
+        """Test only plain reads of tables are re-run by ANALYZE"""
+        tag = 'SELECT "core_tag"."id" FROM "core_tag"'
+        for sql, options in [
+            (f'{tag} WHERE "core_tag"."id" IN (%s, %s)', 'ANALYZE, BUFFERS'),
+            ('SELECT COUNT(*) AS "__count" FROM "core_tag"',
+             'ANALYZE, BUFFERS'),
+            (f"{tag} WHERE \"core_tag\".\"name\" = 'nextval(x)'",
+             'ANALYZE, BUFFERS'),
+            ('SELECT nextval(%s) FROM "core_tag"', 'COSTS'),
+            ('SELECT pg_advisory_lock(%s)', None),
+            ('SELECT pg_advisory_unlock(%s)', None),
+            (f'{tag} WHERE "core_tag"."id" = %s FOR UPDATE', None),
+            (f'{tag} FOR NO KEY UPDATE SKIP LOCKED', None),
+            (f'{tag} FOR SHARE', None),
+            ('UPDATE "core_tag" SET "name" = %s', None),
+        ]:
+            with self.subTest(sql=sql):
+                self.assertEqual(slow_queries.explain_options(sql), options)
+
+    def test_explain_plans_calls_without_running_them(self):
+        """Test statements calling other functions are only planned"""
+        plan = slow_queries.explain(
+            connection, 'SELECT md5("name") FROM "core_tag"', []
+        )
+
+        self.assertIn('Seq Scan', plan)
+        self.assertNotIn('actual time', plan)
+
+    def test_failed_explain_keeps_transaction(self):
+        """Test a failing EXPLAIN does not abort the caller's transaction"""
+        plan = slow_queries.explain(
+            connection, 'SELECT "missing" FROM "core_tag"', []
+        )
+
+        self.assertTrue(plan.startswith('EXPLAIN failed'))
+        self.assertEqual(Tag.objects.count(), 1)
@@ -0,0 +1,163 @@
+"""
+Tests for the startup management command
+"""
+import tempfile
+from io import StringIO
+from unittest.mock import call, patch
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.management.commands import startup
+
+CALL_COMMAND = 'core.management.commands.startup.call_command'
+
+
+class StartupCommandTests(TestCase):
+    """Test the container startup pipeline"""
+
+    def setUp(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        settings_patch = override_settings(
+            STATIC_ROOT=static_root.name,
+            SCHEMA_CACHE_DIR=static_root.name,
+            MIGRATION_DATABASE='default',
+        )
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+    def _startup(self, *args):
+        out = StringIO()
+        call_command('startup', '--no-wait', *args, stdout=out)
+
+        return out.getvalue()
+
+    @patch(CALL_COMMAND)
+    def test_collectstatic_skipped_when_unchanged(self, patched_call):
+        """Test static files are only collected when sources change"""
+        self._startup()
+        self._startup()
+
+        collect = call('collectstatic', interactive=False, verbosity=0)
+        self.assertEqual(patched_call.call_args_list.count(collect), 1)
+
+        with patch.object(startup, 'static_sources_hash', return_value='x'):
+            output = self._startup()
+
+        self.assertEqual(patched_call.call_args_list.count(collect), 2)
+        self.assertIn('phase=collectstatic status=done', output)
+
+    @patch(CALL_COMMAND)
+    def test_collectstatic_forced(self, patched_call):
+        """Test collecting static files can be forced"""
+        self._startup()
+        output = self._startup('--force-collectstatic')
+
+        self.assertEqual(patched_call.call_count, 2)
+        self.assertIn('phase=collectstatic status=done', output)
+
+    @patch(CALL_COMMAND)
+    def test_migrate_skipped_without_pending(self, patched_call):
+        """Test migrate does not run when everything is applied"""
+        output = self._startup()
+
+        self.assertNotIn(call('migrate', database='default',
+                              interactive=False),
+                         patched_call.call_args_list)
+        self.assertIn('phase=migrate status=skipped', output)
+        self.assertIn('phase=schema status=done', output)
+        self.assertIn('phase=total status=done', output)
+
+    @patch.object(startup, 'advisory_lock')
+    @patch.object(startup, 'pending_migrations')
+    @patch(CALL_COMMAND)
+    def test_migrate_under_lock(self, patched_call, patched_pending,
+                                patched_lock):
+        """Test pending migrations are applied while holding the lock"""
+        patched_pending.return_value = ['0099_pending']
+
+        output = self._startup()
+
+        patched_lock.assert_called_once_with(
+            startup.MIGRATION_LOCK_ID, using='default'
+        )
+        patched_call.assert_called_with(
+            'migrate', database='default', interactive=False
+        )
+        self.assertIn('phase=migrate status=done', output)
+
+    @override_settings(MIGRATION_DATABASE='direct')
+    @patch.object(startup, 'advisory_lock')
+    @patch.object(startup, 'pending_migrations')
+    @patch(CALL_COMMAND)
+    def test_migrate_on_direct_connection(self, patched_call,
+                                          patched_pending, patched_lock):
+        """Test migrations run on the connection bypassing the pooler"""
+        patched_pending.return_value = ['0099_pending']
+
+        self._startup()
+
+        patched_lock.assert_called_once_with(
+            startup.MIGRATION_LOCK_ID, using='direct'
+        )
+        patched_pending.assert_called_with('direct')
+        patched_call.assert_called_with(
+            'migrate', database='direct', interactive=False
+        )
+
+    @patch.object(startup, 'pending_migrations')
+    @patch(CALL_COMMAND)
+    def test_migrate_skipped_after_lock(self, patched_call, patched_pending):
+        """Test migrate is skipped if another replica already ran it"""
+        patched_pending.side_effect = [['0099_pending'], []]
+
+        output = self._startup()
+
+        self.assertNotIn(call('migrate', database='default',
+                              interactive=False),
+                         patched_call.call_args_list)
+        self.assertIn('phase=migrate status=skipped', output)
+
+    @patch(CALL_COMMAND)
+    def test_waits_for_db(self, patched_call):
+        """Test startup waits for the database by default"""
+        call_command('startup', stdout=StringIO())
+
+        self.assertEqual(patched_call.call_args_list[0].args, ('wait_for_db',))
+
+
+class AdvisoryLockTests(TransactionTestCase):
+    """Test the migration locks"""
+
+    def _held(self, mode='ExclusiveLock'):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM pg_locks '
+                "WHERE locktype = 'advisory' AND objid::bigint = %s "
+                'AND mode = %s AND pid = pg_backend_pid()',
+                [startup.MIGRATION_LOCK_ID & 0xffffffff, mode],
+            )
+            return cursor.fetchone()[0]
+
+    def test_lock_outlives_transactions(self):
+        """Test the lock is held across commits until released"""
+        with startup.advisory_lock(startup.MIGRATION_LOCK_ID):
+            self.assertFalse(connection.in_atomic_block)
+            with transaction.atomic():
+                self.assertEqual(self._held(), 1)
+            self.assertEqual(self._held(), 1)
+        self.assertEqual(self._held(), 0)
+
+        with self.assertRaises(RuntimeError):
+            with startup.advisory_lock(startup.MIGRATION_LOCK_ID):
+                raise RuntimeError
+        self.assertEqual(self._held(), 0)
+
+    def test_pending_check_lock_held_by_transaction(self):
+        """Test the shared lock of the pending check ends with a transaction"""
+        with startup.shared_advisory_xact_lock(startup.MIGRATION_LOCK_ID):
+            self.assertTrue(connection.in_atomic_block)
+            self.assertEqual(self._held('ShareLock'), 1)
+        self.assertEqual(self._held('ShareLock'), 0)
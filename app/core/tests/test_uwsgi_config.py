@@ -0,0 +1,106 @@
+"""
+Tests for the generated uWSGI configuration
+"""
+import os
+import tempfile
+
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from core.management.commands import uwsgi_config
+
+
+class DetectionTests(SimpleTestCase):
+    """Test CPU and memory detection from cgroup files"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+
+    def _write(self, path, content):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as cgroup_file:
+            cgroup_file.write(content)
+
+    def test_cgroup_v2_limits(self):
+        """Test a CPU quota and memory.max are honoured"""
+        self._write('cpu.max', '150000 100000\n')
+        self._write('memory.max', str(512 * 1024 * 1024))
+
+        self.assertEqual(
+            uwsgi_config.detect_cpus(self.root),
+            min(2, len(os.sched_getaffinity(0))),
+        )
+        self.assertEqual(uwsgi_config.detect_memory_mb(self.root), 512)
+
+    def test_cgroup_v1_unlimited_falls_back_to_host(self):
+        """Test unlimited cgroups use the host's CPUs and memory"""
+        self._write('cpu/cpu.cfs_quota_us', '-1')
+        self._write('cpu/cpu.cfs_period_us', '100000')
+        self._write('memory/memory.limit_in_bytes', str(1 << 62))
+        self._write('meminfo', 'MemTotal:        2048000 kB\n')
+
+        self.assertEqual(
+            uwsgi_config.detect_cpus(self.root),
+            len(os.sched_getaffinity(0)),
+        )
+        self.assertEqual(
+            uwsgi_config.detect_memory_mb(
+                self.root, os.path.join(self.root, 'meminfo')
+            ),
+            2000,
+        )
+
+
+class BuildConfigTests(SimpleTestCase):
+    """Test sizing the uWSGI options"""
+
+    def test_sized_from_cpus(self):
+        """Test two workers per CPU plus one, with cheaper mode"""
+        options = dict(uwsgi_config.build_config({}, cpus=4, memory_mb=8192))
+
+        self.assertEqual(options['workers'], 9)
+        self.assertEqual(options['cheaper'], 2)
+        self.assertEqual(options['cheaper-algo'], 'busyness')
+        self.assertEqual(options['reload-on-rss'], 8192 * 3 // 4 // 9)
+        self.assertEqual(options['lazy-apps'], 'false')
+
+    def test_memory_limits_workers(self):
+        """Test workers fit in the memory limit"""
+        options = dict(uwsgi_config.build_config({}, cpus=8, memory_mb=600))
+
+        self.assertEqual(options['workers'], 3)
+
+    def test_environment_overrides(self):
+        """Test WSGI_ variables override the detected values"""
+        env = {
+            'WSGI_WORKERS': '2',
+            'WSGI_THREADS': '4',
+            'WSGI_CHEAPER': '0',
+            'WSGI_LAZY_APPS': '1',
+            'WSGI_LISTEN': '4096',
+        }
+
+        options = dict(uwsgi_config.build_config(
+            env, cpus=4, memory_mb=None, somaxconn=1024
+        ))
+
+        self.assertEqual(options['workers'], 2)
+        self.assertEqual(options['threads'], 4)
+        self.assertEqual(options['lazy-apps'], 'true')
+        self.assertEqual(options['listen'], 1024)
+        self.assertNotIn('cheaper', options)
+        self.assertNotIn('reload-on-rss', options)
+
+    def test_invalid_value(self):
+        """Test a non integer override is an error"""
+        with self.assertRaises(CommandError):
+            uwsgi_config.build_config({'WSGI_WORKERS': 'many'}, 1, None)
+
+    def test_render(self):
+        """Test the ini file format"""
+        ini = uwsgi_config.render([('master', 'true'), ('workers', 3)])
+
+        self.assertEqual(ini, '[uwsgi]\nmaster = true\nworkers = 3\n')
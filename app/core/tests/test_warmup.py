@@ -0,0 +1,40 @@
+"""
+Tests for the worker warm-up hooks
+"""
+from unittest.mock import patch
+
+from django.apps import apps
+from django.test import SimpleTestCase
+
+from core import warmup
+
+
+class WarmUpTests(SimpleTestCase):
+    """Test running the AppConfig warm-up hooks"""
+
+    def test_runs_app_hooks(self):
+        """Test every app with a hook is warmed up"""
+        with self.assertLogs('core.warmup', 'INFO'):
+            timings = warmup.warm_up()
+
+        self.assertEqual(set(timings), {'core', 'recipe', 'user'})
+
+    def test_failing_hook_does_not_stop_startup(self):
+        """Test a failing hook is logged and the others still run"""
+        recipe_config = apps.get_app_config('recipe')
+        with patch.object(
+            recipe_config, 'warm_up', side_effect=RuntimeError, create=True
+        ), self.assertLogs('core.warmup') as logs:
+            timings = warmup.warm_up()
+
+        self.assertIn('user', timings)
+        self.assertIn('warm up of recipe failed', logs.output[0])
+
+    @patch('core.warmup.warm_up_worker')
+    @patch('core.warmup.warm_up')
+    def test_install_outside_uwsgi_connects_now(self, warm_up, worker):
+        """Test without uWSGI the process warms up and connects at once"""
+        warmup.install()
+
+        warm_up.assert_called_once()
+        worker.assert_called_once()
@@ -1,11 +1,73 @@
 """
 Views for Core app
 """
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.crypto import constant_time_compare
+from drf_spectacular.utils import extend_schema
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from rest_framework import authentication, generics, permissions, status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from core import batch
+from core.metrics import get_registry
+
+
 @api_view(['GET'])
 def health_check(request):
     """Return healthy response"""
 
     return Response({'healthy': True})
+
+
+async def health_check_async(request):
+    """Return healthy response without taking a thread (ASGI mode)"""
+
+    return JsonResponse({'healthy': True})
+
+
+def metrics(request):
+    """Expose Prometheus metrics aggregated across worker processes"""
+    # behind the proxy every client has an internal address, so scrapes
+    # are only told apart by the token and refused when there is none
+    expected = f'Bearer {settings.METRICS_TOKEN}'
+    provided = request.headers.get('Authorization', '')
+    if not settings.METRICS_TOKEN or not constant_time_compare(
+        provided, expected
+    ):
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        generate_latest(get_registry()),
+        content_type=CONTENT_TYPE_LATEST,
+    )
+
+
+class BatchView(generics.GenericAPIView):
+    """Run several API requests in one call, see core.batch"""
+    serializer_class = batch.BatchSerializer
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    # a batch inside a batch would only add nesting
+    batchable = False
+
+    @extend_schema(responses={
+        200: batch.BatchSerializer,
+        400: batch.BatchSerializer,
+    })
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        atomic = serializer.validated_data['atomic']
+        responses = batch.run(
+            request, serializer.validated_data['requests'], atomic=atomic
+        )
+        serializer = self.get_serializer({'responses': responses})
+        if atomic and responses[-1]['status'] >= 400:
+            # rolled back, the batch failed as a whole
+            return Response(
+                serializer.data, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(serializer.data)
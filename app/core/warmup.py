@@ -0,0 +1,67 @@
+"""
+Build lazily created objects before a worker accepts traffic.
+
+Apps opt in with a `warm_up()` method on their AppConfig. warm_up() runs
+them where the WSGI application is loaded, which is the uWSGI master when
+apps are preloaded, so every forked worker inherits the warmed state.
+Database connections cannot be shared across a fork, so they are opened
+by warm_up_worker() in each worker instead.
+"""
+import json
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """Run every AppConfig.warm_up() hook, return their durations"""
+    timings = {}
+    for app_config in apps.get_app_configs():
+        hook = getattr(app_config, 'warm_up', None)
+        if hook is None:
+            continue
+        start = time.perf_counter()
+        try:
+            hook()
+        except Exception:
+            # a cold object is slower, not broken; keep starting up
+            logger.exception('warm up of %s failed', app_config.label)
+        timings[app_config.label] = round(
+            (time.perf_counter() - start) * 1000, 3
+        )
+    logger.info(json.dumps({'event': 'warm_up', 'duration_ms': timings}))
+
+    return timings
+
+
+def warm_up_worker():
+    """Open this process's own database connections"""
+    for connection in connections.all():
+        if connection.alias not in ('default', *settings.DATABASE_REPLICAS):
+            # such as the direct connection only migrations use
+            continue
+        try:
+            connection.ensure_connection()
+        except Exception:
+            logger.exception('could not connect to %s', connection.alias)
+
+
+def install():
+    """Warm up now, and connect in each worker once it is forked"""
+    warm_up()
+    try:
+        import uwsgi
+        from uwsgidecorators import postfork
+    except ImportError:
+        warm_up_worker()
+        return
+    if uwsgi.worker_id() == 0:
+        # preloaded in the master, the workers do not exist yet
+        postfork(warm_up_worker)
+    else:
+        warm_up_worker()
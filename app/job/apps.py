@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'job'
+
+    def ready(self):
+        # register the @task functions of every app
+        autodiscover_modules('tasks')
@@ -0,0 +1,72 @@
+"""
+Run background job workers
+"""
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from job.worker import Worker
+
+
+def _serve(threads, poll_interval, burst):
+    worker = Worker(threads, poll_interval=poll_interval, burst=burst)
+    # finish the running jobs, then exit
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: worker.stop.set())
+    worker.run()
+
+
+class Command(BaseCommand):
+    help = (
+        'Claim and run queued jobs on --processes processes with --threads '
+        'threads each, until SIGTERM or SIGINT.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            help='Seconds to wait when no job is due '
+                 '(default JOB_POLL_INTERVAL_SECONDS)',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no job is due',
+        )
+
+    def handle(self, *args, **options):
+        serve_args = (
+            options['threads'], options['poll_interval'], options['burst']
+        )
+        self.stdout.write(
+            f'run_workers processes={options["processes"]} '
+            f'threads={options["threads"]}'
+        )
+        if options['processes'] <= 1:
+            _serve(*serve_args)
+            return
+
+        # forked children must not share the parent's connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=_serve, args=serve_args)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        def stop(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, stop)
+        for process in processes:
+            process.join()
@@ -0,0 +1,74 @@
+"""
+Register background tasks and schedule jobs to run them
+"""
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from core.models import Job
+
+_tasks = {}
+
+
+class Task:
+    """A function run by the workers, with its retry policy"""
+
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, **payload):
+        return self.func(**payload)
+
+    def enqueue(self, *, user=None, delay=None, using=None, **payload):
+        return enqueue(self.name, payload, user=user, delay=delay,
+                       using=using)
+
+
+def task(name=None, max_attempts=None):
+    """
+    Register the decorated function as a task.
+
+    Its arguments come from the job payload, so they must be JSON
+    serializable; the return value is stored as the job result. It can run
+    more than once when a worker dies, so it has to be idempotent.
+    """
+    def register(func):
+        registered = Task(
+            func,
+            name or f'{func.__module__}.{func.__name__}',
+            max_attempts or Job._meta.get_field('max_attempts').default,
+        )
+        if _tasks.setdefault(registered.name, registered) is not registered:
+            raise ValueError(f'task {registered.name} already registered')
+
+        return registered
+
+    return register
+
+
+def get_task(name):
+    return _tasks[name]
+
+
+def enqueue(name, payload=None, *, user=None, delay=None, using=None):
+    """
+    Schedule task `name` and return its Job.
+
+    The job is inserted with the caller's other writes, so it commits or
+    rolls back with them: a job never refers to rows that do not exist.
+    """
+    registered = get_task(name)
+    run_at = timezone.now()
+    if delay:
+        run_at += timedelta(seconds=delay)
+
+    return Job.objects.using(using or DEFAULT_DB_ALIAS).create(
+        name=registered.name,
+        payload=payload or {},
+        user=user,
+        run_at=run_at,
+        max_attempts=registered.max_attempts,
+    )
@@ -0,0 +1,15 @@
+# Serializers for job APIs
+from rest_framework import serializers
+
+from core.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for job status"""
+
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'status', 'attempts', 'max_attempts',
+                  'run_at', 'created_at', 'finished_at', 'result',
+                  'last_error']
+        read_only_fields = fields
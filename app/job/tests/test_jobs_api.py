@@ -0,0 +1,100 @@
+"""
+Tests for the job status APIs
+"""
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Job
+from job.serializers import JobSerializer
+
+
+JOBS_URL = reverse('job:job-list')
+
+
+def detail_url(job_id):
+    """create and return a job detail url"""
+    return reverse('job:job-detail', args=[job_id])
+
+
+def create_user(email='user@example.com', password='secret'):
+    """Create user for testing"""
+    return get_user_model().objects.create_user(email, password)
+
+
+class PublicJobsAPITests(TestCase):
+    """Test unauthenticated API requests"""
+
+    def test_auth_required(self):
+        """Test auth is required for listing jobs"""
+        res = APIClient().get(JOBS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateJobsAPITests(TestCase):
+    """Test authenticated API requests"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_own_jobs(self):
+        """Test only the user's own jobs are listed, newest first"""
+        other = create_user('other@example.com')
+        Job.objects.create(name='export', user=other)
+        first = Job.objects.create(name='export', user=self.user)
+        second = Job.objects.create(
+            name='import', user=self.user, status=Job.FAILED
+        )
+
+        res = self.client.get(JOBS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, JobSerializer([second, first], many=True).data
+        )
+
+    def test_filter_by_status(self):
+        """Test filtering jobs by status"""
+        Job.objects.create(name='export', user=self.user)
+        failed = Job.objects.create(
+            name='import', user=self.user, status=Job.FAILED
+        )
+
+        res = self.client.get(JOBS_URL, {'status': Job.FAILED})
+
+        self.assertEqual([job['id'] for job in res.data], [failed.id])
+
+    def test_job_detail(self):
+        """Test retrieving the status of a job"""
+        job = Job.objects.create(
+            name='export', user=self.user, status=Job.SUCCEEDED,
+            result={'rows': 3},
+        )
+
+        res = self.client.get(detail_url(job.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], Job.SUCCEEDED)
+        self.assertEqual(res.data['result'], {'rows': 3})
+
+    def test_other_users_job_not_found(self):
+        """Test the jobs of other users are hidden"""
+        job = Job.objects.create(
+            name='export', user=create_user('other@example.com')
+        )
+
+        res = self.client.get(detail_url(job.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_jobs_read_only(self):
+        """Test jobs cannot be created through the API"""
+        res = self.client.post(JOBS_URL, {'name': 'export'})
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
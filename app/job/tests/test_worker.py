@@ -0,0 +1,241 @@
+"""
+Tests for scheduling and running background jobs
+"""
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import IntegrityError, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core.models import Job, Tag
+from job import registry, worker
+
+
+class RegistryTests(TestCase):
+    """Test registering tasks and enqueueing jobs"""
+
+    def setUp(self):
+        patcher = patch.dict(registry._tasks, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_task_registered_under_module_name(self):
+        """Test tasks are named after their function by default"""
+        @registry.task()
+        def export():
+            pass
+
+        self.assertIs(registry.get_task(f'{__name__}.export'), export)
+
+    def test_duplicate_name_rejected(self):
+        """Test two tasks cannot share a name"""
+        registry.task('export')(lambda: None)
+
+        with self.assertRaises(ValueError):
+            registry.task('export')(lambda: None)
+
+    def test_enqueue(self):
+        """Test enqueueing stores the payload and retry policy"""
+        registry.task('export', max_attempts=2)(lambda rows: rows)
+
+        job = registry.enqueue('export', {'rows': 3}, delay=60)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.payload, {'rows': 3})
+        self.assertEqual(job.max_attempts, 2)
+        self.assertGreater(job.run_at, timezone.now())
+
+    def test_enqueue_unknown_task(self):
+        """Test enqueueing a task that does not exist fails at once"""
+        with self.assertRaises(KeyError):
+            registry.enqueue('missing')
+
+    def test_enqueue_rolls_back_with_transaction(self):
+        """Test a job is only scheduled when the request's writes commit"""
+        export = registry.task('export')(lambda: None)
+
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                export.enqueue()
+                Tag.objects.create(name='vegan', user_id=None)
+
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(JOB_RETRY_BACKOFF_SECONDS=10)
+class WorkerTests(TestCase):
+    """Test claiming and running jobs"""
+
+    def setUp(self):
+        patcher = patch.dict(registry._tasks, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_claim_due_jobs_in_order(self):
+        """Test the oldest due job is claimed, future ones are not"""
+        registry.task('export')(lambda: None)
+        later = registry.enqueue('export', delay=60)
+        first = registry.enqueue('export')
+        second = registry.enqueue('export')
+
+        claimed = [worker.claim('w1'), worker.claim('w1'), worker.claim('w1')]
+
+        self.assertEqual(claimed, [first, second, None])
+        first.refresh_from_db()
+        self.assertEqual(first.status, Job.RUNNING)
+        self.assertEqual(first.attempts, 1)
+        self.assertEqual(first.locked_by, 'w1')
+        later.refresh_from_db()
+        self.assertEqual(later.status, Job.QUEUED)
+
+    def test_run_job_success(self):
+        """Test the task result is stored"""
+        registry.task('add')(lambda a, b: a + b)
+        registry.enqueue('add', {'a': 1, 'b': 2})
+        job = worker.claim('w1')
+
+        self.assertEqual(worker.run_job(job, 'w1'), Job.SUCCEEDED)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, 3)
+        self.assertEqual(job.locked_by, '')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_run_job_retries_with_backoff(self):
+        """Test a failing job is requeued later until its attempts run out"""
+        @registry.task('flaky', max_attempts=2)
+        def flaky():
+            raise RuntimeError('database is down')
+
+        job = registry.enqueue('flaky')
+        job = worker.claim('w1')
+        self.assertEqual(worker.run_job(job, 'w1'), 'retrying')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('database is down', job.last_error)
+        delay = (job.run_at - timezone.now()).total_seconds()
+        self.assertTrue(4 < delay <= 10)
+
+        Job.objects.update(run_at=timezone.now())
+        job = worker.claim('w1')
+        self.assertEqual(worker.run_job(job, 'w1'), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_retry_delay_doubles_up_to_maximum(self):
+        """Test the backoff doubles per attempt and is capped"""
+        with patch('job.worker.random.uniform', return_value=1):
+            delays = [worker.retry_delay(n) for n in range(1, 5)]
+            with self.settings(JOB_RETRY_BACKOFF_MAX_SECONDS=30):
+                capped = worker.retry_delay(4)
+
+        self.assertEqual(delays, [10, 20, 40, 80])
+        self.assertEqual(capped, 30)
+
+    def test_unknown_task_fails_without_retry(self):
+        """Test a job of an unregistered task fails at once"""
+        Job.objects.create(name='removed')
+        job = worker.claim('w1')
+
+        self.assertEqual(worker.run_job(job, 'w1'), Job.FAILED)
+        job.refresh_from_db()
+        self.assertIn('not registered', job.last_error)
+
+    def test_recover_stale(self):
+        """Test jobs of lost workers are requeued or failed"""
+        expired = timezone.now() - timedelta(seconds=120)
+        requeued = Job.objects.create(
+            name='export', status=Job.RUNNING, attempts=1, locked_at=expired,
+            locked_by='w1',
+        )
+        exhausted = Job.objects.create(
+            name='export', status=Job.RUNNING, attempts=5, locked_at=expired,
+            locked_by='w1',
+        )
+        running = Job.objects.create(
+            name='export', status=Job.RUNNING, attempts=1,
+            locked_at=timezone.now(), locked_by='w2',
+        )
+
+        self.assertEqual(worker.recover_stale(60), (1, 1))
+
+        for job in (requeued, exhausted, running):
+            job.refresh_from_db()
+        self.assertEqual(requeued.status, Job.QUEUED)
+        self.assertEqual(requeued.locked_by, '')
+        self.assertEqual(exhausted.status, Job.FAILED)
+        self.assertEqual(running.status, Job.RUNNING)
+
+    def test_recovered_job_not_finished_by_lost_worker(self):
+        """Test a worker cannot record a job that was taken from it"""
+        registry.task('export')(lambda: 'done')
+        registry.enqueue('export')
+        job = worker.claim('w1')
+        Job.objects.update(locked_by='w2')
+
+        worker.run_job(job, 'w1')
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+
+
+class ConcurrentWorkerTests(TransactionTestCase):
+    """Test workers running concurrently on their own connections"""
+
+    def setUp(self):
+        patcher = patch.dict(registry._tasks, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_skip_locked_claims_distinct_jobs(self):
+        """Test a job locked by one worker is skipped by the others"""
+        registry.task('export')(lambda: None)
+        first = registry.enqueue('export')
+        second = registry.enqueue('export')
+        locked = threading.Event()
+        release = threading.Event()
+        claimed = []
+
+        def hold_first():
+            with transaction.atomic():
+                Job.objects.select_for_update().get(pk=first.pk)
+                locked.set()
+                release.wait(5)
+            connections.close_all()
+
+        holder = threading.Thread(target=hold_first)
+        holder.start()
+        locked.wait(5)
+        try:
+            claimed.append(worker.claim('w2'))
+        finally:
+            release.set()
+            holder.join()
+
+        self.assertEqual(claimed, [second])
+
+    def test_run_workers_burst(self):
+        """Test run_workers runs every due job on its threads, then exits"""
+        ran = []
+        lock = threading.Lock()
+
+        @registry.task('record')
+        def record(n):
+            with lock:
+                ran.append(n)
+
+        for n in range(10):
+            registry.enqueue('record', {'n': n})
+
+        call_command('run_workers', threads=3, burst=True, stdout=None)
+
+        self.assertEqual(sorted(ran), list(range(10)))
+        self.assertEqual(
+            Job.objects.filter(status=Job.SUCCEEDED).count(), 10
+        )
@@ -0,0 +1,41 @@
+# Views for the job APIs
+from drf_spectacular.utils import (
+    extend_schema_view,
+    extend_schema,
+    OpenApiParameter,
+    OpenApiTypes,
+)
+from rest_framework import viewsets
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+
+from core.models import Job
+from job import serializers
+
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'status',
+                OpenApiTypes.STR,
+                enum=[status for status, _ in Job.STATUS_CHOICES],
+                description='Only list jobs with this status'
+            )
+        ]
+    )
+)
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    # status of the authenticated user's background jobs
+    serializer_class = serializers.JobSerializer
+    queryset = Job.objects.all()
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = self.queryset.filter(user=self.request.user)
+        status = self.request.query_params.get('status')
+        if status:
+            queryset = queryset.filter(status=status)
+
+        return queryset.order_by('-id')
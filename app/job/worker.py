@@ -0,0 +1,207 @@
+"""
+Claim and run jobs from the database queue
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import Job
+from job import registry
+
+logger = logging.getLogger(__name__)
+
+# keeps tracebacks of repeatedly failing jobs from bloating the table
+MAX_ERROR_LENGTH = 10000
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a job that failed `attempts` times"""
+    delay = min(
+        settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1),
+        settings.JOB_RETRY_BACKOFF_MAX_SECONDS,
+    )
+    # jitter spreads out the retries of jobs that failed together
+    return delay * random.uniform(0.5, 1)
+
+
+def claim(worker_id):
+    """
+    Lock the next due job for `worker_id` and return it, or None.
+
+    SKIP LOCKED lets every worker claim a different job without waiting on
+    each other; the lock only lasts until the status change commits.
+    """
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.QUEUED, run_at__lte=timezone.now()
+        ).order_by('run_at', 'id').first()
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_at = timezone.now()
+        job.locked_by = worker_id
+        job.save(update_fields=[
+            'status', 'attempts', 'locked_at', 'locked_by'
+        ])
+
+    return job
+
+
+def _finish(job, worker_id, **fields):
+    # a job recovered from this worker by recover_stale() belongs to
+    # another worker now
+    return Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, locked_by=worker_id
+    ).update(locked_at=None, locked_by='', **fields)
+
+
+def run_job(job, worker_id):
+    """Run a claimed job and record its result, or schedule a retry"""
+    start = time.perf_counter()
+    try:
+        task = registry.get_task(job.name)
+    except KeyError:
+        # retrying will not register it, e.g. a task removed in a deploy
+        task = None
+    try:
+        if task is None:
+            raise LookupError(f'task {job.name} is not registered')
+        result = task(**job.payload)
+    except Exception:
+        error = traceback.format_exc()[-MAX_ERROR_LENGTH:]
+        if task is not None and job.attempts < job.max_attempts:
+            _finish(
+                job, worker_id, status=Job.QUEUED, last_error=error,
+                run_at=timezone.now() + timedelta(
+                    seconds=retry_delay(job.attempts)
+                ),
+            )
+            status = 'retrying'
+        else:
+            _finish(
+                job, worker_id, status=Job.FAILED, last_error=error,
+                finished_at=timezone.now(),
+            )
+            status = Job.FAILED
+    else:
+        _finish(
+            job, worker_id, status=Job.SUCCEEDED, result=result,
+            finished_at=timezone.now(),
+        )
+        status = Job.SUCCEEDED
+    logger.info(json.dumps({
+        'event': 'job',
+        'job': job.pk,
+        'name': job.name,
+        'status': status,
+        'attempt': job.attempts,
+        'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+    }))
+
+    return status
+
+
+def recover_stale(lock_timeout=None):
+    """
+    Requeue jobs locked for longer than `lock_timeout` seconds.
+
+    Their worker died or was killed mid-job. Jobs without attempts left
+    fail instead, so a job that kills its worker does not loop forever.
+    """
+    lock_timeout = lock_timeout or settings.JOB_LOCK_TIMEOUT_SECONDS
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=lock_timeout)
+    )
+    error = f'lock expired after {lock_timeout}s, the worker was lost'
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_at=None, locked_by='', last_error=error,
+        finished_at=now,
+    )
+    requeued = stale.update(
+        status=Job.QUEUED, locked_at=None, locked_by='', last_error=error,
+        run_at=now,
+    )
+
+    return requeued, failed
+
+
+class Worker:
+    """
+    Run jobs on `threads` threads until stopped.
+
+    Every thread uses its own database connection. With `burst` the
+    threads exit once no job is due instead of polling for more.
+    """
+
+    def __init__(self, threads=1, poll_interval=None, burst=False):
+        self.threads = threads
+        self.poll_interval = (
+            poll_interval or settings.JOB_POLL_INTERVAL_SECONDS
+        )
+        self.burst = burst
+        self.stop = threading.Event()
+        self._recovered_at = 0
+        self._recover_lock = threading.Lock()
+
+    def _recover(self):
+        # once per poll interval per process is plenty
+        with self._recover_lock:
+            if time.monotonic() - self._recovered_at < self.poll_interval:
+                return
+            self._recovered_at = time.monotonic()
+        requeued, failed = recover_stale()
+        if requeued or failed:
+            logger.warning(json.dumps({
+                'event': 'job_recovery', 'requeued': requeued,
+                'failed': failed,
+            }))
+
+    def _loop(self, index):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{index}'
+        try:
+            while not self.stop.is_set():
+                # between jobs as between requests: drop broken or expired
+                # connections
+                close_old_connections()
+                try:
+                    self._recover()
+                    job = claim(worker_id)
+                except Exception:
+                    logger.exception('could not claim a job')
+                    self.stop.wait(self.poll_interval)
+                    continue
+                if job is not None:
+                    run_job(job, worker_id)
+                elif self.burst:
+                    break
+                else:
+                    self.stop.wait(self.poll_interval)
+        finally:
+            connections.close_all()
+
+    def run(self):
+        threads = [
+            threading.Thread(
+                target=self._loop, args=(index,), name=f'job-worker-{index}'
+            )
+            for index in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # a timeout keeps the main thread responsive to signals
+            while thread.is_alive():
+                thread.join(1)
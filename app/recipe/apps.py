@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipe'
+
+    def ready(self):
+        from recipe import denormalize
+
+        denormalize.connect()
+
+    def warm_up(self):
+        """Build the serializer fields and their validators once"""
+        from recipe import serializers
+
+        for serializer_class in [
+            serializers.RecipeSerializer,
+            serializers.RecipeDetailSerializer,
+            serializers.RecipeImageSerializer,
+            serializers.TagSerializer,
+            serializers.IngredientSerializer,
+        ]:
+            serializer_class().fields
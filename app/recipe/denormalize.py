@@ -0,0 +1,159 @@
+"""
+Keep the tag and ingredient arrays of recipes in sync with their links
+and with the names of the linked tags and ingredients
+"""
+from django.db import connections, router
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete,
+)
+
+from core.models import Ingredient, Recipe, Tag
+from recipe import similarity
+
+# M2M field name -> the model it links and the array field prefix
+RELATIONS = {
+    'tags': (Tag, 'tag'),
+    'ingredients': (Ingredient, 'ingredient'),
+}
+
+# plain SQL: the equivalent ORM update with subqueries takes longer to
+# compile than to run, and RETURNING saves reloading the arrays
+REFRESH_SQL = '''
+UPDATE {recipe} AS recipe
+SET {item}_ids = coalesce(item.ids, '{{}}'),
+    {item}_names = coalesce(item.names, '{{}}')
+FROM unnest(%s::bigint[]) AS target (id)
+LEFT JOIN LATERAL (
+    SELECT array_agg(item.id ORDER BY item.id) AS ids,
+           array_agg(item.name ORDER BY item.id) AS names
+    FROM {through} AS link
+    JOIN {items} AS item ON item.id = link.{item}_id
+    WHERE link.recipe_id = target.id
+) AS item ON true
+WHERE recipe.id = target.id
+RETURNING recipe.id, recipe.{item}_ids, recipe.{item}_names
+'''
+
+
+def _through(relation):
+    return Recipe._meta.get_field(relation).remote_field.through
+
+
+def refresh_recipe_arrays(recipe_ids, relations=tuple(RELATIONS)):
+    """
+    Recompute the arrays of `recipe_ids` from the link tables.
+
+    Runs in the transaction of the change that caused it and returns
+    {recipe id: {field: value}} with the new arrays.
+    """
+    recipe_ids = list(recipe_ids)
+    arrays = {recipe_id: {} for recipe_id in recipe_ids}
+    if not recipe_ids:
+        return arrays
+    connection = connections[router.db_for_write(Recipe)]
+    with connection.cursor() as cursor:
+        for relation in relations:
+            model, item_field = RELATIONS[relation]
+            cursor.execute(REFRESH_SQL.format(
+                recipe=Recipe._meta.db_table,
+                through=_through(relation)._meta.db_table,
+                items=model._meta.db_table,
+                item=item_field,
+            ), [recipe_ids])
+            for recipe_id, ids, names in cursor.fetchall():
+                arrays[recipe_id].update({
+                    f'{item_field}_ids': ids, f'{item_field}_names': names,
+                })
+
+    return arrays
+
+
+def linked_recipe_ids(relation, items):
+    """Return the ids of the recipes linked to `items`"""
+    item_field = RELATIONS[relation][1]
+
+    return list(_through(relation).objects.filter(
+        **{f'{item_field}__in': items}
+    ).values_list('recipe_id', flat=True).distinct())
+
+
+def _receiver(relation):
+    def sync_arrays(sender, instance, action, reverse, pk_set, **kwargs):
+        if action in ('post_add', 'post_remove') and not pk_set:
+            # nothing was added or removed
+            return
+        if not reverse:
+            if action in ('post_add', 'post_remove', 'post_clear'):
+                arrays = refresh_recipe_arrays([instance.pk], [relation])
+                # a later save() of the instance must not write stale arrays
+                for field, value in arrays[instance.pk].items():
+                    setattr(instance, field, value)
+                similarity.update_recipes(instance.user_id, [instance.pk])
+        elif action == 'pre_clear':
+            # the links are gone by post_clear, remember whose they were
+            instance._cleared_recipe_ids = linked_recipe_ids(
+                relation, [instance]
+            )
+        elif action in ('post_add', 'post_remove'):
+            refresh_recipe_arrays(pk_set, [relation])
+            similarity.update_recipes(instance.user_id, pk_set)
+        elif action == 'post_clear':
+            refresh_recipe_arrays(instance._cleared_recipe_ids, [relation])
+            similarity.update_recipes(
+                instance.user_id, instance._cleared_recipe_ids
+            )
+
+    return sync_arrays
+
+
+def _item_receivers(relation):
+    def item_saved(sender, instance, created, raw=False, update_fields=None,
+                   **kwargs):
+        # a new item has no links yet, and only its name is copied
+        if created or raw or (
+            update_fields is not None and 'name' not in update_fields
+        ):
+            return
+        refresh_recipe_arrays(
+            linked_recipe_ids(relation, [instance]), [relation]
+        )
+
+    def item_deleting(sender, instance, **kwargs):
+        # the cascade deletes the links without m2m_changed signals,
+        # remember whose they were
+        instance._linked_recipe_ids = linked_recipe_ids(relation, [instance])
+
+    def item_deleted(sender, instance, **kwargs):
+        refresh_recipe_arrays(instance._linked_recipe_ids, [relation])
+        similarity.update_recipes(
+            instance.user_id, instance._linked_recipe_ids
+        )
+
+    return item_saved, item_deleting, item_deleted
+
+
+receivers = {relation: _receiver(relation) for relation in RELATIONS}
+item_receivers = {
+    relation: _item_receivers(relation) for relation in RELATIONS
+}
+
+
+def connect():
+    for relation, receiver in receivers.items():
+        m2m_changed.connect(
+            receiver,
+            sender=_through(relation),
+            dispatch_uid=f'recipe.denormalize.{relation}',
+        )
+    # renames and deletes from the API, the admin or the shell alike
+    for relation, item_signals in item_receivers.items():
+        for signal, receiver in zip(
+            (post_save, pre_delete, post_delete), item_signals
+        ):
+            signal.connect(
+                receiver,
+                sender=RELATIONS[relation][0],
+                dispatch_uid=(
+                    f'recipe.denormalize.{relation}.{receiver.__name__}'
+                ),
+            )
@@ -0,0 +1,118 @@
+"""
+Pagination for recipe attribute APIs
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class NameKeysetPagination(BasePagination):
+    """
+    Keyset pagination over (name, id) in descending order.
+
+    The response body stays a plain list so existing clients keep working;
+    the next page is advertised through a `Link: <...>; rel="next"` header.
+    Each page is a bounded index range scan on (user, name, id) no matter
+    how deep the client pages.
+    """
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            name, pk = position
+            # redundant name__lte bounds the index range scan
+            queryset = queryset.filter(name__lte=name).filter(
+                Q(name__lt=name) | Q(pk__lt=pk)
+            )
+        queryset = queryset.order_by('-name', '-pk')
+
+        # fetch one extra row to know if there is a next page
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """Return the (name, id) position encoded in the cursor param"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            name, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            return str(name), int(pk)
+        except (binascii.Error, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item):
+        """Return a cursor pointing right after the given item"""
+        position = json.dumps([item.name, item.pk]).encode()
+
+        return base64.urlsafe_b64encode(position).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+        return replace_query_param(
+            url, self.page_size_query_param, self.page_size
+        )
+
+    def get_paginated_response(self, data):
+        headers = {}
+        next_link = self.get_next_link()
+        if next_link:
+            headers['Link'] = f'<{next_link}>; rel="next"'
+
+        return Response(data, headers=headers)
+
+    def get_paginated_response_schema(self, schema):
+        return schema
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor from the `Link` header of a page',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': (
+                    f'Number of results per page '
+                    f'(max {self.max_page_size})'
+                ),
+                'schema': {'type': 'integer'},
+            },
+        ]
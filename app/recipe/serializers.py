@@ -1,31 +1,68 @@
 # Serializers for recipe APIs
+from django.conf import settings
+from django.db import transaction
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from core.models import Recipe, Tag, Ingredient
+from job.serializers import JobSerializer
 
 
 class TagSerializer(serializers.ModelSerializer):
     """Serializer for tags"""
 
+    # only present when the list is requested with_recipe_count
+    recipe_count = serializers.IntegerField(read_only=True, required=False)
+
     class Meta:
         model = Tag
-        fields = ['id', 'name']
+        fields = ['id', 'name', 'recipe_count']
         read_only_fields = ['id']
 
 
 class IngredientSerializer(serializers.ModelSerializer):
     """Serializer for ingredients"""
 
+    # only present when the list is requested with_recipe_count
+    recipe_count = serializers.IntegerField(read_only=True, required=False)
+
     class Meta:
         model = Ingredient
-        fields = ['id', 'name']
+        fields = ['id', 'name', 'recipe_count']
         read_only_fields = ['id']
 
 
+@extend_schema_field({
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'id': {'type': 'integer'},
+            'name': {'type': 'string'},
+        },
+    },
+})
+class ItemArrayField(serializers.Field):
+    """Read tags or ingredients from the recipe's denormalized arrays"""
+
+    def __init__(self, item_field, **kwargs):
+        self.item_field = item_field
+        super().__init__(source='*', read_only=True, **kwargs)
+
+    def to_representation(self, recipe):
+        return [
+            {'id': item_id, 'name': name}
+            for item_id, name in zip(
+                getattr(recipe, f'{self.item_field}_ids'),
+                getattr(recipe, f'{self.item_field}_names'),
+            )
+        ]
+
+
 class RecipeSerializer(serializers.ModelSerializer):
-    """Serializer for recipes"""
-    tags = TagSerializer(many=True, required=False)
-    ingredients = IngredientSerializer(many=True, required=False)
+    """Serializer for recipes, without joining tags and ingredients"""
+    tags = ItemArrayField('tag')
+    ingredients = ItemArrayField('ingredient')
 
     class Meta:
         model = Recipe
@@ -34,56 +71,81 @@ class RecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class SimilarRecipeSerializer(RecipeSerializer):
+    """Serializer for recipes ranked by similarity to another one"""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['similarity']
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     # Detail serializer for recipe
+    tags = TagSerializer(many=True, required=False)
+    ingredients = IngredientSerializer(many=True, required=False)
 
     class Meta(RecipeSerializer.Meta):
         fields = RecipeSerializer.Meta.fields + ['description', 'image']
 
-    def _get_or_create_tags(self, tags, recipe):
+    def _get_or_create_tags(self, tags):
         """Handle get or create tags as needed"""
         auth_user = self.context['request'].user
+        tag_objs = []
         for tag in tags:
             tag_obj, created = Tag.objects.get_or_create(
                 user=auth_user,
                 **tag,
             )
-            recipe.tags.add(tag_obj)
+            tag_objs.append(tag_obj)
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
+        return tag_objs
+
+    def _get_or_create_ingredients(self, ingredients):
         """Handle get or create ingredients"""
         auth_user = self.context['request'].user
+        ingredient_objs = []
         for ingredient in ingredients:
             ingredient_obj, created = Ingredient.objects.get_or_create(
                 user=auth_user,
                 **ingredient
             )
-            recipe.ingredients.add(ingredient_obj)
+            ingredient_objs.append(ingredient_obj)
+
+        return ingredient_objs
 
+    # the recipe, its links and its tag and ingredient arrays change
+    # together or not at all
+    @transaction.atomic
     def create(self, validated_data):
         """Create a recipe, handle tags"""
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        # one add per relation refreshes the recipe's arrays once
+        recipe.tags.add(*self._get_or_create_tags(tags))
+        recipe.ingredients.add(*self._get_or_create_ingredients(ingredients))
 
         return recipe
 
+    # in RecipeViewSet.update()'s transaction already, where a savepoint
+    # would add two queries and roll back nothing the view would keep
+    @transaction.atomic(savepoint=False)
     def update(self, instance, validated_data):
         """Update recipe"""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_tags(tags))
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(
+                self._get_or_create_ingredients(ingredients)
+            )
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        # the arrays loaded with the instance may be stale by now, only
+        # write the fields of the request
+        instance.save(update_fields=list(validated_data))
 
         return instance
 
@@ -96,3 +158,34 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': 'True'}}
+
+    def update(self, instance, validated_data):
+        """Save the image alone, the other columns may have changed since"""
+        instance.image = validated_data['image']
+        instance.save(update_fields=['image'])
+
+        return instance
+
+
+class ShoppingListItemSerializer(serializers.Serializer):
+    """An ingredient and the recipes needing it"""
+    id = serializers.IntegerField(source='ingredient_id')
+    name = serializers.CharField(source='ingredient__name')
+    recipes = serializers.ListField(child=serializers.IntegerField())
+
+
+class ShoppingListSerializer(serializers.Serializer):
+    """Serializer for merging the ingredients of many recipes"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False,
+        max_length=settings.SHOPPING_LIST_MAX_IDS, write_only=True,
+    )
+    ingredients = ShoppingListItemSerializer(many=True, read_only=True)
+
+
+class RecipeBulkDeleteSerializer(serializers.Serializer):
+    """Serializer for deleting many recipes at once"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=1000
+    )
+    job = JobSerializer(read_only=True)
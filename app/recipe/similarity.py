@@ -0,0 +1,235 @@
+"""
+Rank a user's recipes by Jaccard similarity of their tags and ingredients.
+
+Each user's recipes form a sparse recipe x item matrix, kept in the shared
+cache by column: for every item, the recipes using it and how many items
+each of them has. The columns are spread over BUCKETS cache keys, so
+ranking a recipe only reads the buckets of its own items, and writes
+patch the buckets they touch instead of rebuilding the matrix.
+
+The keys of an index carry its version. Building an index starts a new
+version, and a write that cannot patch it safely drops the version, so
+the next lookup builds from the database and stale keys just expire.
+"""
+import heapq
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+
+from core.metrics import record_cache
+from core.models import Recipe
+
+BUCKETS = 16
+VERSION_KEY = 'recipe.similarity.{user_id}'
+BUCKET_KEY = 'recipe.similarity.{user_id}.{version}.{bucket}'
+LOCK_KEY = 'recipe.similarity.{user_id}.{version}.lock'
+# a patch that died holding the lock blocks the others this long
+LOCK_SECONDS = 30
+
+
+def features(recipe):
+    """Return the matrix columns of a recipe: its tags and ingredients"""
+    return frozenset(
+        [('tag', item_id) for item_id in recipe.tag_ids]
+        + [('ingredient', item_id) for item_id in recipe.ingredient_ids]
+    )
+
+
+def _bucket(item):
+    kind, item_id = item
+    # the same in every process, unlike hash()
+    return (item_id * 2 + (kind == 'ingredient')) % BUCKETS
+
+
+def _cache():
+    return caches[settings.SIMILAR_RECIPES_CACHE]
+
+
+def _version(user_id):
+    version = _cache().get(VERSION_KEY.format(user_id=user_id))
+    record_cache('similarity', hit=version is not None)
+
+    return version
+
+
+def _bucket_keys(user_id, version, buckets):
+    return {
+        bucket: BUCKET_KEY.format(
+            user_id=user_id, version=version, bucket=bucket
+        )
+        for bucket in buckets
+    }
+
+
+def _read_buckets(user_id, version, buckets):
+    """Return {bucket: {item: {recipe id: item count}}}, None if incomplete"""
+    keys = _bucket_keys(user_id, version, buckets)
+    found = _cache().get_many(keys.values())
+    record_cache('similarity', hit=len(found) == len(keys))
+    if len(found) < len(keys):
+        # still being built, or evicted
+        return None
+
+    return {bucket: found[key] for bucket, key in keys.items()}
+
+
+def _write_buckets(user_id, version, buckets):
+    _cache().set_many(
+        {
+            key: buckets[bucket]
+            for bucket, key in _bucket_keys(user_id, version, buckets).items()
+        },
+        settings.SIMILAR_RECIPES_CACHE_SECONDS,
+    )
+
+
+def _rows(recipes):
+    # the denormalized arrays hold the links without joining them
+    return {
+        recipe.id: features(recipe)
+        for recipe in recipes.filter(is_hidden=False).only(
+            'id', 'tag_ids', 'ingredient_ids'
+        )
+    }
+
+
+def _add_row(buckets, recipe_id, items):
+    for item in items:
+        buckets[_bucket(item)].setdefault(item, {})[recipe_id] = len(items)
+
+
+def _remove_row(buckets, recipe_id):
+    """Drop a recipe from every column and return the buckets changed"""
+    changed = set()
+    for bucket, columns in buckets.items():
+        for item in [
+            item for item, column in columns.items() if recipe_id in column
+        ]:
+            del columns[item][recipe_id]
+            if not columns[item]:
+                del columns[item]
+            changed.add(bucket)
+
+    return changed
+
+
+def build(user_id):
+    """Build the user's index from the database and cache it"""
+    version = uuid.uuid4().hex
+    # set before reading, so writes committed from now on see an
+    # incomplete index and drop this version instead of missing it
+    _cache().set(VERSION_KEY.format(user_id=user_id), version, None)
+    buckets = {bucket: {} for bucket in range(BUCKETS)}
+    # the primary, as a replica may lag behind writes already committed
+    # that found no version to patch
+    for recipe_id, items in _rows(Recipe.objects.using(
+        router.db_for_write(Recipe)
+    ).filter(user_id=user_id)).items():
+        _add_row(buckets, recipe_id, items)
+    _write_buckets(user_id, version, buckets)
+
+    return buckets
+
+
+def similar_recipes(recipe, limit):
+    """Return (score, recipe id) of the recipes most like `recipe`"""
+    # the recipe's own items come from the row just read, not the cache
+    items = features(recipe)
+    if not items:
+        return []
+    buckets = None
+    version = _version(recipe.user_id)
+    if version is not None:
+        buckets = _read_buckets(
+            recipe.user_id, version, {_bucket(item) for item in items}
+        )
+    if buckets is None:
+        buckets = build(recipe.user_id)
+    overlaps = Counter()
+    sizes = {}
+    for item in items:
+        column = buckets[_bucket(item)].get(item, {})
+        overlaps.update(column.keys())
+        sizes.update(column)
+    overlaps.pop(recipe.id, None)
+    scores = (
+        (shared / (len(items) + sizes[other] - shared), other)
+        for other, shared in overlaps.items()
+    )
+
+    return heapq.nsmallest(
+        limit, scores, key=lambda score: (-score[0], score[1])
+    )
+
+
+def invalidate(user_id):
+    """Drop the user's index, built again by the next lookup"""
+    _cache().delete(VERSION_KEY.format(user_id=user_id))
+
+
+class _Patch:
+    """Commit callback moving recipes to their current rows in the index"""
+
+    def __init__(self, user_id, recipe_ids):
+        self.user_id = user_id
+        self.recipe_ids = set(recipe_ids)
+        self.pending = True
+
+    def __call__(self):
+        self.pending = False
+        version = _version(self.user_id)
+        if version is None:
+            # built from the database on the next lookup
+            return
+        lock = LOCK_KEY.format(user_id=self.user_id, version=version)
+        if not _cache().add(lock, True, LOCK_SECONDS):
+            # another patch is running, rebuilding beats waiting for it
+            invalidate(self.user_id)
+            return
+        try:
+            self.apply(version)
+        finally:
+            _cache().delete(lock)
+
+    def apply(self, version):
+        buckets = _read_buckets(self.user_id, version, range(BUCKETS))
+        if buckets is None:
+            invalidate(self.user_id)
+            return
+        # read under the lock, so the last patch applied has read the
+        # last commit; the primary, as a replica may not have it yet
+        rows = _rows(Recipe.objects.using(
+            router.db_for_write(Recipe)
+        ).filter(user_id=self.user_id, id__in=self.recipe_ids))
+        changed = set()
+        for recipe_id in self.recipe_ids:
+            changed |= _remove_row(buckets, recipe_id)
+            items = rows.get(recipe_id, ())
+            _add_row(buckets, recipe_id, items)
+            changed |= {_bucket(item) for item in items}
+        _write_buckets(self.user_id, version, {
+            bucket: buckets[bucket] for bucket in changed
+        })
+
+
+def update_recipes(user_id, recipe_ids):
+    """
+    Patch the rows of recipes whose links changed, or which were created,
+    hidden or deleted, once the current transaction commits.
+
+    The rows are read again at that point, so the patches of one
+    transaction are merged into a single one.
+    """
+    connection = transaction.get_connection()
+    for entry in connection.run_on_commit:
+        callback = entry[1]
+        if isinstance(callback, _Patch) and callback.pending and (
+            callback.user_id == user_id
+        ):
+            callback.recipe_ids.update(recipe_ids)
+            return
+    # a rolled back write must not show in the index
+    transaction.on_commit(_Patch(user_id, recipe_ids))
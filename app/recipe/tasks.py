@@ -0,0 +1,46 @@
+"""
+Background tasks for recipes
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from core.models import Recipe
+from job.registry import task
+
+
+def delete_in_batches(queryset, batch_size=None):
+    """
+    Delete the rows of `queryset` a batch per transaction, return the count.
+
+    Each transaction only locks and loads a batch, instead of one
+    transaction collecting every related row of a large cascade.
+    """
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            batch = model.objects.filter(pk__in=ids)
+            images = []
+            if model is Recipe:
+                images = list(
+                    batch.filter(image__gt='').values_list('image', flat=True)
+                )
+            batch.delete()
+        # once the rows are gone for good; a file left by a crash here is
+        # orphaned but harmless, the rows are never left without their file
+        for image in images:
+            default_storage.delete(image)
+        deleted += len(ids)
+
+
+@task('recipe.purge_recipes')
+def purge_recipes(recipe_ids):
+    """Delete recipes hidden by a bulk delete, with their images"""
+    return delete_in_batches(
+        Recipe.objects.filter(id__in=recipe_ids, is_hidden=True)
+    )
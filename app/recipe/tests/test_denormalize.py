@@ -0,0 +1,192 @@
+"""
+Tests for the denormalized tag and ingredient arrays of recipes
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.serializers import RecipeDetailSerializer
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def arrays(recipe):
+    """Return the recipe's arrays as stored in the database"""
+    return Recipe.objects.values_list(
+        'tag_ids', 'tag_names', 'ingredient_ids', 'ingredient_names'
+    ).get(id=recipe.id)
+
+
+class DenormalizedArraysTests(TestCase):
+    """Test the arrays follow link and item changes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'secret'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('2.00'),
+        )
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = Tag.objects.create(user=self.user, name='Quick')
+
+    def test_links_added_and_removed(self):
+        """Test adding, removing and clearing links updates the arrays"""
+        self.recipe.tags.add(self.quick, self.vegan)
+        self.assertEqual(arrays(self.recipe)[:2], (
+            [self.vegan.id, self.quick.id], ['Vegan', 'Quick']
+        ))
+        # the instance is refreshed too, saving it keeps the arrays
+        self.recipe.save()
+        self.assertEqual(self.recipe.tag_names, ['Vegan', 'Quick'])
+
+        self.recipe.tags.remove(self.vegan)
+        self.assertEqual(arrays(self.recipe)[:2], ([self.quick.id], ['Quick']))
+
+        self.recipe.tags.clear()
+        self.assertEqual(arrays(self.recipe)[:2], ([], []))
+
+    def test_reverse_links(self):
+        """Test links changed from the tag side update the recipes"""
+        other = Recipe.objects.create(
+            user=self.user, title='Salad', time_minutes=5,
+            price=Decimal('2.00'),
+        )
+        self.vegan.recipe_set.add(self.recipe, other)
+        self.assertEqual(arrays(other)[1], ['Vegan'])
+
+        self.vegan.recipe_set.clear()
+        self.assertEqual(arrays(self.recipe)[1], [])
+        self.assertEqual(arrays(other)[1], [])
+
+    def test_create_and_update_through_api(self):
+        """Test recipes written through the API carry their arrays"""
+        res = self.client.post(RECIPE_URL, {
+            'title': 'Curry', 'time_minutes': 30, 'price': '5.00',
+            'tags': [{'name': 'Vegan'}, {'name': 'Spicy'}],
+            'ingredients': [{'name': 'Rice'}],
+        }, format='json')
+        recipe = Recipe.objects.get(id=res.data['id'])
+        spicy = Tag.objects.get(name='Spicy')
+        rice = Ingredient.objects.get(name='Rice')
+        self.assertEqual(arrays(recipe), (
+            [self.vegan.id, spicy.id], ['Vegan', 'Spicy'],
+            [rice.id], ['Rice'],
+        ))
+
+        self.client.patch(
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            {'title': 'Green curry', 'tags': [{'name': 'Quick'}]},
+            format='json',
+        )
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Green curry')
+        self.assertEqual(arrays(recipe)[:2], ([self.quick.id], ['Quick']))
+        self.assertEqual(arrays(recipe)[3], ['Rice'])
+
+    def test_rename_through_api(self):
+        """Test renaming a tag renames it in every recipe"""
+        self.recipe.tags.add(self.vegan)
+
+        res = self.client.patch(
+            reverse('recipe:tag-detail', args=[self.vegan.id]),
+            {'name': 'Plant based'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(arrays(self.recipe)[1], ['Plant based'])
+
+    def test_delete_through_api(self):
+        """Test deleting an ingredient removes it from its recipes"""
+        kale = Ingredient.objects.create(user=self.user, name='Kale')
+        self.recipe.ingredients.add(kale)
+
+        self.client.delete(
+            reverse('recipe:ingredient-detail', args=[kale.id])
+        )
+
+        self.assertEqual(arrays(self.recipe)[2:], ([], []))
+
+    def test_rename_and_delete_outside_api(self):
+        """Test items changed through the admin or the ORM are followed"""
+        self.recipe.tags.add(self.vegan, self.quick)
+
+        self.vegan.name = 'Plant based'
+        self.vegan.save()
+        self.assertEqual(arrays(self.recipe)[1], ['Plant based', 'Quick'])
+
+        self.quick.delete()
+        self.assertEqual(
+            arrays(self.recipe)[:2], ([self.vegan.id], ['Plant based'])
+        )
+
+    def test_update_keeps_arrays_changed_meanwhile(self):
+        """Test an update does not write back arrays loaded before it"""
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id])
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        stale = Recipe.objects.get(id=self.recipe.id)
+        # linked by another request after `stale` was loaded
+        self.recipe.tags.add(self.vegan)
+        serializer = RecipeDetailSerializer(
+            stale, data={'title': 'Broth'}, partial=True,
+            context={'request': res.wsgi_request},
+        )
+        serializer.is_valid(raise_exception=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            serializer.save()
+
+        self.assertEqual(arrays(self.recipe)[1], ['Vegan'])
+        update, = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ]
+        self.assertNotIn('tag_ids', update)
+
+    def test_list_reads_arrays_without_joins(self):
+        """Test listing recipes does not query tags or ingredients"""
+        self.recipe.tags.add(self.vegan)
+        kale = Ingredient.objects.create(user=self.user, name='Kale')
+        self.recipe.ingredients.add(kale)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(
+            res.data[0]['tags'], [{'id': self.vegan.id, 'name': 'Vegan'}]
+        )
+        self.assertEqual(
+            res.data[0]['ingredients'], [{'id': kale.id, 'name': 'Kale'}]
+        )
+
+    def test_filter_by_tags_overlap(self):
+        """Test the tags filter matches recipes with any of the tags"""
+        self.recipe.tags.add(self.vegan, self.quick)
+        other = Recipe.objects.create(
+            user=self.user, title='Salad', time_minutes=5,
+            price=Decimal('2.00'),
+        )
+        other.tags.add(self.quick)
+
+        res = self.client.get(
+            RECIPE_URL, {'tags': f'{self.vegan.id},{self.quick.id}'}
+        )
+
+        # each recipe once, although it matches both tags
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data], [other.id, self.recipe.id]
+        )
@@ -135,3 +135,26 @@ class PrivateIngredientAPITests(TestCase):
         self.assertEqual(len(res.data), 1)
         # serializer = IngredientSerializer(in1, many=False)
         # self.assertEqual(res.data, serializer.data)
+
+    def test_ingredients_assigned_with_recipe_count(self):
+        """Test assigned ingredients annotated with their recipe count"""
+        in1 = Ingredient.objects.create(user=self.user, name="Apples")
+        Ingredient.objects.create(user=self.user, name="orange")
+        for title in ['Sample recipe', 'Sample recipe 2']:
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                price=Decimal('55.45'),
+                time_minutes=13,
+            )
+            recipe.ingredients.add(in1)
+
+        res = self.client.get(
+            INGREDIENT_URL,
+            {'assigned_only': 1, 'with_recipe_count': 1},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['id'], in1.id)
+        self.assertEqual(res.data[0]['recipe_count'], 2)
@@ -5,17 +5,20 @@ from PIL import Image
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from core.models import Recipe, Tag, Ingredient
+from core.models import Job, Recipe, Tag, Ingredient
 
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPE_URL = reverse('recipe:recipe-list')
+BULK_DELETE_URL = reverse('recipe:recipe-bulk-delete')
 
 
 def detail_url(recipe_id):
@@ -214,6 +217,41 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
         self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
 
+    def test_bulk_delete_hides_recipes(self):
+        """Test bulk deleted recipes disappear and are queued for purging"""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+        other_user = create_user(email='other@example.com', password='test')
+        other_recipe = create_recipe(user=other_user)
+        ids = [recipes[0].id, recipes[1].id, other_recipe.id]
+
+        res = self.client.post(BULK_DELETE_URL, {'ids': ids}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertCountEqual(res.data['ids'], ids[:2])
+        job = Job.objects.get(id=res.data['job']['id'])
+        self.assertEqual(job.name, 'recipe.purge_recipes')
+        self.assertCountEqual(job.payload['recipe_ids'], ids[:2])
+        listed = self.client.get(RECIPE_URL)
+        self.assertEqual([r['id'] for r in listed.data], [recipes[2].id])
+        res = self.client.get(detail_url(recipes[0].id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        other_recipe.refresh_from_db()
+        self.assertFalse(other_recipe.is_hidden)
+
+    def test_bulk_delete_nothing_to_delete(self):
+        """Test no job is queued when none of the recipes are the user's"""
+        res = self.client.post(BULK_DELETE_URL, {'ids': [0]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIsNone(res.data['job'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_bulk_delete_requires_ids(self):
+        """Test bulk delete rejects an empty list"""
+        res = self.client.post(BULK_DELETE_URL, {'ids': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_recipe_with_new_tags(self):
         """Test creating recipe with new tags"""
         payload = {
@@ -430,6 +468,40 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_get_recipes_by_ids(self):
+        """Test the details of several recipes in the requested order"""
+        recipes = [
+            create_recipe(user=self.user, title=title)
+            for title in ['Soup', 'Stew', 'Curry', 'Salad']
+        ]
+        recipes[0].tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        recipes[2].ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice')
+        )
+        hidden = create_recipe(user=self.user, is_hidden=True)
+        other = create_recipe(user=create_user(email='other@example.com'))
+        requested = [recipes[2], recipes[0], recipes[2], recipes[3]]
+
+        # the recipes, then their tags and their ingredients
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPE_URL, {'ids': ','.join(
+                str(recipe.id) for recipe in [*requested, hidden, other]
+            )})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            RecipeDetailSerializer(recipe).data
+            for recipe in [recipes[2], recipes[0], recipes[3]]
+        ])
+
+    def test_get_recipes_by_invalid_ids(self):
+        """Test malformed or too many ids are rejected"""
+        too_many = ','.join(map(str, range(1, 102)))
+        for ids in ['', '1,x', too_many]:
+            res = self.client.get(RECIPE_URL, {'ids': ids})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class ImageUploadTests(TestCase):
     """Tests for image uploading"""
@@ -458,6 +530,23 @@ class ImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def test_upload_image_saves_only_image(self):
+        """Test uploading an image leaves the other columns alone"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(url, {'image': image_file},
+                                 format='multipart')
+
+        self.recipe.refresh_from_db()
+        update, = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "core_recipe"')
+        ]
+        self.assertNotIn('tag_ids', update)
+
     def test_upload_image_bad_request(self):
         """Test uploading image"""
         url = image_upload_url(self.recipe.id)
@@ -0,0 +1,104 @@
+"""
+Tests for the shopping list API
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.db import routers
+from core.models import Ingredient, Recipe
+
+SHOPPING_LIST_URL = reverse('recipe:shopping-list')
+
+
+class ShoppingListTests(TestCase):
+    """Test merging the ingredients of many recipes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'secret'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _recipe(self, ingredients, user=None, **params):
+        recipe = Recipe.objects.create(
+            user=user or self.user, title='Recipe', time_minutes=5,
+            price=Decimal('1.00'), **params,
+        )
+        recipe.ingredients.add(*ingredients)
+
+        return recipe
+
+    def test_requires_auth(self):
+        """Test a token is needed"""
+        res = APIClient().post(SHOPPING_LIST_URL, {'ids': [1]})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_ingredients_merged(self):
+        """Test each ingredient is listed once with its recipes"""
+        salt, garlic, rice = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ['Salt', 'Garlic', 'Rice']
+        ]
+        soup = self._recipe([salt, garlic])
+        bread = self._recipe([salt])
+        # not selected
+        self._recipe([rice])
+        hidden = self._recipe([rice], is_hidden=True)
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'secret'
+        )
+        foreign = self._recipe(
+            [Ingredient.objects.create(user=other, name='Pepper')], other
+        )
+
+        with self.assertNumQueries(1):
+            res = self.client.post(SHOPPING_LIST_URL, {
+                'ids': [soup.id, bread.id, hidden.id, foreign.id, 0],
+            }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'ingredients': [
+            {'id': garlic.id, 'name': 'Garlic', 'recipes': [soup.id]},
+            {'id': salt.id, 'name': 'Salt', 'recipes': [soup.id, bread.id]},
+        ]})
+
+    def test_ids_required(self):
+        """Test an empty or missing id list is rejected"""
+        for payload in [{}, {'ids': []}]:
+            res = self.client.post(SHOPPING_LIST_URL, payload, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_too_many_ids(self):
+        """Test more ids than SHOPPING_LIST_MAX_IDS are rejected"""
+        ids = list(range(1, settings.SHOPPING_LIST_MAX_IDS + 2))
+
+        res = self.client.post(SHOPPING_LIST_URL, {'ids': ids}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(DATABASE_REPLICAS=['replica_a'])
+    def test_not_pinned_to_primary(self):
+        """Test the read-only POST does not pin the user to the primary"""
+        self.addCleanup(caches[settings.DATABASE_REPLICA_PIN_CACHE].clear)
+        token = Token.objects.create(user=self.user).key
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+        res = client.post(
+            SHOPPING_LIST_URL, {'ids': [self._recipe([]).id]}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(routers.is_pinned_to_primary(token))
@@ -0,0 +1,219 @@
+"""
+Tests for similar recipe recommendations
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db import routers
+from core.models import Ingredient, Recipe, Tag
+from recipe import similarity
+
+RECIPES_URL = reverse('recipe:recipe-list')
+BULK_DELETE_URL = reverse('recipe:recipe-bulk-delete')
+
+
+def similar_url(recipe_id):
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+def cached_version(user):
+    return caches[settings.SIMILAR_RECIPES_CACHE].get(
+        similarity.VERSION_KEY.format(user_id=user.id)
+    )
+
+
+def cached_columns(user):
+    """Return {item: {recipe id: item count}} of the user's cached index"""
+    keys = similarity._bucket_keys(
+        user.id, cached_version(user), range(similarity.BUCKETS)
+    )
+    columns = {}
+    for bucket in caches[settings.SIMILAR_RECIPES_CACHE].get_many(
+        keys.values()
+    ).values():
+        columns.update(bucket)
+
+    return columns
+
+
+class SimilarRecipesTests(TestCase):
+    """Test ranking recipes by shared tags and ingredients"""
+
+    def setUp(self):
+        caches[settings.SIMILAR_RECIPES_CACHE].clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'secret'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.salt, self.garlic, self.rice = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ['Salt', 'Garlic', 'Rice']
+        ]
+        self.soup = self._recipe(
+            'Soup', [self.vegan], [self.salt, self.garlic]
+        )
+
+    def _recipe(self, title, tags, ingredients, user=None):
+        recipe = Recipe.objects.create(
+            user=user or self.user, title=title, time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.add(*tags)
+            recipe.ingredients.add(*ingredients)
+
+        return recipe
+
+    def _similar(self, recipe, **params):
+        res = self.client.get(similar_url(recipe.id), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return [(item['title'], item['similarity']) for item in res.data]
+
+    def test_ranked_by_jaccard(self):
+        """Test recipes are ordered by shared over combined items"""
+        self._recipe('Stew', [], [self.salt, self.garlic])
+        self._recipe('Bread', [], [self.salt, self.rice])
+        self._recipe('Rice', [], [self.rice])
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'secret'
+        )
+        self._recipe('Copy', [self.vegan], [self.salt, self.garlic], other)
+
+        self.assertEqual(self._similar(self.soup), [
+            ('Stew', 2 / 3), ('Bread', 1 / 4),
+        ])
+        self.assertEqual(self._similar(self.soup, limit=1), [
+            ('Stew', 2 / 3),
+        ])
+
+    def test_index_patched_on_write(self):
+        """Test writes update the cached index instead of rebuilding it"""
+        self._similar(self.soup)
+        version = cached_version(self.user)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            res = self.client.post(RECIPES_URL, {
+                'title': 'Salad', 'time_minutes': 5, 'price': '2.00',
+                'tags': [{'name': 'Vegan'}],
+                'ingredients': [{'name': 'Salt'}, {'name': 'Garlic'}],
+            }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        # both link changes patch the index once
+        self.assertEqual(len(callbacks), 1)
+
+        # the recipe, the index version, the buckets of the recipe's items
+        # and the similar recipes; no query to rebuild the index
+        with self.assertNumQueries(4):
+            self.assertEqual(self._similar(self.soup), [('Salad', 1.0)])
+        salad = Recipe.objects.get(id=res.data['id'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('recipe:recipe-detail', args=[salad.id]),
+                {'ingredients': [{'name': 'Rice'}]}, format='json',
+            )
+        self.assertEqual(self._similar(self.soup), [('Salad', 1 / 4)])
+        self.assertEqual(cached_version(self.user), version)
+
+    def test_links_outside_api_patch_index(self):
+        """Test links made through the admin or the ORM reach the index"""
+        stew = self._recipe('Stew', [], [self.rice])
+        self._similar(self.soup)
+        version = cached_version(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stew.ingredients.add(self.salt)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.garlic.recipe_set.add(stew)
+
+        self.assertEqual(self._similar(self.soup), [('Stew', 2 / 4)])
+        self.assertEqual(cached_version(self.user), version)
+
+    def test_deleted_recipes_leave_index(self):
+        """Test deleted and bulk deleted recipes are not recommended"""
+        stew = self._recipe('Stew', [], [self.salt, self.garlic])
+        bread = self._recipe('Bread', [], [self.salt, self.rice])
+        self._similar(self.soup)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(
+                reverse('recipe:recipe-detail', args=[stew.id])
+            )
+            self.client.post(
+                BULK_DELETE_URL, {'ids': [bread.id]}, format='json'
+            )
+
+        self.assertEqual(self._similar(self.soup), [])
+        self.assertEqual(cached_columns(self.user), {
+            ('tag', self.vegan.id): {self.soup.id: 3},
+            ('ingredient', self.salt.id): {self.soup.id: 3},
+            ('ingredient', self.garlic.id): {self.soup.id: 3},
+        })
+
+    def test_item_delete_patches_index(self):
+        """Test deleting an ingredient removes it from its recipes"""
+        self._recipe('Stew', [], [self.garlic])
+        self._similar(self.soup)
+        version = cached_version(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(
+                reverse('recipe:ingredient-detail', args=[self.garlic.id])
+            )
+
+        self.assertEqual(self._similar(self.soup), [])
+        self.assertEqual(cached_version(self.user), version)
+
+    def test_concurrent_patch_drops_index(self):
+        """Test a patch that cannot take the lock drops the index"""
+        stew = self._recipe('Stew', [], [self.rice])
+        self._similar(self.soup)
+        # held by a patch running in another worker
+        caches[settings.SIMILAR_RECIPES_CACHE].add(
+            similarity.LOCK_KEY.format(
+                user_id=self.user.id, version=cached_version(self.user)
+            ), True,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stew.ingredients.add(self.salt)
+
+        self.assertIsNone(cached_version(self.user))
+        self.assertEqual(self._similar(self.soup), [('Stew', 1 / 4)])
+
+    def test_index_built_from_primary(self):
+        """Test building the index reads the primary during replica reads"""
+        self._recipe('Stew', [], [self.salt])
+        routers.enable_replica_reads()
+        self.addCleanup(routers.disable_replica_reads)
+
+        with override_settings(DATABASE_REPLICAS=['lagging_replica']):
+            similarity.build(self.user.id)
+
+        routers.disable_replica_reads()
+        self.assertEqual(self._similar(self.soup), [('Stew', 1 / 3)])
+
+    def test_invalid_limit(self):
+        """Test the limit must be between 1 and the maximum"""
+        for limit in [0, 51, 'many']:
+            res = self.client.get(similar_url(self.soup.id), {'limit': limit})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_recipe_not_found(self):
+        """Test recipes of other users cannot be looked up"""
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'secret'
+        )
+        recipe = self._recipe('Stew', [], [], other)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
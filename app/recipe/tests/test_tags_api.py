@@ -2,6 +2,8 @@
 Tests for Tags APIs
 """
 from decimal import Decimal
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
@@ -11,6 +13,7 @@ from rest_framework.test import APIClient
 
 from core.models import Tag, Recipe
 
+from recipe.pagination import NameKeysetPagination
 from recipe.serializers import TagSerializer
 
 
@@ -137,3 +140,84 @@ class PrivateTagsAPITests(TestCase):
         self.assertEqual(len(res.data), 1)
         # serializer = TagSerializer(tag, many=False)
         # self.assertEqual(res.data, serializer.data)
+
+    def test_tags_with_recipe_count(self):
+        """Test listing tags annotated with their recipe count"""
+        tag1 = Tag.objects.create(user=self.user, name='Apple')
+        tag2 = Tag.objects.create(user=self.user, name='Pear')
+        for title in ['Sample recipe1', 'Sample recipe2']:
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=20,
+                price=Decimal('11.45'),
+            )
+            recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'with_recipe_count': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        counts = {tag['id']: tag['recipe_count'] for tag in res.data}
+        self.assertEqual(counts, {tag1.id: 2, tag2.id: 0})
+
+    def test_hidden_recipes_not_counted(self):
+        """Test recipes waiting to be purged do not assign or count tags"""
+        tag = Tag.objects.create(user=self.user, name='Apple')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=20,
+            price=Decimal('11.45'),
+            is_hidden=True,
+        )
+        recipe.tags.add(tag)
+
+        assigned = self.client.get(TAGS_URL, {'assigned_only': 1})
+        counted = self.client.get(TAGS_URL, {'with_recipe_count': 1})
+
+        self.assertEqual(assigned.data, [])
+        self.assertEqual(counted.data[0]['recipe_count'], 0)
+
+    def test_tags_without_recipe_count(self):
+        """Test recipe count is omitted unless requested"""
+        Tag.objects.create(user=self.user, name='Apple')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertNotIn('recipe_count', res.data[0])
+
+    def test_tags_paginated_by_name_keyset(self):
+        """Test paging through tags with the next link cursor"""
+        for name in ['Apple', 'Pear', 'Plum', 'Pear', 'Fig']:
+            Tag.objects.create(user=self.user, name=name)
+        expected = list(
+            Tag.objects.order_by('-name', '-id').values_list('id', flat=True)
+        )
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        ids = [tag['id'] for tag in res.data]
+        while 'Link' in res:
+            next_url = res['Link'].split(';')[0].strip('<>')
+            res = self.client.get(next_url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data), 2)
+            ids.extend(tag['id'] for tag in res.data)
+
+        self.assertEqual(ids, expected)
+
+    def test_tags_page_size_capped(self):
+        """Test requested page size is capped by the server"""
+        Tag.objects.bulk_create([
+            Tag(user=self.user, name=f'Tag {i}') for i in range(3)
+        ])
+        with patch.object(NameKeysetPagination, 'max_page_size', 2):
+            res = self.client.get(TAGS_URL, {'page_size': 50})
+
+        self.assertEqual(len(res.data), 2)
+        self.assertIn('rel="next"', res['Link'])
+
+    def test_tags_invalid_cursor(self):
+        """Test an invalid cursor returns 404"""
+        res = self.client.get(TAGS_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
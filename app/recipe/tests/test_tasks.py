@@ -0,0 +1,71 @@
+"""
+Tests for the recipe background tasks
+"""
+import os
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Recipe, Tag
+from recipe import tasks
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    return Recipe.objects.create(
+        user=user, title='Sample recipe', time_minutes=10,
+        price=Decimal('1.19'), **params
+    )
+
+
+class PurgeRecipesTests(TestCase):
+    """Test purging bulk deleted recipes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'secret'
+        )
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_purge_deletes_hidden_recipes_and_images(self):
+        """Test hidden recipes are deleted in batches with their images"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        hidden = [
+            create_recipe(self.user, is_hidden=True) for _ in range(5)
+        ]
+        hidden[0].tags.add(tag)
+        hidden[0].image = SimpleUploadedFile('soup.jpg', b'image')
+        hidden[0].save()
+        image_path = hidden[0].image.path
+        visible = create_recipe(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            deleted = tasks.delete_in_batches(
+                Recipe.objects.filter(is_hidden=True), batch_size=2
+            )
+
+        self.assertEqual(deleted, 5)
+        recipe_deletes = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('DELETE FROM "core_recipe" ')
+        ]
+        self.assertEqual(len(recipe_deletes), 3)
+        self.assertEqual(list(Recipe.objects.all()), [visible])
+        self.assertFalse(os.path.exists(image_path))
+        self.assertTrue(Tag.objects.filter(id=tag.id).exists())
+
+    def test_purge_skips_visible_recipes(self):
+        """Test the purge job only deletes recipes that are still hidden"""
+        recipe = create_recipe(self.user)
+
+        self.assertEqual(tasks.purge_recipes(recipe_ids=[recipe.id]), 0)
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
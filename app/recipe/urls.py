@@ -1,4 +1,5 @@
 # URL mapping for recipe
+from django.conf import settings
 from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
@@ -13,5 +14,17 @@ router.register('ingredients', views.IngredientViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(router.urls)),
+    path(
+        'shopping-list/',
+        views.ShoppingListView.as_view(),
+        name='shopping-list',
+    ),
 ]
+
+if settings.SERVER_MODE == 'asgi':
+    urlpatterns.insert(0, path(
+        'recipes/<int:pk>/upload-image/',
+        views.upload_image_async,
+        name='recipe-upload-image',
+    ))
@@ -5,14 +5,24 @@ from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiTypes,
 )
-from rest_framework import viewsets, mixins, status
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
+from rest_framework import generics, viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.fields import IntegerField, ListField
 from rest_framework.response import Response
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.concurrency import run_sync
 from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from recipe import serializers, similarity, tasks
+from recipe.pagination import NameKeysetPagination
+from user import stats
 
 
 @extend_schema_view(
@@ -27,6 +37,14 @@ from recipe import serializers
                 'ingredients',
                 OpenApiTypes.STR,
                 description='Use comma separated list of IDS for filtering'
+            ),
+            OpenApiParameter(
+                'ids',
+                OpenApiTypes.STR,
+                description=(
+                    'Comma separated list of IDS to return the details of, '
+                    'in the same order'
+                )
             )
         ]
     )
@@ -34,9 +52,11 @@ from recipe import serializers
 class RecipeViewSet(viewsets.ModelViewSet):
     # views for managing recipe APIs
     serializer_class = serializers.RecipeDetailSerializer
-    queryset = Recipe.objects.all()
+    # bulk deleted recipes stay hidden until they are purged
+    queryset = Recipe.objects.filter(is_hidden=False)
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
 
     def _param_to_ints(self, qs):
         """Parse a list of strings and convert to integers"""
@@ -46,31 +66,71 @@ class RecipeViewSet(viewsets.ModelViewSet):
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
+        # overlap (&&) on the denormalized arrays uses their GIN indexes and
+        # needs no join, so no DISTINCT either
         if tags:
             tag_ids = self._param_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(tag_ids__overlap=tag_ids)
         if ingredients:
             ingredient_ids = self._param_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.filter(ingredient_ids__overlap=ingredient_ids)
+
+        if self.action in ('update', 'partial_update'):
+            # the user stats deltas compare against the row as loaded, a
+            # concurrent update must not change it in between
+            queryset = queryset.select_for_update()
 
         return queryset.filter(
             user=self.request.user
-            ).order_by('-id').distinct()
-        # return self.queryset.filter(user=self.request.user).order_by('-id')
+            ).order_by('-id')
 
     def get_serializer_class(self):
         # return the serializer class for request
-        if self.action == 'list':
+        if self.action == 'list' and 'ids' not in self.request.query_params:
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'bulk_delete':
+            return serializers.RecipeBulkDeleteSerializer
+        elif self.action == 'similar':
+            return serializers.SimilarRecipeSerializer
 
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        if 'ids' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        # the details of many recipes at once, instead of one GET each
+        ids = ListField(
+            child=IntegerField(), allow_empty=False,
+            max_length=settings.RECIPE_MULTI_GET_MAX_IDS,
+        ).run_validation(request.query_params['ids'].split(','))
+        ids = list(dict.fromkeys(ids))
+        recipes = self.get_queryset().prefetch_related(
+            'tags', 'ingredients'
+        ).in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in ids if recipe_id in recipes],
+            many=True,
+        )
+
+        return Response(serializer.data)
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        # holds the row lock taken by get_object() until the save commits
+        return super().update(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         # create new recipe
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # delete() clears the primary key
+            similarity.update_recipes(instance.user_id, [instance.id])
+            instance.delete()
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         recipe = self.get_object()
@@ -82,6 +142,63 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(responses={202: serializers.RecipeBulkDeleteSerializer})
+    @action(methods=['POST'], detail=False, url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """Hide recipes now and delete them in a background job"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            rows = list(
+                self.queryset.filter(
+                    user=request.user, id__in=serializer.validated_data['ids']
+                ).select_for_update().values_list(
+                    'id', 'price', 'time_minutes'
+                )
+            )
+            ids = [recipe_id for recipe_id, _, _ in rows]
+            job = None
+            if ids:
+                Recipe.objects.filter(id__in=ids).update(is_hidden=True)
+                stats.update_stats(request.user.id, removed=[
+                    (price, minutes) for _, price, minutes in rows
+                ])
+                similarity.update_recipes(request.user.id, ids)
+                job = tasks.purge_recipes.enqueue(
+                    recipe_ids=ids, user=request.user
+                )
+        serializer = self.get_serializer({'ids': ids, 'job': job})
+
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(parameters=[
+        OpenApiParameter(
+            'limit',
+            OpenApiTypes.INT,
+            description='Number of recipes to return, 10 by default'
+        )
+    ])
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """List the user's recipes sharing the most tags and ingredients"""
+        recipe = self.get_object()
+        limit = IntegerField(
+            min_value=1, max_value=settings.SIMILAR_RECIPES_MAX_LIMIT
+        ).run_validation(request.query_params.get('limit', 10))
+        ranked = similarity.similar_recipes(recipe, limit)
+        # the cached index may lag behind deletes, the query does not
+        recipes = self.queryset.filter(user=request.user).in_bulk(
+            [recipe_id for _, recipe_id in ranked]
+        )
+        similar = []
+        for score, recipe_id in ranked:
+            if recipe_id in recipes:
+                recipes[recipe_id].similarity = score
+                similar.append(recipes[recipe_id])
+        serializer = self.get_serializer(similar, many=True)
+
+        return Response(serializer.data)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -90,6 +207,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes'
+            ),
+            OpenApiParameter(
+                'with_recipe_count',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='Include the number of recipes using each item'
             )
         ]
     )
@@ -101,28 +223,124 @@ class BaseRecipeAttrViewSet(mixins.UpdateModelMixin,
     """Base attribute class for recipe viewsets"""
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = NameKeysetPagination
+    read_from_replica = True
+    # name of the Recipe M2M field pointing at this viewset's model
+    recipe_field = None
+
+    def _recipe_links(self):
+        """Return Recipe link rows of the item in the outer query"""
+        field = Recipe._meta.get_field(self.recipe_field)
+        through = field.remote_field.through
+        item_field = self.queryset.model._meta.model_name
+
+        return through.objects.filter(
+            **{item_field: OuterRef('pk')}, recipe__is_hidden=False
+        )
 
     def get_queryset(self):
         """Filter queryset for authenticated user only"""
         assigned_only = bool(
             int(self.request.query_params.get('assigned_only', 0))
         )
+        with_recipe_count = bool(
+            int(self.request.query_params.get('with_recipe_count', 0))
+        )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            # EXISTS stops at the first link instead of joining every
+            # recipe row and deduplicating with DISTINCT afterwards
+            queryset = queryset.filter(Exists(self._recipe_links()))
+        if with_recipe_count:
+            item_field = self.queryset.model._meta.model_name
+            counts = self._recipe_links().order_by().values(
+                item_field
+            ).annotate(count=Count('pk')).values('count')
+            queryset = queryset.annotate(
+                recipe_count=Coalesce(Subquery(counts), 0)
+            )
 
         return queryset.filter(
             user=self.request.user
-            ).order_by('-name').distinct()
+            ).order_by('-name', '-id')
+
+    def perform_update(self, serializer):
+        # a rename and the recipe arrays recorded by recipe.denormalize
+        # change together
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        # the recipe arrays and the similarity index follow through the
+        # receivers of recipe.denormalize
+        with transaction.atomic():
+            instance.delete()
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in the database"""
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    recipe_field = 'tags'
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients CRUD"""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    recipe_field = 'ingredients'
+
+
+class ShoppingListView(generics.GenericAPIView):
+    """Merge the ingredients of the given recipes into one list"""
+    serializer_class = serializers.ShoppingListSerializer
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # a POST only to carry the ids, it writes nothing to read back
+        request._request.pin_to_primary = False
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # one GROUP BY over the links instead of a detail request per recipe
+        links = Recipe.ingredients.through.objects.filter(
+            recipe__user=request.user,
+            recipe__is_hidden=False,
+            recipe_id__in=serializer.validated_data['ids'],
+        )
+        ingredients = links.values(
+            'ingredient_id', 'ingredient__name'
+        ).annotate(
+            recipes=ArrayAgg('recipe_id', ordering='recipe_id')
+        ).order_by('ingredient__name', 'ingredient_id')
+        serializer = self.get_serializer({'ingredients': ingredients})
+
+        return Response(serializer.data)
+
+
+_upload_image_view = RecipeViewSet.as_view(
+    {'post': 'upload_image'}, detail=True, basename='recipe'
+)
+
+
+def _upload_image(request, pk):
+    """Run the upload_image action and render its response"""
+    response = _upload_image_view(request, pk=pk)
+    response.render()
+    plain = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        plain[header] = value
+
+    return plain
+
+
+async def upload_image_async(request, pk):
+    """
+    Upload an image to a recipe (ASGI mode).
+
+    The ASGI server has already received the body without holding a
+    thread, however slow the client; authentication, validation and
+    storage then run on the bounded pool. Returning a rendered plain
+    response keeps Django from rendering it on its single sync thread.
+    """
+    return await run_sync(_upload_image, request, pk)
@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user'
+
+    def ready(self):
+        from user import stats
+
+        stats.connect()
+
+    def warm_up(self):
+        """Build the serializer fields and their validators once"""
+        from user import serializers
+
+        for serializer_class in [
+            serializers.UserSerializer,
+            serializers.AuthTokenSerializer,
+            serializers.UserStatsSerializer,
+        ]:
+            serializer_class().fields
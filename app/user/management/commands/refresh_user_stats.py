@@ -0,0 +1,28 @@
+"""
+Recompute the per-user recipe summaries from their rows
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from user import stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the recipe summary of every user, or of the given user '
+        'ids, repairing drift the incremental updates may have left. Meant '
+        'to run periodically, e.g. nightly from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+        refreshed = 0
+        for user_id in users.values_list('id', flat=True):
+            stats.refresh_user_stats(user_id)
+            refreshed += 1
+        self.stdout.write(f'refresh_user_stats users={refreshed}')
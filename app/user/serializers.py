@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
+from core.models import UserStats
+
 
 class UserSerializer(serializers.ModelSerializer):
     # serialize user object
@@ -51,3 +53,21 @@ class AuthTokenSerializer(serializers.Serializer):
         attrs['user'] = user
 
         return attrs
+
+
+class UserStatsSerializer(serializers.ModelSerializer):
+    # serialize the recipe summary of a user
+    price_avg = serializers.DecimalField(
+        max_digits=7, decimal_places=2, read_only=True, allow_null=True
+    )
+    time_minutes_avg = serializers.FloatField(
+        read_only=True, allow_null=True
+    )
+
+    class Meta:
+        model = UserStats
+        fields = [
+            'recipe_count', 'tag_count', 'ingredient_count',
+            'price_avg', 'price_min', 'price_max', 'time_minutes_avg',
+        ]
+        read_only_fields = fields
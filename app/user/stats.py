@@ -0,0 +1,215 @@
+"""
+Keep the per-user recipe summary in sync with recipe, tag and ingredient
+writes, so the stats endpoint reads one row instead of counting
+"""
+import contextlib
+import contextvars
+
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.db.models import (
+    Case, Count, F, Max, Min, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.db.models.signals import post_delete, post_save
+
+from core.models import Ingredient, Recipe, Tag, UserStats
+
+# the recipe fields the summary is computed from
+TRACKED_FIELDS = ('user_id', 'price', 'time_minutes', 'is_hidden')
+
+_suspended = contextvars.ContextVar('user_stats_suspended', default=False)
+
+
+@contextlib.contextmanager
+def suspended():
+    """Skip the per-row updates, for deletions that drop the stats anyway"""
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def refresh_user_stats(user_id):
+    """Recompute the summary of `user_id` from its rows and save it"""
+    using = router.db_for_write(UserStats)
+    recipes = Recipe.objects.using(using).filter(
+        user_id=user_id, is_hidden=False
+    ).aggregate(
+        recipe_count=Count('id'),
+        price_sum=Coalesce(Sum('price'), Value(0), output_field=(
+            UserStats._meta.get_field('price_sum')
+        )),
+        price_min=Min('price'),
+        price_max=Max('price'),
+        time_minutes_sum=Coalesce(Sum('time_minutes'), Value(0)),
+    )
+    stats, _ = UserStats.objects.using(using).update_or_create(
+        user_id=user_id,
+        defaults={
+            **recipes,
+            'tag_count': Tag.objects.using(using).filter(
+                user_id=user_id
+            ).count(),
+            'ingredient_count': Ingredient.objects.using(using).filter(
+                user_id=user_id
+            ).count(),
+        },
+    )
+
+    return stats
+
+
+def _recomputed(user_id, function):
+    # runs after the change, so it already sees the new rows
+    return Subquery(
+        Recipe.objects.filter(user_id=user_id, is_hidden=False)
+        .values('user_id')
+        .annotate(value=function('price'))
+        .values('value')
+    )
+
+
+def _extreme(field, bound, function, user_id, removed, added):
+    new = F(field)
+    if added:
+        # LEAST and GREATEST skip NULL, the value of an empty summary
+        new = bound(new, Value(function(added)))
+    if not removed:
+        return new
+    # only removing the current extreme needs a look at the other rows
+    lookup = 'lte' if function is min else 'gte'
+
+    return Case(
+        When(**{f'{field}__{lookup}': function(removed)},
+             then=_recomputed(user_id, Min if function is min else Max)),
+        default=new,
+    )
+
+
+def update_stats(user_id, removed=(), added=(), tags=0, ingredients=0):
+    """
+    Apply a change to the summary of `user_id` in a single UPDATE.
+
+    `removed` and `added` are the (price, time_minutes) of recipes that
+    left or joined the visible set, `tags` and `ingredients` count deltas.
+    """
+    removed, added = list(removed), list(added)
+    removed_prices = [price for price, _ in removed]
+    added_prices = [price for price, _ in added]
+    changes = {
+        'recipe_count': F('recipe_count') + len(added) - len(removed),
+        'price_sum': (
+            F('price_sum') + sum(added_prices) - sum(removed_prices)
+        ),
+        'time_minutes_sum': (
+            F('time_minutes_sum')
+            + sum(minutes for _, minutes in added)
+            - sum(minutes for _, minutes in removed)
+        ),
+        'price_min': _extreme(
+            'price_min', Least, min, user_id, removed_prices, added_prices
+        ),
+        'price_max': _extreme(
+            'price_max', Greatest, max, user_id, removed_prices, added_prices
+        ),
+    }
+    if tags:
+        changes['tag_count'] = F('tag_count') + tags
+    if ingredients:
+        changes['ingredient_count'] = F('ingredient_count') + ingredients
+    # without a summary row there is nothing to adjust, the stats view
+    # builds it from scratch when it is first read
+    UserStats.objects.using(
+        router.db_for_write(UserStats)
+    ).filter(user_id=user_id).update(**changes)
+
+
+def _snapshot(instance):
+    return {field: getattr(instance, field) for field in TRACKED_FIELDS}
+
+
+def _visible(values):
+    if values is None or values['is_hidden']:
+        return None
+
+    return values['user_id'], (values['price'], values['time_minutes'])
+
+
+def recipe_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or _suspended.get():
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    new = _snapshot(instance)
+    # the next save() of this instance compares against what is saved now
+    instance._loaded_values = {**loaded, **new}
+    if created:
+        old = None
+    elif all(field in loaded for field in TRACKED_FIELDS):
+        old = {field: loaded[field] for field in TRACKED_FIELDS}
+    else:
+        # saved without being loaded first, the old values are unknown
+        refresh_user_stats(instance.user_id)
+        return
+    before, after = _visible(old), _visible(new)
+    if before == after:
+        return
+    if before and after and before[0] == after[0]:
+        update_stats(after[0], removed=[before[1]], added=[after[1]])
+        return
+    if before:
+        update_stats(before[0], removed=[before[1]])
+    if after:
+        update_stats(after[0], added=[after[1]])
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    if _suspended.get():
+        return
+    # hidden recipes already left the summary when they were hidden
+    visible = _visible(_snapshot(instance))
+    if visible:
+        update_stats(visible[0], removed=[visible[1]])
+
+
+def _item_receivers(counter):
+    def item_saved(sender, instance, created, raw=False, **kwargs):
+        if created and not raw and not _suspended.get():
+            update_stats(instance.user_id, **{counter: 1})
+
+    def item_deleted(sender, instance, **kwargs):
+        if not _suspended.get():
+            update_stats(instance.user_id, **{counter: -1})
+
+    return item_saved, item_deleted
+
+
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.using(
+            router.db_for_write(UserStats)
+        ).get_or_create(user=instance)
+
+
+tag_saved, tag_deleted = _item_receivers('tags')
+ingredient_saved, ingredient_deleted = _item_receivers('ingredients')
+
+
+def connect():
+    for signal, receiver, sender in [
+        (post_save, recipe_saved, Recipe),
+        (post_delete, recipe_deleted, Recipe),
+        (post_save, tag_saved, Tag),
+        (post_delete, tag_deleted, Tag),
+        (post_save, ingredient_saved, Ingredient),
+        (post_delete, ingredient_deleted, Ingredient),
+        (post_save, user_saved, get_user_model()),
+    ]:
+        signal.connect(
+            receiver,
+            sender=sender,
+            dispatch_uid=(
+                f'user.stats.{sender.__name__}.{receiver.__name__}'
+            ),
+        )
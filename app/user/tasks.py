@@ -0,0 +1,35 @@
+"""
+Background tasks for users
+"""
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+
+from core.models import Ingredient, Recipe, Tag
+from job.registry import task
+from recipe.tasks import delete_in_batches
+from user import stats
+
+
+@task('user.purge_user')
+def purge_user(user_id):
+    """Delete a deactivated account and everything it owns, in batches"""
+    user = get_user_model().objects.filter(
+        id=user_id, is_active=False
+    ).first()
+    if user is None:
+        # purged by an earlier attempt, or reactivated since
+        return None
+    # recipes first, so deleting tags and ingredients cascades to no links;
+    # the summary goes with the user, keeping it current is wasted work
+    with stats.suspended():
+        counts = {
+            'recipes': delete_in_batches(Recipe.objects.filter(user=user)),
+            'tags': delete_in_batches(Tag.objects.filter(user=user)),
+            'ingredients': delete_in_batches(
+                Ingredient.objects.filter(user=user)
+            ),
+        }
+    Token.objects.filter(user=user).delete()
+    user.delete()
+
+    return counts
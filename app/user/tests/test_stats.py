@@ -0,0 +1,207 @@
+"""
+Tests for the per-user recipe summary and the stats endpoint
+"""
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag, UserStats
+from user import stats
+from user.tasks import purge_user
+
+STATS_URL = reverse('user:me-stats')
+BULK_DELETE_URL = reverse('recipe:recipe-bulk-delete')
+
+FIELDS = [
+    'recipe_count', 'price_sum', 'price_min', 'price_max',
+    'time_minutes_sum', 'tag_count', 'ingredient_count',
+]
+
+
+def create_recipe(user, price, time_minutes=10):
+    return Recipe.objects.create(
+        user=user, title='Recipe', price=Decimal(price),
+        time_minutes=time_minutes,
+    )
+
+
+class UserStatsTests(TestCase):
+    """Test the summary follows writes and matches a full recompute"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'secret'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertSummaryCurrent(self):
+        kept = UserStats.objects.values(*FIELDS).get(user=self.user)
+        stats.refresh_user_stats(self.user.id)
+        self.assertEqual(
+            kept, UserStats.objects.values(*FIELDS).get(user=self.user)
+        )
+
+        return kept
+
+    def test_requires_auth(self):
+        """Test the stats endpoint needs a token"""
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_new_user_empty_stats(self):
+        """Test a new account has a zero summary"""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'recipe_count': 0, 'tag_count': 0, 'ingredient_count': 0,
+            'price_avg': None, 'price_min': None, 'price_max': None,
+            'time_minutes_avg': None,
+        })
+
+    def test_stats_follow_writes(self):
+        """Test creating, editing and deleting rows updates the summary"""
+        cheap = create_recipe(self.user, '2.00', 10)
+        create_recipe(self.user, '5.00', 20)
+        pricey = create_recipe(self.user, '9.50', 60)
+        Tag.objects.create(user=self.user, name='Vegan')
+        Ingredient.objects.create(user=self.user, name='Salt')
+        Ingredient.objects.create(user=self.user, name='Garlic')
+
+        with self.assertNumQueries(1):
+            res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(res.data['tag_count'], 1)
+        self.assertEqual(res.data['ingredient_count'], 2)
+        self.assertEqual(res.data['price_avg'], '5.50')
+        self.assertEqual(res.data['price_min'], '2.00')
+        self.assertEqual(res.data['price_max'], '9.50')
+        self.assertEqual(res.data['time_minutes_avg'], 30)
+
+        # removing the cheapest recipe needs the next cheapest one
+        cheap.delete()
+        pricey = Recipe.objects.get(id=pricey.id)
+        pricey.price = Decimal('4.00')
+        pricey.save()
+        Tag.objects.get().delete()
+        kept = self.assertSummaryCurrent()
+        self.assertEqual(kept['recipe_count'], 2)
+        self.assertEqual(kept['price_min'], Decimal('4.00'))
+        self.assertEqual(kept['price_max'], Decimal('5.00'))
+        self.assertEqual(kept['tag_count'], 0)
+
+    def test_recipe_edit_through_api(self):
+        """Test a PATCH moves the price and time of the recipe"""
+        recipe = create_recipe(self.user, '3.00', 15)
+        self.client.patch(
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            {'price': '7.25', 'time_minutes': 40, 'tags': [{'name': 'New'}]},
+            format='json',
+        )
+
+        kept = self.assertSummaryCurrent()
+        self.assertEqual(kept['price_max'], Decimal('7.25'))
+        self.assertEqual(kept['time_minutes_sum'], 40)
+        self.assertEqual(kept['tag_count'], 1)
+
+    def test_recipe_locked_while_edited(self):
+        """Test a PATCH reads the recipe row under a lock"""
+        recipe = create_recipe(self.user, '3.00')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(
+                reverse('recipe:recipe-detail', args=[recipe.id]),
+                {'price': '4.00'}, format='json',
+            )
+
+        self.assertTrue(any(
+            query['sql'].startswith('SELECT')
+            and 'FROM "core_recipe"' in query['sql']
+            and query['sql'].endswith('FOR UPDATE')
+            for query in queries.captured_queries
+        ))
+
+    def test_drift_repaired_by_command(self):
+        """Test refresh_user_stats recomputes drifted summaries"""
+        create_recipe(self.user, '4.00', 20)
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'secret'
+        )
+        create_recipe(other, '2.00')
+        UserStats.objects.update(
+            recipe_count=7, price_sum=Decimal('1.00'), tag_count=3
+        )
+        out = StringIO()
+
+        call_command('refresh_user_stats', str(self.user.id), stdout=out)
+
+        self.assertIn('users=1', out.getvalue())
+        kept = self.assertSummaryCurrent()
+        self.assertEqual(kept['recipe_count'], 1)
+        self.assertEqual(kept['price_sum'], Decimal('4.00'))
+        self.assertEqual(
+            UserStats.objects.get(user=other).recipe_count, 7
+        )
+
+        call_command('refresh_user_stats', stdout=out)
+
+        self.assertEqual(
+            UserStats.objects.get(user=other).recipe_count, 1
+        )
+
+    def test_bulk_delete_leaves_summary(self):
+        """Test hidden recipes stop counting before they are purged"""
+        recipes = [
+            create_recipe(self.user, price) for price in ['1.00', '8.00']
+        ]
+        create_recipe(self.user, '3.00')
+        self.client.post(
+            BULK_DELETE_URL, {'ids': [recipe.id for recipe in recipes]},
+            format='json',
+        )
+
+        kept = self.assertSummaryCurrent()
+        self.assertEqual(kept['recipe_count'], 1)
+        self.assertEqual(kept['price_min'], Decimal('3.00'))
+        self.assertEqual(kept['price_max'], Decimal('3.00'))
+        # purging the hidden rows changes nothing more
+        Recipe.objects.filter(is_hidden=True).delete()
+        self.assertEqual(self.assertSummaryCurrent(), kept)
+
+    def test_missing_summary_built_on_read(self):
+        """Test accounts without a summary row get one on first read"""
+        create_recipe(self.user, '4.00')
+        UserStats.objects.filter(user=self.user).delete()
+        create_recipe(self.user, '6.00')
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertTrue(UserStats.objects.filter(user=self.user).exists())
+
+    def test_purge_skips_row_updates(self):
+        """Test purging an account does not update its summary per row"""
+        for price in ['1.00', '2.00', '3.00']:
+            create_recipe(self.user, price)
+        self.user.is_active = False
+        self.user.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            purge_user(user_id=self.user.id)
+
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "core_userstats"')
+            for query in queries.captured_queries
+        ))
+        self.assertFalse(UserStats.objects.exists())
@@ -0,0 +1,50 @@
+# Tests for the user background tasks
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core.models import Ingredient, Job, Recipe, Tag
+from user import tasks
+
+
+class PurgeUserTests(TestCase):
+    # purging the data of deleted accounts
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'secret', is_active=False
+        )
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Kale')
+        for _ in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title='Soup', time_minutes=5,
+                price=Decimal('2.00'),
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+    def test_purge_user(self):
+        # test the account and everything it owns is deleted
+        job = tasks.purge_user.enqueue(user_id=self.user.id, user=self.user)
+
+        counts = tasks.purge_user(user_id=self.user.id)
+
+        self.assertEqual(
+            counts, {'recipes': 3, 'tags': 1, 'ingredients': 1}
+        )
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
+        self.assertFalse(Recipe.objects.exists())
+        job.refresh_from_db()
+        self.assertIsNone(job.user)
+
+    def test_purge_active_user_skipped(self):
+        # test an active account is never purged
+        get_user_model().objects.update(is_active=True)
+
+        self.assertIsNone(tasks.purge_user(user_id=self.user.id))
+        self.assertEqual(Recipe.objects.count(), 3)
+        self.assertFalse(Job.objects.exists())
@@ -3,9 +3,12 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import Job
+
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
@@ -159,3 +162,22 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(self.user.name, pay_load['name'])
         self.assertTrue(self.user.check_password(pay_load['password']))
+
+    def test_delete_account(self):
+        # test deleting the account deactivates it at once and
+        # schedules purging its data
+        Token.objects.create(user=self.user)
+
+        res = self.client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        job = Job.objects.get(id=res.data['id'])
+        self.assertEqual(job.name, 'user.purge_user')
+        self.assertEqual(job.payload, {'user_id': self.user.id})
+        res = APIClient().post(TOKEN_URL, {
+            'email': 'test@example.com', 'password': 'testpass123',
+        })
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,9 +1,20 @@
 # API views
-from rest_framework import generics, authentication, permissions
+from django.db import transaction
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, authentication, permissions, status
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+from job.serializers import JobSerializer
+from core.models import UserStats
+from user import stats, tasks
+from user.serializers import (
+    AuthTokenSerializer,
+    UserSerializer,
+    UserStatsSerializer,
+)
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -17,11 +28,42 @@ class CreateTokenView(ObtainAuthToken):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     # manage authenticated users
     serializer_class = UserSerializer
     authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    read_from_replica = True
 
     def get_object(self):
         return self.request.user
+
+    @extend_schema(responses={202: JobSerializer})
+    def destroy(self, request, *args, **kwargs):
+        """Deactivate the account now and purge its data in the background"""
+        user = self.get_object()
+        with transaction.atomic():
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+            Token.objects.filter(user=user).delete()
+            job = tasks.purge_user.enqueue(user_id=user.id, user=user)
+
+        return Response(
+            JobSerializer(job).data, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class UserStatsView(generics.RetrieveAPIView):
+    # recipe summary of the authenticated user, kept by user.stats
+    serializer_class = UserStatsSerializer
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    read_from_replica = True
+
+    def get_object(self):
+        summary = UserStats.objects.filter(user=self.request.user).first()
+        if summary is None:
+            # accounts from before the summary existed get one on first read
+            summary = stats.refresh_user_stats(self.request.user.id)
+
+        return summary
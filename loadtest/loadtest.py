@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Drive the nginx + uWSGI stack with scripted load scenarios.
+
+Only needs the standard library, so it runs from any machine that can
+reach the proxy. Every worker thread keeps its own keep-alive connection
+and sends requests back to back, so the concurrency is the number of
+requests in flight.
+
+    python loadtest/loadtest.py --scenario browse --concurrency 4,8,16
+"""
+import argparse
+import http.client
+import json
+import random
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+RECIPES = '/api/recipe/recipes/'
+TAGS = '/api/recipe/tags/'
+INGREDIENTS = '/api/recipe/ingredients/'
+
+
+def percentile(samples, pct):
+    """Return the pct percentile of sorted samples (nearest rank)"""
+    if not samples:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(samples))) - 1, 0)
+
+    return samples[min(rank, len(samples) - 1)]
+
+
+def png(width, height, seed=0):
+    """Return a valid noise PNG; noise does not compress, like photos"""
+    rng = random.Random(seed)
+    rows = b''.join(
+        b'\x00' + rng.randbytes(width * 3) for _ in range(height)
+    )
+
+    def chunk(kind, data):
+        body = kind + data
+        return (
+            struct.pack('>I', len(data)) + body
+            + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+        )
+
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(rows, 1))
+        + chunk(b'IEND', b'')
+    )
+
+
+def multipart(field, filename, content, content_type):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; '
+        f'filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Trickle:
+    """A request body sent in chunks, sleeping between them"""
+
+    def __init__(self, body, chunk_size, interval):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.interval = interval
+
+    def __len__(self):
+        return len(self.body)
+
+    def __iter__(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+            time.sleep(self.interval)
+
+
+class Client:
+    """One keep-alive HTTP connection to the proxy"""
+
+    def __init__(self, base_url, token=None, timeout=30):
+        url = urlsplit(base_url)
+        connection_class = (
+            http.client.HTTPSConnection if url.scheme == 'https'
+            else http.client.HTTPConnection
+        )
+        self.connection = connection_class(
+            url.hostname, url.port, timeout=timeout
+        )
+        self.headers = {'Accept': 'application/json'}
+        if token:
+            self.headers['Authorization'] = f'Token {token}'
+
+    def request(self, method, path, body=None, content_type=None):
+        """Send a request, return (status, body)"""
+        headers = dict(self.headers)
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            content_type = 'application/json'
+        if content_type:
+            headers['Content-Type'] = content_type
+        if isinstance(body, Trickle):
+            # Django ignores chunked request bodies
+            headers['Content-Length'] = str(len(body))
+        reused = self.connection.sock is not None
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # reconnect on the next request
+            self.connection.close()
+            if reused and not isinstance(body, Trickle):
+                # the server closed the idle keep-alive connection
+                return self.request(method, path, body, content_type)
+            raise
+
+    def json(self, method, path, body=None):
+        status, content = self.request(method, path, body)
+        if status >= 400:
+            raise RuntimeError(f'{method} {path} returned {status}')
+
+        return json.loads(content) if content else None
+
+
+class Scenario:
+    """A weighted mix of requests sent by every worker"""
+
+    name = None
+
+    def setup(self, client, args):
+        """Collect the ids the requests refer to"""
+        recipes = client.json('GET', RECIPES)
+        if not recipes:
+            raise SystemExit(
+                'the user has no recipes, seed the database first '
+                '(python manage.py seed_data)'
+            )
+        self.recipe_ids = [recipe['id'] for recipe in recipes]
+        self.tag_ids = [tag['id'] for tag in client.json('GET', TAGS)]
+        self.ingredient_ids = [
+            ingredient['id'] for ingredient in client.json('GET', INGREDIENTS)
+        ]
+
+    def requests(self, rng):
+        """Return [(weight, label, make_request)] for a worker"""
+        raise NotImplementedError
+
+    def worker_requests(self, rng, index):
+        return self.requests(rng)
+
+    def threads(self, concurrency):
+        return concurrency
+
+    def worker_started(self, barrier):
+        pass
+
+
+class Browse(Scenario):
+    name = 'browse'
+
+    def requests(self, rng):
+        return [
+            (5, 'recipe-list', lambda: ('GET', RECIPES, None, None)),
+            (2, 'tag-list', lambda: ('GET', TAGS, None, None)),
+            (2, 'ingredient-list', lambda: ('GET', INGREDIENTS, None, None)),
+            (1, 'recipe-detail', lambda: (
+                'GET', f'{RECIPES}{rng.choice(self.recipe_ids)}/', None, None
+            )),
+        ]
+
+
+class Search(Scenario):
+    name = 'search'
+
+    def _ids(self, rng, ids):
+        return ','.join(
+            str(id_) for id_ in rng.sample(ids, min(len(ids), 2))
+        )
+
+    def requests(self, rng):
+        return [
+            (2, 'recipe-filter-tags', lambda: (
+                'GET', f'{RECIPES}?tags={self._ids(rng, self.tag_ids)}',
+                None, None,
+            )),
+            (2, 'recipe-filter-ingredients', lambda: (
+                'GET',
+                f'{RECIPES}?ingredients='
+                f'{self._ids(rng, self.ingredient_ids)}',
+                None, None,
+            )),
+            (1, 'recipe-filter-both', lambda: (
+                'GET',
+                f'{RECIPES}?tags={self._ids(rng, self.tag_ids)}'
+                f'&ingredients={self._ids(rng, self.ingredient_ids)}',
+                None, None,
+            )),
+        ]
+
+
+class CreateHeavy(Scenario):
+    name = 'create-heavy'
+
+    def _recipe(self, rng):
+        return {
+            'title': f'Load test recipe {rng.getrandbits(32):08x}',
+            'time_minutes': rng.randint(5, 120),
+            'price': f'{rng.uniform(1, 50):.2f}',
+            'tags': [{'name': rng.choice(['Quick', 'Vegan', 'Dinner'])}],
+            'ingredients': [
+                {'name': name}
+                for name in rng.sample(['Salt', 'Egg', 'Rice', 'Onion'], 2)
+            ],
+        }
+
+    def requests(self, rng):
+        return [
+            (7, 'recipe-create', lambda: (
+                'POST', RECIPES, self._recipe(rng), None
+            )),
+            (3, 'recipe-list', lambda: ('GET', RECIPES, None, None)),
+        ]
+
+
+class ImageUploadBurst(Scenario):
+    """Every worker starts uploading at the same moment"""
+
+    name = 'image-upload-burst'
+
+    def setup(self, client, args):
+        super().setup(client, args)
+        self.image = png(args.image_size, args.image_size)
+
+    def worker_started(self, barrier):
+        # start the burst together instead of ramping up
+        barrier.wait()
+
+    def requests(self, rng):
+        def upload():
+            body, content_type = multipart(
+                'image', 'load.png', self.image, 'image/png'
+            )
+            recipe_id = rng.choice(self.recipe_ids)
+            return (
+                'POST', f'{RECIPES}{recipe_id}/upload-image/',
+                body, content_type,
+            )
+
+        return [(1, 'recipe-image-upload', upload)]
+
+
+class SlowClients(Scenario):
+    """
+    Clients trickling uploads at --slow-rate while probes time health checks.
+
+    A server that gives each connection a worker (uWSGI without a
+    buffering proxy) runs out of workers and the probes queue; an event
+    loop (ASGI mode) keeps answering them.
+    """
+
+    name = 'slow-clients'
+
+    def setup(self, client, args):
+        super().setup(client, args)
+        self.image = png(args.image_size, args.image_size)
+        # a tenth of the rate every 100ms
+        self.chunk_size = max(args.slow_rate // 10, 1)
+        self.probes = args.probes
+
+    def threads(self, concurrency):
+        return concurrency + self.probes
+
+    def worker_requests(self, rng, index):
+        if index < self.probes:
+            return [(1, 'health-check', lambda: (
+                'GET', '/api/health-check/', None, None
+            ))]
+
+        def upload():
+            body, content_type = multipart(
+                'image', 'slow.png', self.image, 'image/png'
+            )
+            recipe_id = rng.choice(self.recipe_ids)
+            return (
+                'POST', f'{RECIPES}{recipe_id}/upload-image/',
+                Trickle(body, self.chunk_size, 0.1), content_type,
+            )
+
+        return [(1, 'slow-upload', upload)]
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in [
+        Browse, Search, CreateHeavy, ImageUploadBurst, SlowClients,
+    ]
+}
+
+
+def worker(scenario, args, token, index, deadline, barrier, results, lock):
+    rng = random.Random(args.seed * 1000 + index)
+    client = Client(args.base_url, token, timeout=args.timeout)
+    mix = scenario.worker_requests(rng, index)
+    weights = [weight for weight, _, _ in mix]
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    scenario.worker_started(barrier)
+    while time.monotonic() < deadline:
+        _, label, make_request = rng.choices(mix, weights)[0]
+        method, path, body, content_type = make_request()
+        start = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, body, content_type)
+        except (OSError, http.client.HTTPException):
+            status = None
+        samples[label].append(time.perf_counter() - start)
+        if status is None or status >= 400:
+            errors[label] += 1
+    with lock:
+        for label, timings in samples.items():
+            results['samples'][label].extend(timings)
+            results['errors'][label] += errors[label]
+
+
+def summarize(samples, errors, elapsed):
+    ordered = sorted(samples)
+    count = len(ordered)
+
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'throughput_rps': round(count / elapsed, 2),
+        'mean_ms': round(sum(ordered) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p90_ms': round(percentile(ordered, 90) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if count else 0.0,
+    }
+
+
+def run(scenario, args, token, concurrency):
+    results = {'samples': defaultdict(list), 'errors': defaultdict(int)}
+    lock = threading.Lock()
+    barrier = threading.Barrier(scenario.threads(concurrency))
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(
+                scenario, args, token, index, deadline, barrier, results,
+                lock,
+            ),
+        )
+        for index in range(scenario.threads(concurrency))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    everything = [
+        sample for samples in results['samples'].values()
+        for sample in samples
+    ]
+    summary = summarize(
+        everything, sum(results['errors'].values()), elapsed
+    )
+    summary['concurrency'] = concurrency
+    summary['endpoints'] = {
+        label: summarize(samples, results['errors'][label], elapsed)
+        for label, samples in sorted(results['samples'].items())
+    }
+
+    return summary
+
+
+def get_token(args):
+    client = Client(args.base_url, timeout=args.timeout)
+    credentials = {'email': args.email, 'password': args.password}
+    status, content = client.request('POST', '/api/user/token/', credentials)
+    if status >= 400 and args.create_user:
+        client.json('POST', '/api/user/create/', {
+            **credentials, 'name': 'Load test',
+        })
+        status, content = client.request(
+            'POST', '/api/user/token/', credentials
+        )
+    if status >= 400:
+        raise SystemExit(f'could not get a token for {args.email}: {status}')
+
+    return json.loads(content)['token']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--base-url', default='http://127.0.0.1:80')
+    parser.add_argument(
+        '--scenario',
+        action='append',
+        choices=sorted(SCENARIOS),
+        help='Scenario to run, repeatable (default: all)',
+    )
+    parser.add_argument(
+        '--concurrency',
+        default='8',
+        help='Comma separated concurrency levels to sweep',
+    )
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=30,
+        help='Seconds to run each scenario at each concurrency',
+    )
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument(
+        '--email',
+        default='seed1@example.com',
+        help='User to run as, seed_data users share the password',
+    )
+    parser.add_argument('--password', default='password')
+    parser.add_argument(
+        '--create-user',
+        action='store_true',
+        help='Create the user when it does not exist',
+    )
+    parser.add_argument(
+        '--image-size',
+        type=int,
+        default=512,
+        help='Width and height of the uploaded PNG in pixels',
+    )
+    parser.add_argument(
+        '--slow-rate',
+        type=int,
+        default=65536,
+        help='Upload speed of slow-clients in bytes per second',
+    )
+    parser.add_argument(
+        '--probes',
+        type=int,
+        default=2,
+        help='Health check threads running next to the slow clients',
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON summary here')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    token = get_token(args)
+    levels = [int(level) for level in args.concurrency.split(',')]
+    report = {
+        'base_url': args.base_url,
+        'duration_seconds': args.duration,
+        'scenarios': {},
+    }
+    for name in args.scenario or list(SCENARIOS):
+        scenario = SCENARIOS[name]()
+        scenario.setup(Client(args.base_url, token, args.timeout), args)
+        report['scenarios'][name] = []
+        for concurrency in levels:
+            summary = run(scenario, args, token, concurrency)
+            report['scenarios'][name].append(summary)
+            print(
+                f'{name:<20} c={concurrency:<4} '
+                f'rps={summary["throughput_rps"]:<9} '
+                f'p50={summary["p50_ms"]:.1f}ms '
+                f'p95={summary["p95_ms"]:.1f}ms '
+                f'p99={summary["p99_ms"]:.1f}ms '
+                f'errors={summary["error_rate"]:.2%}',
+                file=sys.stderr,
+            )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
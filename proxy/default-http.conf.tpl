@@ -0,0 +1,20 @@
+server {
+    listen ${LISTEN_PORT};
+
+    location /static {
+        alias /vol/static;
+    }
+
+    location / {
+        proxy_pass             http://${APP_HOST}:${APP_PORT};
+        proxy_http_version     1.1;
+        proxy_set_header       Connection "";
+        proxy_set_header       Host $host;
+        proxy_set_header       X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header       X-Forwarded-Proto $scheme;
+        # uvicorn reads slow uploads without holding a thread, so stream
+        # them through instead of spooling them to disk first
+        proxy_request_buffering off;
+        client_max_body_size   10M;
+    }
+}
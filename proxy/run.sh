@@ -2,5 +2,12 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+# the app speaks HTTP in ASGI mode and the uwsgi protocol otherwise
+if [ "$SERVER_MODE" = "asgi" ]; then
+    TEMPLATE=/etc/nginx/default-http.conf.tpl
+else
+    TEMPLATE=/etc/nginx/default.conf.tpl
+fi
+
+envsubst '${LISTEN_PORT} ${APP_HOST} ${APP_PORT}' < "$TEMPLATE" > /etc/nginx/conf.d/default.conf
 nginx -g 'daemon off;'
\ No newline at end of file
@@ -2,8 +2,22 @@
 
 set -e
 
-python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
+# every uWSGI worker writes its metrics here, start from a clean slate
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# waits for the db, then collects static files and migrates only if needed
+python manage.py startup
+
+# sized from the container's CPU and memory, WSGI_* variables override it
+python manage.py uwsgi_config --output /tmp/uwsgi.ini
+
+if [ "$SERVER_MODE" = "asgi" ]; then
+    # one process per worker uWSGI would run, each with its own event loop
+    WORKERS=$(sed -n 's/^workers = //p' /tmp/uwsgi.ini)
+    exec uvicorn app.asgi:application --host 0.0.0.0 --port 9000 \
+        --workers "$WORKERS" --lifespan off --no-access-log
+fi
+
+exec uwsgi --ini /tmp/uwsgi.ini
\ No newline at end of file